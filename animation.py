@@ -80,7 +80,7 @@ class Animation:
     animation. To do that it first has to run a simulation for a scene, then
     create a series of keyframes from the simulation data, then turn the
     keyframes into a series of scenes, and render each of them into images. It
-    will create a new scene for each frame.
+    copies the scene once and moves its objects for each frame.
     """
     def __init__(self, duration, screen_size, fps, scene, render):
         self.duration = duration
@@ -90,18 +90,30 @@ class Animation:
         # This is the render function to use
         self.render = render
 
+    def update_scene_from_keyframes(self, scene, keyframes):
+        """
+        Move the objects of scene to the given keyframes that belong to the
+        same frame number. Only the acceleration structure around the moved
+        objects is updated.
+        """
+        moved = []
+        for keyframe in keyframes:
+            obj = scene.objects[keyframe.obj.ID]
+            obj.position = keyframe.transform.translate
+            obj.rotation = keyframe.transform.rotate
+            # scale is also possible
+            moved.append(obj)
+        scene.refit(moved)
+        return scene
+
     def create_scene_from_keyframes(self, keyframes):
         """
         Create a scene from the given keyframes that belong to the same frame
         number.
         """
-        new_scene = deepcopy(self.scene)
-        for keyframe in keyframes:
-            new_obj = new_scene.objects[keyframe.obj.ID]
-            new_obj.position = keyframe.transform.translate
-            new_obj.rotation = keyframe.transform.rotate
-            # scale is also possible
-        return new_scene
+        return self.update_scene_from_keyframes(
+            deepcopy(self.scene), keyframes
+        )
 
     def create(self, sphere, camera):
         print("Creating animation...")
@@ -118,10 +130,12 @@ class Animation:
         )
         # Write video
         writer = imageio.get_writer(ANIM_VID_FILENAME, fps=self.fps)
+        # Every frame moves the objects of the same copy of the scene
+        new_scene = deepcopy(self.scene)
         for i in range(len(keyframes)):
-            # Create a new scene using the keyframe and render that scene
+            # Update the scene using the keyframe and render that scene
             current_keyframes = keyframes[i]
-            new_scene = self.create_scene_from_keyframes(current_keyframes)
+            self.update_scene_from_keyframes(new_scene, current_keyframes)
             w, h = self.screen_size
             print("Rendering frame={}/{}...".format(i, len(keyframes) - 1))
             img_arr = self.render(new_scene, camera, h, w)
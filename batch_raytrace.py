@@ -0,0 +1,154 @@
+import numpy as np
+
+# Local Modules
+from constants import MAX_COLOR_VALUE, RGB_CHANNELS
+from object import HollowSphere, Sphere, intersect_spheres
+from ray import RayBatch
+from raytrace import MAX_DEPTH, MIN_KR, compute_color_np, \
+    compute_shadow_np, get_background_color, get_light_samples_np
+import utils
+
+
+def closest_hits(rays, scene):
+    """
+    Find the closest hit of every ray. The rays go through the acceleration
+    structure of the scene together, the objects outside of it (or all of
+    them before the scene is finalized) are intersected with every ray and
+    all their spheres in one call to intersect_spheres.
+
+    Args:
+        rays(RayBatch): The rays to be traced
+        scene(Scene): This object contains things like objects, lights, etc
+
+    Returns:
+        tuple: The t of the closest hit for every ray, the ID of the object
+            that was hit (-1 when there is no hit) and the part of the object
+            that was hit (-1 for objects without parts)
+    """
+    if scene.accel is not None:
+        t_min, obj_ids, part_ids = scene.accel.closest_hit_np(rays)
+        objects = scene.unbounded_objects
+    else:
+        t_min = np.full(len(rays), np.inf)
+        obj_ids = np.full(len(rays), -1)
+        part_ids = np.full(len(rays), -1)
+        objects = scene.objects
+    spheres = [obj for obj in objects if isinstance(obj, Sphere)]
+    if spheres:
+        t, closest = intersect_spheres(
+            rays.pr, rays.nr,
+            np.array([sphere.position for sphere in spheres], dtype=float),
+            np.array([sphere.radius for sphere in spheres], dtype=float),
+            np.array([isinstance(sphere, HollowSphere) for sphere in spheres])
+        )
+        closer = (closest >= 0) & (t < t_min)
+        t_min[closer] = t[closer]
+        obj_ids[closer] = np.array(
+            [sphere.ID for sphere in spheres]
+        )[closest[closer]]
+        part_ids[closer] = -1
+    for obj in objects:
+        if isinstance(obj, Sphere):
+            continue
+        t, parts = rays.intersect_parts(obj)
+        closer = (0 < t) & (t < t_min)
+        t_min[closer] = t[closer]
+        obj_ids[closer] = obj.ID
+        part_ids[closer] = -1 if parts is None else parts[closer]
+    return t_min, obj_ids, part_ids
+
+
+def shade_hits(rays, t, groups, scene, kr=1, depth=0):
+    """
+    Get the color for rays that hit objects. The colors of all the hits are
+    computed together, in groups by shader code.
+
+    Args:
+        rays(RayBatch): The rays that hit the objects
+        t(numpy.array): The t of the hit for every ray
+        groups(list): Tuples with the rows of rays that hit an object, the
+            object and the parts that were hit
+        scene(Scene): This object contains things like objects, lights, etc
+        kr(float): How much this raytrace will reflect (used for recursion)
+        depth(int): How many bounces this trace has
+
+    Returns:
+        np.array: The colors for these rays with shape (N, 3)
+    """
+    lights = scene.lights
+    ph = rays.at(t)
+    eye = utils.normalize_rows(rays.pr - ph)
+    # Shading and shadows use the same samples of the area lights
+    light_samples = get_light_samples_np(lights, len(ph))
+    color = compute_color_np(ph, eye, groups, lights, light_samples)
+    # The object that was hit doesn't occlude itself
+    exclude_ids = np.empty(len(ph), dtype=int)
+    for rows, obj, _ in groups:
+        exclude_ids[rows] = obj.ID
+    shadow = compute_shadow_np(ph, scene, lights, exclude_ids, light_samples)
+    final_color = (color * (shadow / MAX_COLOR_VALUE)).round()
+    # Reflections, like raytrace only the first hit spawns reflected rays
+    if kr <= MIN_KR or depth >= MAX_DEPTH - 1:
+        return final_color
+    for rows, obj, parts in groups:
+        if obj.material.kr <= 0:
+            continue
+        n = obj.normal_at_np(ph[rows], parts)
+        c = np.einsum('ij,ij->i', n, eye[rows])
+        r = -1 * eye[rows] + 2 * c[:, np.newaxis] * n
+        # Adding roughness
+        roughness = obj.material.roughness
+        if roughness > 0:
+            # Random vectors with 3 values between [-1, 1]
+            random_vectors = 2 * np.random.random_sample(r.shape) - 1
+            r = utils.normalize_rows(r + roughness ** 2 * random_vectors)
+        reflected_rays = RayBatch(ph[rows], utils.normalize_rows(r))
+        new_kr = kr * obj.material.kr
+        reflection_color = raytrace_batch(
+            reflected_rays, scene, new_kr, depth + 1
+        )
+        final_color[rows] = (
+            final_color[rows] * (1 - new_kr) + reflection_color * new_kr
+        )
+    return final_color
+
+
+def raytrace_batch(rays, scene, kr=1, depth=0):
+    """
+    Trace all the rays to their closest intersection and get the colors at
+    those points.
+
+    Args:
+        rays(RayBatch): The rays to be traced
+        scene(Scene): This object contains things like objects, lights, etc
+        kr(float): How much this raytrace will reflect (used for recursion)
+        depth(int): How many bounces this trace has
+
+    Returns:
+        np.array: The colors for the rays with shape (N, 3) in float
+    """
+    colors = np.zeros((len(rays), RGB_CHANNELS))
+    t_min, obj_ids, part_ids = closest_hits(rays, scene)
+    hit_rows = np.flatnonzero(obj_ids >= 0)
+    for row in np.flatnonzero(obj_ids == -1):
+        colors[row] = get_background_color(rays[row], scene)
+    if not len(hit_rows):
+        return colors
+    # Group the hits by object, the parts of an object can have different
+    # materials, with rows relative to hit_rows
+    groups = []
+    hit_ids = obj_ids[hit_rows]
+    hit_parts = part_ids[hit_rows]
+    ph = rays[hit_rows].at(t_min[hit_rows])
+    for idx in np.unique(hit_ids):
+        rows = np.flatnonzero(hit_ids == idx)
+        parts = hit_parts[rows]
+        obj_groups = scene.objects[idx].group_hits(
+            ph[rows], None if np.all(parts < 0) else parts
+        )
+        for group_rows, obj, group_parts in obj_groups:
+            groups.append((rows[group_rows], obj, group_parts))
+    colors[hit_rows] = shade_hits(
+        rays[hit_rows], t_min[hit_rows], groups, scene, kr, depth
+    )
+    return colors
@@ -0,0 +1,494 @@
+import numpy as np
+
+
+# Objects in a leaf of the BVH, it can have more if splitting is not worth it
+MAX_LEAF_SIZE = 2
+MAX_LEAF_OBJECTS = 8
+# Number of buckets for evaluating the Surface Area Heuristic
+SAH_BINS = 12
+# Cost of visiting a node relative to intersecting an object
+TRAVERSAL_COST = 0.5
+# Replaces 0 in the director vectors so the slab test doesn't divide by 0
+MIN_DIRECTION = 1e-12
+# A refit BVH is built again when its SAH cost grows more than this ratio
+REBUILD_COST_RATIO = 1.5
+
+
+def inverse_direction(nr):
+    """
+    Get the inverse of the director vector of a ray for the slab test.
+
+    Args:
+        nr(numpy.array): Director vector of the ray
+
+    Returns:
+        numpy.array: 1 / nr with the 0 components replaced by a tiny value
+    """
+    return 1 / np.where(nr == 0, MIN_DIRECTION, nr)
+
+
+def slab_intersect(p_min, p_max, pr, inv_nr):
+    """
+    Slab test for rays against a box, the ray is inside the box between the
+    entry and exit t.
+
+    Args:
+        p_min(numpy.array): Corner of the box with the minimum x, y and z
+        p_max(numpy.array): Corner of the box with the maximum x, y and z
+        pr(numpy.array): Origin of the ray, or origins with shape (N, 3)
+        inv_nr(numpy.array): Inverse of the director vector, from
+            inverse_direction, or inverses with shape (N, 3)
+
+    Returns:
+        tuple: The entry and exit t, the box is missed when entry > exit
+    """
+    t0 = (p_min - pr) * inv_nr
+    t1 = (p_max - pr) * inv_nr
+    near = np.minimum(t0, t1)
+    far = np.maximum(t0, t1)
+    # Reducing the last axis of size 3 with max and min is slower
+    t_near = np.maximum(np.maximum(near[..., 0], near[..., 1]), near[..., 2])
+    t_far = np.minimum(np.minimum(far[..., 0], far[..., 1]), far[..., 2])
+    return t_near, t_far
+
+
+class AABB:
+    """
+    Axis aligned bounding box.
+
+    Attributes:
+        p_min(numpy.array): Corner with the minimum x, y and z
+        p_max(numpy.array): Corner with the maximum x, y and z
+    """
+    def __init__(self, p_min, p_max):
+        self.p_min = np.asarray(p_min, dtype=float)
+        self.p_max = np.asarray(p_max, dtype=float)
+
+    def __str__(self):
+        return "min: {}, max: {}".format(self.p_min, self.p_max)
+
+    @property
+    def centroid(self):
+        return (self.p_min + self.p_max) / 2
+
+    def surface_area(self):
+        dx, dy, dz = np.maximum(self.p_max - self.p_min, 0)
+        return 2 * (dx * dy + dy * dz + dz * dx)
+
+    def union(self, other):
+        return AABB(
+            np.minimum(self.p_min, other.p_min),
+            np.maximum(self.p_max, other.p_max)
+        )
+
+    def intersect(self, pr, inv_nr, t_max=np.inf):
+        """
+        Slab test for a ray against this box.
+
+        Args:
+            pr(numpy.array): Origin of the ray
+            inv_nr(numpy.array): Inverse of the director vector of the ray,
+                from inverse_direction
+            t_max(float): Hits farther than this are ignored
+
+        Returns:
+            float: The t where the ray enters the box (0 if it starts inside)
+                or infinite if it misses the box
+        """
+        t_near, t_far = slab_intersect(self.p_min, self.p_max, pr, inv_nr)
+        if t_near > t_far or t_far < 0 or t_near > t_max:
+            return np.inf
+        return max(t_near, 0.0)
+
+    def intersect_np(self, pr, inv_nr, t_max):
+        """
+        Slab test for many rays against this box.
+
+        Args:
+            pr(numpy.array): Origins of the rays with shape (N, 3)
+            inv_nr(numpy.array): Inverses of the director vectors (N, 3)
+            t_max(numpy.array): Hits farther than this are ignored (N,)
+
+        Returns:
+            numpy.array: Mask of the rays that hit the box with shape (N,)
+        """
+        t_near, t_far = slab_intersect(self.p_min, self.p_max, pr, inv_nr)
+        return (t_near <= t_far) & (t_far >= 0) & (t_near <= t_max)
+
+
+def union_bounds(bounds):
+    """
+    Get the box that contains all the given boxes.
+
+    Args:
+        bounds([AABB]): The boxes
+
+    Returns:
+        AABB: The box around all of them
+    """
+    p_min = np.min([b.p_min for b in bounds], axis=0)
+    p_max = np.max([b.p_max for b in bounds], axis=0)
+    return AABB(p_min, p_max)
+
+
+class BVHNode:
+    """
+    Node of a bounding volume hierarchy, leaves have objects and inner nodes
+    have two children.
+
+    Attributes:
+        bounds(AABB): Box around everything inside this node
+        left(BVHNode): First child
+        right(BVHNode): Second child
+        objects([Object]): The objects of a leaf, None for inner nodes
+        parent(BVHNode): The node that has this one as a child
+        depth(int): Number of nodes above this one
+    """
+    def __init__(self, bounds, left=None, right=None, objects=None):
+        self.bounds = bounds
+        self.left = left
+        self.right = right
+        self.objects = objects
+        self.parent = None
+        self.depth = 0
+        if left is not None:
+            left.parent = self
+            right.parent = self
+
+    @property
+    def is_leaf(self):
+        return self.objects is not None
+
+    @property
+    def cost(self):
+        """
+        Cost of this node in the Surface Area Heuristic, without the area.
+        """
+        return len(self.objects) if self.is_leaf else TRAVERSAL_COST
+
+
+def box_area(p_min, p_max):
+    """
+    Surface area of boxes stored as arrays of corners with shape (N, 3).
+    """
+    d = np.maximum(p_max - p_min, 0)
+    return 2 * (d[:, 0] * d[:, 1] + d[:, 1] * d[:, 2] + d[:, 2] * d[:, 0])
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over objects with bounds, built with the
+    Surface Area Heuristic. Every object needs a bounds method that returns
+    an AABB.
+
+    Attributes:
+        objects([Object]): The objects inside the hierarchy
+        root(BVHNode): Root node of the tree, None without objects
+        leaves(dict): The leaf of every object
+        sah_cost(float): Cost of the tree in the Surface Area Heuristic,
+            updated by refit
+        build_cost(float): The cost when the tree was built
+    """
+    def __init__(self, objects):
+        self.objects = list(objects)
+        self.root = None
+        self.leaves = {}
+        if not self.objects:
+            return
+        bounds = [obj.bounds() for obj in self.objects]
+        self.p_mins = np.array([b.p_min for b in bounds])
+        self.p_maxs = np.array([b.p_max for b in bounds])
+        self.centroids = (self.p_mins + self.p_maxs) / 2
+        self.root = self.build(np.arange(len(self.objects)))
+        # Depths and the sum of area times cost of all the nodes
+        self.cost_sum = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            self.cost_sum += node.bounds.surface_area() * node.cost
+            if not node.is_leaf:
+                node.left.depth = node.right.depth = node.depth + 1
+                stack.extend((node.left, node.right))
+        # Moving objects also grows the root, so the cost is always relative
+        # to the area it had when it was built
+        self.build_area = max(self.root.bounds.surface_area(), 1e-12)
+        self.build_cost = self.sah_cost
+
+    @property
+    def sah_cost(self):
+        return self.cost_sum / self.build_area
+
+    def leaf(self, indices, bounds):
+        node = BVHNode(bounds, objects=[self.objects[i] for i in indices])
+        for obj in node.objects:
+            self.leaves[obj] = node
+        return node
+
+    def build(self, indices):
+        """
+        Build the node for the objects with the given indices.
+
+        Args:
+            indices(numpy.array): Indices of the objects in self.objects
+
+        Returns:
+            BVHNode: The root of the subtree
+        """
+        bounds = AABB(
+            self.p_mins[indices].min(axis=0), self.p_maxs[indices].max(axis=0)
+        )
+        n = len(indices)
+        if n <= MAX_LEAF_SIZE:
+            return self.leaf(indices, bounds)
+        centroids = self.centroids[indices]
+        c_min = centroids.min(axis=0)
+        extent = centroids.max(axis=0) - c_min
+        axis = np.argmax(extent)
+        if extent[axis] == 0:
+            # All the centroids are in the same place
+            if n <= MAX_LEAF_OBJECTS:
+                return self.leaf(indices, bounds)
+            left = indices[:n // 2]
+            right = indices[n // 2:]
+        else:
+            # Put the centroids in buckets along the axis
+            bins = (
+                (centroids[:, axis] - c_min[axis]) / extent[axis] * SAH_BINS
+            ).astype(int)
+            bins = np.minimum(bins, SAH_BINS - 1)
+            counts = np.zeros(SAH_BINS, dtype=int)
+            bin_min = np.full((SAH_BINS, 3), np.inf)
+            bin_max = np.full((SAH_BINS, 3), -np.inf)
+            for b in range(SAH_BINS):
+                in_bin = bins == b
+                counts[b] = in_bin.sum()
+                if counts[b]:
+                    bin_min[b] = self.p_mins[indices[in_bin]].min(axis=0)
+                    bin_max[b] = self.p_maxs[indices[in_bin]].max(axis=0)
+            # Bounds and counts at both sides of each split between buckets
+            left_min = np.minimum.accumulate(bin_min)[:-1]
+            left_max = np.maximum.accumulate(bin_max)[:-1]
+            right_min = np.minimum.accumulate(bin_min[::-1])[::-1][1:]
+            right_max = np.maximum.accumulate(bin_max[::-1])[::-1][1:]
+            left_counts = np.cumsum(counts)[:-1]
+            right_counts = n - left_counts
+            valid = (left_counts > 0) & (right_counts > 0)
+            costs = np.full(SAH_BINS - 1, np.inf)
+            costs[valid] = (
+                box_area(left_min[valid], left_max[valid])
+                * left_counts[valid]
+                + box_area(right_min[valid], right_max[valid])
+                * right_counts[valid]
+            )
+            split = np.argmin(costs)
+            area = bounds.surface_area()
+            split_cost = TRAVERSAL_COST + costs[split] / max(area, 1e-12)
+            if split_cost >= n and n <= MAX_LEAF_OBJECTS:
+                return self.leaf(indices, bounds)
+            left = indices[bins <= split]
+            right = indices[bins > split]
+        return BVHNode(bounds, self.build(left), self.build(right))
+
+    def refit(self, moved=None):
+        """
+        Update the bounds of the nodes above the objects that moved, keeping
+        the tree as it is.
+
+        Args:
+            moved([Object]): The objects that moved, None for all of them
+
+        Returns:
+            bool: False if the tree got too slow and has to be built again,
+                the SAH cost grew more than REBUILD_COST_RATIO
+        """
+        if self.root is None:
+            return True
+        if moved is None:
+            moved = self.objects
+        # Every node above a changed leaf, updated from the bottom up
+        dirty = set()
+        for obj in moved:
+            node = self.leaves.get(obj)
+            while node is not None and node not in dirty:
+                dirty.add(node)
+                node = node.parent
+        for node in sorted(dirty, key=lambda n: n.depth, reverse=True):
+            if node.is_leaf:
+                bounds = union_bounds([obj.bounds() for obj in node.objects])
+            else:
+                bounds = node.left.bounds.union(node.right.bounds)
+            self.cost_sum += node.cost * (
+                bounds.surface_area() - node.bounds.surface_area()
+            )
+            node.bounds = bounds
+        return self.sah_cost <= REBUILD_COST_RATIO * self.build_cost
+
+    def closest_hit(self, ray, t_max=np.inf):
+        """
+        Find the closest object hit by the ray.
+
+        Args:
+            ray(Ray): The ray to trace
+            t_max(float): Hits farther than this are ignored
+
+        Returns:
+            tuple: The t of the hit and the object, (t_max, None) if there is
+                no hit
+        """
+        t_min = t_max
+        obj_h = None
+        if self.root is None:
+            return t_min, obj_h
+        inv_nr = inverse_direction(ray.nr)
+        t_root = self.root.bounds.intersect(ray.pr, inv_nr, t_min)
+        stack = [(t_root, self.root)]
+        while stack:
+            t_node, node = stack.pop()
+            # A closer hit could have been found after pushing the node
+            if t_node >= t_min:
+                continue
+            if node.is_leaf:
+                for obj in node.objects:
+                    t, hit_obj = obj.closest_hit(ray)
+                    if 0 < t < t_min:
+                        t_min = t
+                        obj_h = hit_obj
+                continue
+            t_left = node.left.bounds.intersect(ray.pr, inv_nr, t_min)
+            t_right = node.right.bounds.intersect(ray.pr, inv_nr, t_min)
+            # Visit the closest child first
+            if t_left < t_right:
+                stack.append((t_right, node.right))
+                stack.append((t_left, node.left))
+            else:
+                stack.append((t_left, node.left))
+                stack.append((t_right, node.right))
+        return t_min, obj_h
+
+    def closest_hit_np(self, rays):
+        """
+        Array version of closest_hit, the rays go down the tree together and
+        each node only checks the rays that enter its box before their
+        closest hit so far.
+
+        Args:
+            rays(RayBatch): The rays to trace
+
+        Returns:
+            tuple: The t of the closest hit for every ray (inf if there is no
+                hit), the ID of the object that was hit (-1 when there is no
+                hit) and the part of the object that was hit (-1 for objects
+                without parts)
+        """
+        t_min = np.full(len(rays), np.inf)
+        obj_ids = np.full(len(rays), -1)
+        part_ids = np.full(len(rays), -1)
+        if self.root is None:
+            return t_min, obj_ids, part_ids
+        inv_nr = inverse_direction(rays.nr)
+        stack = [(self.root, np.arange(len(rays)))]
+        while stack:
+            node, rows = stack.pop()
+            # Closer hits could have been found after pushing the node
+            hit_box = node.bounds.intersect_np(
+                rays.pr[rows], inv_nr[rows], t_min[rows]
+            )
+            rows = rows[hit_box]
+            if len(rows) == 0:
+                continue
+            if node.is_leaf:
+                for obj in node.objects:
+                    t, parts = rays[rows].intersect_parts(obj)
+                    closer = (0 < t) & (t < t_min[rows])
+                    hit_rows = rows[closer]
+                    t_min[hit_rows] = t[closer]
+                    obj_ids[hit_rows] = obj.ID
+                    part_ids[hit_rows] = -1 if parts is None else parts[closer]
+                continue
+            # Visit first the child that is closer along the mean direction
+            offset = node.right.bounds.centroid - node.left.bounds.centroid
+            if np.dot(offset, rays.nr[rows].sum(axis=0)) > 0:
+                stack.append((node.right, rows))
+                stack.append((node.left, rows))
+            else:
+                stack.append((node.left, rows))
+                stack.append((node.right, rows))
+        return t_min, obj_ids, part_ids
+
+    def occluded(self, ray, max_t, exclude_id=None):
+        """
+        Check if the ray hits any object before max_t, it stops at the first
+        hit found. Used for shadows.
+
+        Args:
+            ray(Ray): The ray to trace
+            max_t(float): Hits farther than this are ignored
+            exclude_id(int): ID of the object that is ignored, like the one
+                where the ray starts
+
+        Returns:
+            bool: Whether there is a hit
+        """
+        if self.root is None:
+            return False
+        inv_nr = inverse_direction(ray.nr)
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.bounds.intersect(ray.pr, inv_nr, max_t) == np.inf:
+                continue
+            if node.is_leaf:
+                for obj in node.objects:
+                    if obj.is_excluded(exclude_id):
+                        continue
+                    t = ray.intersect(obj)
+                    if 0 < t < max_t:
+                        return True
+                continue
+            stack.append(node.right)
+            stack.append(node.left)
+        return False
+
+    def occluded_np(self, rays, max_t, exclude_ids=None):
+        """
+        Array version of occluded, the rays go down the tree together and
+        each node only checks the rays that hit its box and have no hit yet.
+
+        Args:
+            rays(RayBatch): The rays to trace
+            max_t(numpy.array): Hits farther than this are ignored (N,)
+            exclude_ids(numpy.array): ID of the object that each ray ignores
+                with shape (N,)
+
+        Returns:
+            numpy.array: Mask of the rays that hit an object with shape (N,)
+        """
+        occluded = np.zeros(len(rays), dtype=bool)
+        if self.root is None:
+            return occluded
+        inv_nr = inverse_direction(rays.nr)
+        stack = [(self.root, np.arange(len(rays)))]
+        while stack:
+            node, rows = stack.pop()
+            rows = rows[~occluded[rows]]
+            if len(rows) == 0:
+                continue
+            hit_box = node.bounds.intersect_np(
+                rays.pr[rows], inv_nr[rows], max_t[rows]
+            )
+            rows = rows[hit_box]
+            if len(rows) == 0:
+                continue
+            if node.is_leaf:
+                for obj in node.objects:
+                    pending = rows[~occluded[rows]]
+                    if exclude_ids is not None and not obj.parts_occlude:
+                        pending = pending[exclude_ids[pending] != obj.ID]
+                    if len(pending) == 0:
+                        continue
+                    t = rays[pending].intersect(obj)
+                    occluded[pending] = (0 < t) & (t < max_t[pending])
+                continue
+            stack.append((node.right, rows))
+            stack.append((node.left, rows))
+        return occluded
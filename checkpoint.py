@@ -0,0 +1,154 @@
+import numpy as np
+import os
+import shutil
+import time
+
+# Local Modules
+from constants import RGB_CHANNELS
+from framebuffer import Accumulator
+from tiles import DEFAULT_TILE_SIZE, create_tiles
+
+
+CHECKPOINT_DIR = "checkpoint"
+# Seconds between each time the checkpoint is written to disk
+CHECKPOINT_INTERVAL = 60
+META_FILENAME = "meta.npy"
+COLOR_SUM_FILENAME = "color_sum.npy"
+COUNTS_FILENAME = "counts.npy"
+LUMINANCE_SQ_SUM_FILENAME = "luminance_sq_sum.npy"
+TILES_DONE_FILENAME = "tiles_done.npy"
+RNG_STATE_FILENAME = "rng_state.npy"
+
+
+class Checkpoint:
+    """
+    State of a render stored in memory-mapped files inside a directory, so a
+    long render can continue from the last checkpoint after a crash.
+
+    The accumulation buffers are written directly in the mapped files, on
+    resume the tiles that were not marked as done are cleared and rendered
+    again.
+
+    Attributes:
+        directory(str): Folder with the checkpoint files
+        height(int): Height of the image in pixels
+        width(int): Width of the image in pixels
+        tiles([Tile]): The tiles of the render in scanline order
+        accumulator(Accumulator): Color sums and sample counts of the pixels
+        tiles_done(numpy.memmap): Whether each tile is finished
+        interval(float): Seconds between writes to disk
+    """
+    def __init__(
+        self, directory, height, width, v_samples, h_samples,
+        tile_size=DEFAULT_TILE_SIZE, resume=False,
+        interval=CHECKPOINT_INTERVAL
+    ):
+        self.directory = directory
+        self.height = height
+        self.width = width
+        self.tiles = create_tiles(height, width, tile_size)
+        self.interval = interval
+        self.last_flush = time.time()
+        meta = np.array([height, width, v_samples, h_samples, tile_size])
+        meta_path = self.path(META_FILENAME)
+        if resume and os.path.exists(meta_path):
+            saved_meta = np.load(meta_path)
+            if not np.array_equal(saved_meta, meta):
+                raise ValueError(
+                    "Checkpoint in {} is for a different render: {}".format(
+                        directory, saved_meta
+                    )
+                )
+            mode = 'r+'
+        else:
+            os.makedirs(directory, exist_ok=True)
+            np.save(meta_path, meta)
+            mode = 'w+'
+        self.accumulator = Accumulator(height, width)
+        self.accumulator.color_sum = self.open_array(
+            COLOR_SUM_FILENAME, mode, (height, width, RGB_CHANNELS),
+            np.float32
+        )
+        self.accumulator.counts = self.open_array(
+            COUNTS_FILENAME, mode, (height, width), np.int32
+        )
+        self.accumulator.luminance_sq_sum = self.open_array(
+            LUMINANCE_SQ_SUM_FILENAME, mode, (height, width), np.float32
+        )
+        self.tiles_done = self.open_array(
+            TILES_DONE_FILENAME, mode, (len(self.tiles),), np.bool_
+        )
+        if mode == 'r+':
+            self.clear_unfinished_tiles()
+            self.load_rng_state()
+            print("Resuming render with {}/{} tiles done".format(
+                self.tiles_done.sum(), len(self.tiles)
+            ))
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def open_array(self, filename, mode, shape, dtype):
+        return np.lib.format.open_memmap(
+            self.path(filename), mode=mode, dtype=dtype, shape=shape
+        )
+
+    def clear_unfinished_tiles(self):
+        """
+        Remove the samples of tiles that were not finished, they could have
+        been partially added before the crash.
+        """
+        accumulator = self.accumulator
+        for tile, done in zip(self.tiles, self.tiles_done):
+            if done:
+                continue
+            region = (slice(tile.j0, tile.j1), slice(tile.i0, tile.i1))
+            accumulator.color_sum[region] = 0
+            accumulator.counts[region] = 0
+            accumulator.luminance_sq_sum[region] = 0
+
+    def load_rng_state(self):
+        rng_path = self.path(RNG_STATE_FILENAME)
+        if os.path.exists(rng_path):
+            state = np.load(rng_path, allow_pickle=True)
+            np.random.set_state(tuple(state))
+
+    def save_rng_state(self):
+        # Write a temporary file first so a crash can't leave it incomplete
+        rng_path = self.path(RNG_STATE_FILENAME)
+        tmp_path = self.path("tmp_" + RNG_STATE_FILENAME)
+        state = np.empty(5, dtype=object)
+        state[:] = np.random.get_state()
+        np.save(tmp_path, state, allow_pickle=True)
+        os.replace(tmp_path, rng_path)
+
+    def mark_done(self, index):
+        """
+        Mark a tile as finished and write the checkpoint to disk if the
+        interval has passed.
+
+        Args:
+            index(int): Index of the tile in tiles
+        """
+        self.tiles_done[index] = True
+        if time.time() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the current state of the render to disk.
+        """
+        self.accumulator.color_sum.flush()
+        self.accumulator.counts.flush()
+        self.accumulator.luminance_sq_sum.flush()
+        self.tiles_done.flush()
+        self.save_rng_state()
+        self.last_flush = time.time()
+
+    def remove(self):
+        """
+        Delete the checkpoint files, used after the render is finished.
+        """
+        self.accumulator = None
+        self.tiles_done = None
+        shutil.rmtree(self.directory)
@@ -0,0 +1,231 @@
+from functools import partial
+from multiprocessing import shared_memory
+import numpy as np
+
+# Local Modules
+from constants import MAX_COLOR_VALUE, RGB_CHANNELS
+
+
+# Weights of the RGB channels for the luminance of a color
+LUMINANCE_WEIGHTS = np.array([0.2126, 0.7152, 0.0722])
+
+
+def luminance(colors):
+    """
+    Get the luminance of RGB colors.
+
+    Args:
+        colors(numpy.array): Colors with RGB in the last axis
+
+    Returns:
+        numpy.array: The luminance of each color
+    """
+    return np.dot(colors, LUMINANCE_WEIGHTS)
+
+
+class Framebuffer:
+    """
+    Image in memory where the pixels of the rendered tiles are written.
+
+    Attributes:
+        height(int): Height of the image in pixels
+        width(int): Width of the image in pixels
+        img(numpy.array): The image as a (height, width, 3) uint8 array
+    """
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.img = np.zeros((height, width, RGB_CHANNELS), dtype=np.uint8)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_tile(self, tile, pixels):
+        """
+        Write the pixels of a rendered tile into the framebuffer.
+
+        Args:
+            tile(Tile): The region of the image that was rendered
+            pixels(numpy.array): Colors of the tile with shape
+                (tile.height, tile.width, 3)
+        """
+        self.img[tile.j0:tile.j1, tile.i0:tile.i1] = pixels
+
+    def snapshot(self):
+        """
+        Get a copy of the current content of the framebuffer.
+
+        Returns:
+            numpy.array: The image with the pixels rendered so far
+        """
+        return self.img.copy()
+
+    def attach(self):
+        """
+        Get a function that opens this framebuffer from a worker process.
+
+        Returns:
+            function: Returns a framebuffer that writes in the same image
+        """
+        raise NotImplementedError(
+            "A framebuffer in memory can't be shared with other processes"
+        )
+
+    def close(self):
+        self.img = None
+
+
+class SharedFramebuffer(Framebuffer):
+    """
+    Image stored in shared memory so the worker processes can write their
+    pixels directly into it and the parent process can read it at any time.
+
+    Attributes:
+        height(int): Height of the image in pixels
+        width(int): Width of the image in pixels
+        name(str): Name of the shared memory block, used by the workers to
+            attach to this framebuffer
+        img(numpy.array): The image as a (height, width, 3) uint8 array backed
+            by the shared memory
+    """
+    def __init__(self, height, width, name=None):
+        self.height = height
+        self.width = width
+        shape = (height, width, RGB_CHANNELS)
+        # Only the process that creates the block can free it
+        self.owner = name is None
+        if self.owner:
+            size = int(np.prod(shape))
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.img = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+        if self.owner:
+            self.img[:] = 0
+
+    def attach(self):
+        return partial(SharedFramebuffer, self.height, self.width, self.name)
+
+    def close(self):
+        """
+        Detach from the shared memory, and free it if this process created it.
+        """
+        self.img = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class MappedFramebuffer(Framebuffer):
+    """
+    Image stored in a .npy file mapped in memory, so images bigger than the
+    available memory can be rendered. The worker processes open the same file
+    and write their pixels directly into it.
+
+    Attributes:
+        height(int): Height of the image in pixels
+        width(int): Width of the image in pixels
+        path(str): Path of the .npy file
+        img(numpy.memmap): The image as a (height, width, 3) uint8 array
+            backed by the file
+    """
+    def __init__(self, height, width, path, mode='w+'):
+        self.height = height
+        self.width = width
+        self.path = path
+        self.img = np.lib.format.open_memmap(
+            path, mode=mode, dtype=np.uint8,
+            shape=(height, width, RGB_CHANNELS)
+        )
+
+    def attach(self):
+        return partial(
+            MappedFramebuffer, self.height, self.width, self.path, 'r+'
+        )
+
+    def close(self):
+        """
+        Write the pixels to the file and unmap it.
+        """
+        self.img.flush()
+        self.img = None
+
+
+class Accumulator:
+    """
+    Float buffer that accumulates the color samples of every pixel, so the
+    image can be refined by adding more samples at any time.
+
+    Attributes:
+        height(int): Height of the image in pixels
+        width(int): Width of the image in pixels
+        color_sum(numpy.array): Sum of the sample colors for each pixel with
+            shape (height, width, 3)
+        counts(numpy.array): Number of samples for each pixel with shape
+            (height, width)
+        luminance_sq_sum(numpy.array): Sum of the squared luminance of the
+            samples for each pixel, used for estimating the variance
+    """
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.color_sum = np.zeros((height, width, RGB_CHANNELS), np.float32)
+        self.counts = np.zeros((height, width), np.int32)
+        self.luminance_sq_sum = np.zeros((height, width), np.float32)
+
+    def add(self, pixel_indices, colors):
+        """
+        Add color samples to the pixels.
+
+        Args:
+            pixel_indices(numpy.array): Scanline index (j * width + i) of the
+                pixel of every sample, it can be repeated
+            colors(numpy.array): The color of every sample with shape (N, 3)
+        """
+        color_sum = self.color_sum.reshape(-1, RGB_CHANNELS)
+        counts = self.counts.reshape(-1)
+        luminance_sq_sum = self.luminance_sq_sum.reshape(-1)
+        np.add.at(color_sum, pixel_indices, colors)
+        np.add.at(counts, pixel_indices, 1)
+        np.add.at(luminance_sq_sum, pixel_indices, luminance(colors) ** 2)
+
+    def average(self):
+        """
+        Get the average color of each pixel, 0 for pixels without samples.
+
+        Returns:
+            numpy.array: The colors in float with shape (height, width, 3)
+        """
+        counts = np.maximum(self.counts, 1)[:, :, np.newaxis]
+        return self.color_sum / counts
+
+    def error(self):
+        """
+        Get the estimated standard error of the mean luminance of each pixel,
+        infinite for pixels with less than 2 samples.
+
+        Returns:
+            numpy.array: The errors with shape (height, width)
+        """
+        counts = np.maximum(self.counts, 1)
+        mean = luminance(self.average())
+        variance = np.maximum(self.luminance_sq_sum / counts - mean ** 2, 0)
+        # Use the unbiased estimator of the variance
+        variance *= counts / np.maximum(counts - 1, 1)
+        error = np.sqrt(variance / counts)
+        error[self.counts < 2] = np.inf
+        return error
+
+    def image(self):
+        """
+        Get the image with the samples accumulated so far.
+
+        Returns:
+            numpy.array: The pixels in uint8 with shape (height, width, 3)
+        """
+        colors = np.clip(self.average().round(), 0, MAX_COLOR_VALUE)
+        return colors.astype(np.uint8)
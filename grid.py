@@ -0,0 +1,415 @@
+import numpy as np
+
+# Local Modules
+from bvh import inverse_direction, slab_intersect, union_bounds
+
+
+# Number of cells per object in the grid
+GRID_DENSITY = 4
+# Maximum number of cells in every axis
+GRID_MAX_RESOLUTION = 128
+
+
+class Grid:
+    """
+    Uniform grid over objects with bounds. Only the cells with objects are
+    stored, in a dictionary by the index of the cell, so building it is
+    linear in the number of objects and it can be built again every frame of
+    an animation. Rays visit the cells in order with a 3D-DDA.
+
+    Attributes:
+        objects([Object]): The objects inside the grid
+        bounds(AABB): Box around all the objects, None without objects
+        resolution(numpy.array): Number of cells in x, y and z
+        cell_size(numpy.array): Size of a cell in x, y and z
+        cells(dict): Indices of the objects that overlap every cell, by the
+            (x, y, z) index of the cell
+        object_cells(list): First and last cell of every object
+        indices(dict): Index of every object
+        cell_table(tuple): The cells as arrays for occluded_np, built when
+            needed and cleared by refit
+    """
+    def __init__(self, objects):
+        self.objects = list(objects)
+        self.bounds = None
+        self.cells = {}
+        self.object_cells = []
+        self.indices = {obj: idx for idx, obj in enumerate(self.objects)}
+        self.cell_table = None
+        if not self.objects:
+            return
+        boxes = [obj.bounds() for obj in self.objects]
+        self.bounds = union_bounds(boxes)
+        extent = self.bounds.p_max - self.bounds.p_min
+        # Cells close to cubes with about GRID_DENSITY cells per object
+        volume = np.prod(extent[extent > 0]) if np.any(extent > 0) else 1
+        dims = max(1, np.count_nonzero(extent > 0))
+        cells_per_unit = (GRID_DENSITY * len(self.objects) / volume) ** (
+            1 / dims
+        )
+        self.resolution = np.clip(
+            np.round(extent * cells_per_unit), 1, GRID_MAX_RESOLUTION
+        ).astype(int)
+        # A flat grid still needs a size for its only cell
+        self.cell_size = np.where(
+            extent > 0, extent / self.resolution, 1.0
+        )
+        p_mins = np.array([box.p_min for box in boxes])
+        p_maxs = np.array([box.p_max for box in boxes])
+        first_cells = self.cell_index(p_mins)
+        last_cells = self.cell_index(p_maxs)
+        for idx in range(len(self.objects)):
+            self.object_cells.append((first_cells[idx], last_cells[idx]))
+            for cell in self.cell_range(idx):
+                self.cells.setdefault(cell, []).append(idx)
+
+    def cell_range(self, idx):
+        """
+        Get the cells that the box of an object overlaps.
+
+        Args:
+            idx(int): Index of the object
+
+        Yields:
+            tuple: The (x, y, z) index of every cell
+        """
+        (x0, y0, z0), (x1, y1, z1) = self.object_cells[idx]
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                for z in range(z0, z1 + 1):
+                    yield x, y, z
+
+    def refit(self, moved=None):
+        """
+        Move the objects that changed to the cells of their new bounds.
+
+        Args:
+            moved([Object]): The objects that moved, None for all of them
+
+        Returns:
+            bool: False if the grid has to be built again, when an object
+                left the bounds of the grid
+        """
+        if moved is None:
+            return False
+        self.cell_table = None
+        for obj in moved:
+            idx = self.indices.get(obj)
+            if idx is None:
+                continue
+            box = obj.bounds()
+            if (
+                np.any(box.p_min < self.bounds.p_min)
+                or np.any(box.p_max > self.bounds.p_max)
+            ):
+                return False
+            for cell in self.cell_range(idx):
+                objects = self.cells[cell]
+                objects.remove(idx)
+                if not objects:
+                    del self.cells[cell]
+            self.object_cells[idx] = (
+                self.cell_index(box.p_min), self.cell_index(box.p_max)
+            )
+            for cell in self.cell_range(idx):
+                self.cells.setdefault(cell, []).append(idx)
+        return True
+
+    def cell_index(self, p):
+        """
+        Get the index of the cells that contain the points p.
+
+        Args:
+            p(numpy.array): A point or points with shape (N, 3)
+
+        Returns:
+            numpy.array: The (x, y, z) index of the cells
+        """
+        idx = np.floor((p - self.bounds.p_min) / self.cell_size).astype(int)
+        return np.clip(idx, 0, self.resolution - 1)
+
+    def traverse(self, ray, t_max):
+        """
+        Visit the cells that the ray goes through in order.
+
+        Args:
+            ray(Ray): The ray to trace
+            t_max(float): The traversal stops after this t
+
+        Yields:
+            tuple: The indices of the objects of each cell that has objects
+                and the t where the ray leaves the cell
+        """
+        if self.bounds is None:
+            return
+        inv_nr = inverse_direction(ray.nr)
+        t_enter = self.bounds.intersect(ray.pr, inv_nr, t_max)
+        if t_enter == np.inf:
+            return
+        cell = [int(c) for c in self.cell_index(ray.at(t_enter))]
+        p_min = self.bounds.p_min
+        resolution = [int(r) for r in self.resolution]
+        step = []
+        t_next = []
+        t_delta = []
+        for axis in range(3):
+            size = float(self.cell_size[axis])
+            nr = float(ray.nr[axis])
+            if nr > 0:
+                step.append(1)
+                border = p_min[axis] + (cell[axis] + 1) * size
+            elif nr < 0:
+                step.append(-1)
+                border = p_min[axis] + cell[axis] * size
+            else:
+                step.append(0)
+                t_next.append(np.inf)
+                t_delta.append(np.inf)
+                continue
+            t_next.append(float((border - ray.pr[axis]) * inv_nr[axis]))
+            t_delta.append(abs(size * float(inv_nr[axis])))
+        while True:
+            t_exit = min(t_next)
+            objects = self.cells.get(tuple(cell))
+            if objects:
+                yield objects, t_exit
+            if t_exit > t_max:
+                return
+            axis = t_next.index(t_exit)
+            cell[axis] += step[axis]
+            if not 0 <= cell[axis] < resolution[axis]:
+                return
+            t_next[axis] += t_delta[axis]
+
+    def closest_hit(self, ray, t_max=np.inf):
+        """
+        Find the closest object hit by the ray.
+
+        Args:
+            ray(Ray): The ray to trace
+            t_max(float): Hits farther than this are ignored
+
+        Returns:
+            tuple: The t of the hit and the object, (t_max, None) if there is
+                no hit
+        """
+        t_min = t_max
+        obj_h = None
+        # Objects in many cells are only intersected once
+        tested = set()
+        for objects, t_exit in self.traverse(ray, t_max):
+            for idx in objects:
+                if idx in tested:
+                    continue
+                tested.add(idx)
+                t, hit_obj = self.objects[idx].closest_hit(ray)
+                if 0 < t < t_min:
+                    t_min = t
+                    obj_h = hit_obj
+            # A hit inside this cell can't be behind an object of later cells
+            if t_min <= t_exit:
+                break
+        return t_min, obj_h
+
+    def occluded(self, ray, max_t, exclude_id=None):
+        """
+        Check if the ray hits any object before max_t, it stops at the first
+        hit found. Used for shadows.
+
+        Args:
+            ray(Ray): The ray to trace
+            max_t(float): Hits farther than this are ignored
+            exclude_id(int): ID of the object that is ignored, like the one
+                where the ray starts
+
+        Returns:
+            bool: Whether there is a hit
+        """
+        tested = set()
+        for objects, _ in self.traverse(ray, max_t):
+            for idx in objects:
+                if idx in tested:
+                    continue
+                tested.add(idx)
+                obj = self.objects[idx]
+                if obj.is_excluded(exclude_id):
+                    continue
+                t = ray.intersect(obj)
+                if 0 < t < max_t:
+                    return True
+        return False
+
+    def cell_key(self, cells):
+        """
+        Get a single integer for every cell index, the keys sort like the
+        (x, y, z) tuples.
+
+        Args:
+            cells(numpy.array): The (x, y, z) index of cells with shape (N, 3)
+
+        Returns:
+            numpy.array: The key of every cell with shape (N,)
+        """
+        _, ry, rz = self.resolution
+        return (cells[..., 0] * ry + cells[..., 1]) * rz + cells[..., 2]
+
+    def get_cell_table(self):
+        """
+        Get the cells that have objects as arrays, so many rays can look up
+        their cells at the same time.
+
+        Returns:
+            tuple: The sorted keys of the cells, where the objects of every
+                cell start in the objects array and the objects array with
+                the indices of the objects of all the cells
+        """
+        if self.cell_table is None:
+            cells = sorted(self.cells.items())
+            keys = self.cell_key(np.array([cell for cell, _ in cells]))
+            counts = [len(objects) for _, objects in cells]
+            starts = np.concatenate([[0], np.cumsum(counts)])
+            objects = np.concatenate([objects for _, objects in cells])
+            self.cell_table = (keys, starts, objects.astype(int))
+        return self.cell_table
+
+    def traverse_np(self, rays, max_t):
+        """
+        Array version of traverse, the rays walk the grid at the same time
+        and every step moves each ray to its next cell with a 3D-DDA.
+
+        Args:
+            rays(RayBatch): The rays to trace
+            max_t(numpy.array): The traversal of every ray stops after this
+                t (N,), it is read on every step so lowering it while
+                traversing stops the rays early
+
+        Yields:
+            tuple: The rays and objects of every pair of a ray and an object
+                of the cell where the ray is in this step
+        """
+        if self.bounds is None:
+            return
+        keys, starts, cell_objects = self.get_cell_table()
+        inv_nr = inverse_direction(rays.nr)
+        t_near, t_far = slab_intersect(
+            self.bounds.p_min, self.bounds.p_max, rays.pr, inv_nr
+        )
+        rows = np.flatnonzero(
+            (t_near <= t_far) & (t_far >= 0) & (t_near <= max_t)
+        )
+        pr = rays.pr[rows]
+        nr = rays.nr[rows]
+        inv_nr = inv_nr[rows]
+        t_enter = np.maximum(t_near[rows], 0)[:, np.newaxis]
+        cells = self.cell_index(pr + t_enter * nr)
+        step = np.sign(nr).astype(int)
+        border = self.bounds.p_min + (cells + (step > 0)) * self.cell_size
+        moves = step != 0
+        t_next = np.where(moves, (border - pr) * inv_nr, np.inf)
+        t_delta = np.where(moves, np.abs(self.cell_size * inv_nr), np.inf)
+        while len(rows):
+            # Objects of the cells where the rays are
+            cell_keys = self.cell_key(cells)
+            pos = np.minimum(np.searchsorted(keys, cell_keys), len(keys) - 1)
+            found = keys[pos] == cell_keys
+            first = starts[pos[found]]
+            counts = starts[pos[found] + 1] - first
+            offsets = np.cumsum(counts) - counts
+            if len(counts):
+                yield np.repeat(rows[found], counts), cell_objects[
+                    np.repeat(first - offsets, counts)
+                    + np.arange(counts.sum())
+                ]
+            # Move to the next cell, stopping after max_t or out of the grid
+            axis = np.argmin(t_next, axis=1)
+            k = np.arange(len(rows))
+            t_exit = t_next[k, axis]
+            cells[k, axis] += step[k, axis]
+            t_next[k, axis] += t_delta[k, axis]
+            inside = (
+                (cells[k, axis] >= 0)
+                & (cells[k, axis] < self.resolution[axis])
+            )
+            keep = (t_exit <= max_t[rows]) & inside
+            rows = rows[keep]
+            cells = cells[keep]
+            step = step[keep]
+            t_next = t_next[keep]
+            t_delta = t_delta[keep]
+
+    def closest_hit_np(self, rays):
+        """
+        Array version of closest_hit, the rays walk the grid together and
+        every ray stops at the first cell that has its closest hit.
+
+        Args:
+            rays(RayBatch): The rays to trace
+
+        Returns:
+            tuple: The t of the closest hit for every ray (inf if there is no
+                hit), the ID of the object that was hit (-1 when there is no
+                hit) and the part of the object that was hit (-1 for objects
+                without parts)
+        """
+        t_min = np.full(len(rays), np.inf)
+        obj_ids = np.full(len(rays), -1)
+        part_ids = np.full(len(rays), -1)
+        # The traversal reads t_min, a hit before the exit of the current
+        # cell can't be behind an object of later cells
+        for ray_ids, cell_obj_ids in self.traverse_np(rays, t_min):
+            order = np.argsort(cell_obj_ids, kind='stable')
+            ray_ids = ray_ids[order]
+            cell_obj_ids = cell_obj_ids[order]
+            splits = np.flatnonzero(np.diff(cell_obj_ids)) + 1
+            for rows, idx in zip(
+                    np.split(ray_ids, splits),
+                    cell_obj_ids[np.concatenate([[0], splits])]
+            ):
+                obj = self.objects[idx]
+                t, parts = rays[rows].intersect_parts(obj)
+                closer = (0 < t) & (t < t_min[rows])
+                hit_rows = rows[closer]
+                t_min[hit_rows] = t[closer]
+                obj_ids[hit_rows] = obj.ID
+                part_ids[hit_rows] = -1 if parts is None else parts[closer]
+        return t_min, obj_ids, part_ids
+
+    def occluded_np(self, rays, max_t, exclude_ids=None):
+        """
+        Array version of occluded, the rays walk the grid together and then
+        every object is checked with all the rays that went through its
+        cells.
+
+        Args:
+            rays(RayBatch): The rays to trace
+            max_t(numpy.array): Hits farther than this are ignored (N,)
+            exclude_ids(numpy.array): ID of the object that each ray ignores
+                with shape (N,)
+
+        Returns:
+            numpy.array: Mask of the rays that hit an object with shape (N,)
+        """
+        occluded = np.zeros(len(rays), dtype=bool)
+        steps = list(self.traverse_np(rays, max_t))
+        if not steps:
+            return occluded
+        ray_ids = np.concatenate([ray_ids for ray_ids, _ in steps])
+        obj_ids = np.concatenate([obj_ids for _, obj_ids in steps])
+        # Objects in many cells are only intersected once with each ray
+        pairs = np.unique(obj_ids * len(rays) + ray_ids)
+        obj_ids, ray_ids = np.divmod(pairs, len(rays))
+        splits = np.flatnonzero(np.diff(obj_ids)) + 1
+        for start, end in zip(
+                np.concatenate([[0], splits]),
+                np.concatenate([splits, [len(pairs)]])
+        ):
+            obj = self.objects[obj_ids[start]]
+            pending = ray_ids[start:end]
+            pending = pending[~occluded[pending]]
+            if exclude_ids is not None and not obj.parts_occlude:
+                pending = pending[exclude_ids[pending] != obj.ID]
+            if len(pending) == 0:
+                continue
+            t = rays[pending].intersect(obj)
+            occluded[pending] = (0 < t) & (t < max_t[pending])
+        return occluded
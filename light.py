@@ -9,9 +9,30 @@ MAX_DISTANCE_LIGHT = np.inf
 # Default horizontal and vertical number of samples for area lights
 AREA_LIGHT_M = 8
 AREA_LIGHT_N = 8
+# Number of jittered patterns that an area light computes once and reuses
+AREA_LIGHT_PATTERNS = 256
 #
 
 
+def stratified_offsets(count, m, n):
+    """
+    Get jittered points in the unit square dividing it m horizontally and n
+    vertically, with one random point in every cell.
+
+    Args:
+        count (int): Number of sets of points
+        m (int): Number of horizontal cells
+        n (int): Number of vertical cells
+
+    Returns:
+        numpy.array: The x and y of the points with shape (count, m * n, 2)
+    """
+    i = np.repeat(np.arange(m), n)
+    j = np.tile(np.arange(n), m)
+    r0, r1 = np.random.random_sample((2, count, m * n))
+    return np.stack([(i + r0) / m, (j + r1) / n], axis=2)
+
+
 class Light:
     """
     Light for a Scene.
@@ -52,6 +73,30 @@ class Light:
         l = np.array([0, 1, 0], dtype=float)
         return l
 
+    def get_dist_np(self, ph):
+        """
+        Get distance from the light to every point in ph.
+
+        Args:
+            ph (numpy.array): 3D points of hit with shape (N, 3)
+
+        Returns:
+            numpy.array: distances from the light to the points in ph
+        """
+        return np.linalg.norm(self.position - ph, axis=1)
+
+    def get_l_np(self, ph):
+        """
+        Get unit vectors l that point to the light from every point in ph.
+
+        Args:
+            ph (numpy.array): 3D points of hit with shape (N, 3)
+
+        Returns:
+            numpy.array: unit vectors pointing to the light with shape (N, 3)
+        """
+        return np.tile(self.get_l(None), (len(ph), 1))
+
 
 class DirectionalLight(Light):
     """
@@ -70,6 +115,9 @@ class DirectionalLight(Light):
         """
         return MAX_DISTANCE_LIGHT
 
+    def get_dist_np(self, ph):
+        return np.full(len(ph), MAX_DISTANCE_LIGHT)
+
     def get_l(self, ph):
         """
         Get unit vector l that points to the light from hit point ph.
@@ -102,6 +150,9 @@ class PointLight(Light):
         l = utils.normalize(self.position - ph)
         return l
 
+    def get_l_np(self, ph):
+        return utils.normalize_rows(self.position - ph)
+
 
 class SpotLight(Light):
     """
@@ -136,6 +187,12 @@ class SpotLight(Light):
             l = np.zeros(3)
         return l
 
+    def get_l_np(self, ph):
+        l = utils.normalize_rows(self.position - ph)
+        outside = np.dot(-1 * l, self.nl) < self.cos_theta
+        l[outside] = 0
+        return l
+
 
 class AreaLight(Light):
     """
@@ -148,6 +205,8 @@ class AreaLight(Light):
         n0 (numpy.array): Unit vector for horizontal direction
         n1 (numpy.array): Unit vector for vertical direction
         p00 (numpy.array): Origin point for area light
+        patterns (dict): The AREA_LIGHT_PATTERNS jittered patterns for every
+            number of samples (m, n) used, created on first use
     """
 
     def __init__(self, position, s0, s1, n0=DEFAULT_N0, n1=DEFAULT_N1):
@@ -157,6 +216,7 @@ class AreaLight(Light):
         self.n0 = n0
         self.n1 = n1
         self.p00 = position - (float(s0) / 2) * n0 - (float(s1) / 2) * n1
+        self.patterns = {}
 
     def get_l(self, ph):
         """
@@ -176,24 +236,74 @@ class AreaLight(Light):
         l = utils.normalize(p - ph)
         return l
 
+    def get_l_np(self, ph):
+        r0, r1 = np.random.random_sample((2, len(ph)))
+        x = r0 * self.s0
+        y = r1 * self.s1
+        p = (
+            self.p00
+            + x[:, np.newaxis] * self.n0
+            + y[:, np.newaxis] * self.n1
+        )
+        return utils.normalize_rows(p - ph)
+
+    def get_probes(self):
+        """
+        Get the corners and the center of the area, adaptive shadows check
+        them before the samples.
+
+        Returns:
+            numpy.array: The 5 points in world space with shape (5, 3)
+        """
+        corners = np.array([[0, 0], [1, 0], [0, 1], [1, 1], [0.5, 0.5]])
+        return self.to_world(corners)
+
+    def get_patterns(self, m, n):
+        if (m, n) not in self.patterns:
+            self.patterns[(m, n)] = stratified_offsets(
+                AREA_LIGHT_PATTERNS, m, n
+            )
+        return self.patterns[(m, n)]
+
+    def to_world(self, offsets):
+        """
+        Get the points of the area for offsets in the unit square.
+        """
+        x = offsets[..., 0:1] * self.s0
+        y = offsets[..., 1:2] * self.s1
+        return self.p00 + x * self.n0 + y * self.n1
+
     def get_samples(self, m=AREA_LIGHT_M, n=AREA_LIGHT_N):
         """
         Get sample points from the area light dividing the area m horizontally
-        and n vertically and using random jitter.
+        and n vertically and using random jitter. The jitter is one of the
+        patterns of the light chosen at random.
 
         Args:
             m (int): Number of horizontal samples to use
             n (int): Number of vertical samples to use
 
         Returns:
-            list of numpy.array: sample positions in world space
-        """
-        samples = []
-        for i in range(m):
-            for j in range(n):
-                r0, r1 = np.random.random_sample(2)
-                x = ((i + r0) / m) * self.s0
-                y = ((j + r1) / n) * self.s1
-                p = self.p00 + x * self.n0 + y * self.n1
-                samples.append(p)
-        return samples
+            numpy.array: sample positions in world space with shape (m * n, 3)
+        """
+        patterns = self.get_patterns(m, n)
+        return self.to_world(patterns[np.random.randint(len(patterns))])
+
+    def get_samples_np(self, size, m=AREA_LIGHT_M, n=AREA_LIGHT_N):
+        """
+        Get a set of jittered sample points from the area light for each of
+        size hit points, like calling get_samples size times.
+
+        Args:
+            size (int): Number of sample sets to create
+            m (int): Number of horizontal samples to use
+            n (int): Number of vertical samples to use
+
+        Returns:
+            numpy.array: sample positions in world space with shape
+                (size, m * n, 3)
+        """
+        patterns = self.get_patterns(m, n)
+        return self.to_world(
+            patterns[np.random.randint(len(patterns), size=size)]
+        )
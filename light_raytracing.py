@@ -16,15 +16,8 @@ def transport_light(ray, scene, light_intensity, depth=0):
     # Only use one bounce for now
     if depth == 2:
         return
-    # Get closest intersection point
-    t_min = np.inf
-    # The closest object hit by the ray
-    obj_h = None
-    for obj in scene.objects:
-        t = ray.intersect(obj)
-        if 0 < t < t_min:
-            t_min = t
-            obj_h = obj
+    # Get closest intersection point and the object hit by the ray
+    t_min, obj_h = scene.closest_hit(ray)
     if obj_h:
         ph = ray.at(t_min)
         # store the illumination
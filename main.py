@@ -1,3 +1,4 @@
+from functools import partial
 import getopt
 import numpy as np
 import os
@@ -7,6 +8,7 @@ import time
 # Local Modules
 from animation import Animation
 from camera import Camera, LensParams
+from checkpoint import CHECKPOINT_DIR, Checkpoint
 from constants import MAX_QUALITY
 from env_map import EnvironmentMap
 from light import AreaLight, DirectionalLight, PointLight, SpotLight
@@ -16,8 +18,8 @@ import material
 from normal_map import NormalMap
 from object import Cube, Plane, Sphere, Tetrahedron, Triangle
 from render import render_aa, render_dof, render, render_mp, render_aa_mp, \
-    render_aa_mp_unordered
-from scene import Scene
+    render_aa_mp_unordered, render_adaptive, render_batch, render_progressive
+from scene import ACCEL_BVH, ACCEL_GRID, Scene
 import shaders
 from texture import ImageTexture, SolidImageTexture, Box
 import utils
@@ -153,17 +155,23 @@ def set_objects_id(objects):
         objects[i].set_id(i)
 
 
-def setup_scene():
+def setup_scene(accel_type=ACCEL_BVH):
     cameras = setup_cameras()
     lights = setup_lights()
     objects = setup_objects()
     set_objects_id(objects)
     env_map = EnvironmentMap(HALL_TEXTURE_FILENAME)
-    scene = Scene(cameras, lights, objects, env_map)
+    scene = Scene(cameras, lights, objects, env_map, accel_type=accel_type)
     # scene = Scene(cameras, lights, objects)
+    scene.finalize()
     return scene
 
 
+def save_intermediate_image(img_arr, samples):
+    img = Image.fromarray(img_arr)
+    img.save(OUTPUT_IMG_FILENAME, quality=MAX_QUALITY)
+
+
 def animate(debug_mode, render_function, duration, screen_size, fps, scene):
     # duration in seconds
     render_function = render if debug_mode else render_function
@@ -179,21 +187,35 @@ def main(argv):
     multi_core = False
     # Depth of Field
     dof_mode = False
+    # Trace whole rows of rays at the same time
+    batch_mode = False
+    # Save the image after each pass of samples
+    progressive_mode = False
+    # Spend more samples in noisy pixels
+    adaptive_mode = False
+    # Continue the render from the last checkpoint
+    resume_mode = False
     try:
         opts, args = getopt.getopt(
-            argv, "hdamf", ["help", "debug", "animation", "multi", "dof"]
+            argv, "hdamfbps",
+            [
+                "help", "debug", "animation", "multi", "dof", "batch",
+                "progressive", "adaptive", "resume"
+            ]
         )
     except getopt.GetoptError:
         print(
-            'usage: main.py [-d,-h,-a,-m,-f|--debug,--help,--animation, '
-            '--multi, --dop]'
+            'usage: main.py [-d,-h,-a,-m,-f,-b,-p,-s|--debug,--help,'
+            '--animation, --multi, --dop, --batch, --progressive, '
+            '--adaptive, --resume]'
         )
         sys.exit(2)
     for opt, arg in opts:
         if opt in ('-h', '--help'):
             print(
-                'usage: main.py [-d,-h,-a,-m,-f|--debug,--help,--animation, '
-                '--multi, --dop]'
+                'usage: main.py [-d,-h,-a,-m,-f,-b,-p,-s|--debug,--help,'
+                '--animation, --multi, --dop, --batch, --progressive, '
+                '--adaptive, --resume]'
             )
             sys.exit()
         elif opt in ('-d', '--debug'):
@@ -204,9 +226,30 @@ def main(argv):
             multi_core = True
         elif opt in ('-f', '--dof'):
             dof_mode = True
+        elif opt in ('-b', '--batch'):
+            batch_mode = True
+        elif opt in ('-p', '--progressive'):
+            progressive_mode = True
+        elif opt in ('-s', '--adaptive'):
+            adaptive_mode = True
+        elif opt == '--resume':
+            resume_mode = True
+    # Only the default render of one image saves checkpoints
+    if resume_mode and (
+            debug_mode or animation_mode or multi_core or dof_mode
+            or batch_mode or progressive_mode or adaptive_mode
+    ):
+        print(
+            '--resume only works for single images rendered without '
+            '--debug, --animation, --multi, --dof, --batch, --progressive or '
+            '--adaptive'
+        )
+        sys.exit(2)
     start = time.time()
     print("Setting up...")
-    scene = setup_scene()
+    # The objects move in every frame of an animation, the grid moves them
+    # to their new cells instead of building the BVH again
+    scene = setup_scene(ACCEL_GRID if animation_mode else ACCEL_BVH)
     if multi_core:
         if debug_mode:
             render_function = render_mp
@@ -214,6 +257,14 @@ def main(argv):
             render_function = render_aa_mp_unordered
     elif dof_mode:
         render_function = render_dof
+    elif adaptive_mode and not debug_mode:
+        render_function = render_adaptive
+    elif progressive_mode and not debug_mode:
+        render_function = partial(
+            render_progressive, on_pass=save_intermediate_image
+        )
+    elif batch_mode and not debug_mode:
+        render_function = render_batch
     elif debug_mode:
         render_function = render
     else:
@@ -225,6 +276,12 @@ def main(argv):
         )
         if dof_mode:
             render_msg += " using depth of field"
+        elif adaptive_mode:
+            render_msg += " using adaptive sampling"
+        elif progressive_mode:
+            render_msg += " progressively"
+        elif batch_mode:
+            render_msg += " using batch raytracing"
     if multi_core:
         render_msg += f" using {os.cpu_count()} cores"
     print(render_msg)
@@ -233,6 +290,14 @@ def main(argv):
     if not animation_mode:
         log.start_of_raytracing()
         print("Raytracing...")
+        # Save the progress of long renders so they can be resumed
+        checkpoint = None
+        if render_function is render_aa:
+            checkpoint = Checkpoint(
+                CHECKPOINT_DIR, HEIGHT, WIDTH, V_SAMPLES, H_SAMPLES,
+                resume=resume_mode
+            )
+            render_function = partial(render_aa, checkpoint=checkpoint)
         if debug_mode:
             img_arr = render_function(scene, scene.cameras[0], HEIGHT, WIDTH)
         else:
@@ -242,6 +307,8 @@ def main(argv):
         img = Image.fromarray(img_arr)
         img.save(OUTPUT_IMG_FILENAME, quality=MAX_QUALITY)
         print("Rendered image saved in {}".format(OUTPUT_IMG_FILENAME))
+        if checkpoint:
+            checkpoint.remove()
         log.end_of_raytracing()
     # Create an animation
     # --------------------------------------------------------------------------
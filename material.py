@@ -1,7 +1,16 @@
 import numpy as np
 
+# Local Modules
+from texture import ImageTexture, SolidImageTexture
+
 TYPE_DIFFUSE = "diffuse"
 TYPE_TEXTURED = "textured"
+# Where the color of a material comes from, compiled from material_type and
+# texture when they are set
+TEXTURE_DIFFUSE = 0
+TEXTURE_IMAGE = 1
+TEXTURE_SOLID = 2
+TEXTURE_NONE = 3
 # Color values are not in uint8 so just make sure to clip everything to uint8
 # when rendering the final image
 COLOR_DARK_GRAY = np.array([64, 64, 64])
@@ -29,6 +38,8 @@ class Material:
         roughness(float): parameter for how smooth is the surface of reflection
         illumination_map(IlluminationTexture): an illumination map object for
             backwards raytracing
+        texture_code(int): One of the TEXTURE_ codes for material_type and
+            texture
     """
     def __init__(
         self,
@@ -50,6 +61,21 @@ class Material:
         self.roughness = roughness
         self.illumination_map = None
 
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in ("material_type", "texture"):
+            object.__setattr__(self, "texture_code", self.get_texture_code())
+
+    def get_texture_code(self):
+        if self.material_type == TYPE_DIFFUSE:
+            return TEXTURE_DIFFUSE
+        texture = getattr(self, "texture", None)
+        if isinstance(texture, ImageTexture):
+            return TEXTURE_IMAGE
+        elif isinstance(texture, SolidImageTexture):
+            return TEXTURE_SOLID
+        return TEXTURE_NONE
+
     def add_texture(self, texture):
         self.texture = texture
 
@@ -0,0 +1,348 @@
+import numpy as np
+import os
+
+# Local Modules
+from object import TriangleMesh
+
+
+CACHE_EXTENSION = ".npz"
+# Types of the properties of a PLY file
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"
+}
+PLY_BYTE_ORDER = {
+    "binary_little_endian": "<", "binary_big_endian": ">", "ascii": "="
+}
+PLY_NORMAL_NAMES = ("nx", "ny", "nz")
+PLY_UV_NAMES = (("u", "v"), ("s", "t"), ("texture_u", "texture_v"))
+
+
+def triangulate(polygon):
+    """
+    Split a convex polygon into triangles that share its first vertex.
+
+    Args:
+        polygon(list): Indices of the vertices of the polygon
+
+    Returns:
+        list: The triangles as lists of 3 indices
+    """
+    return [
+        [polygon[0], polygon[k], polygon[k + 1]]
+        for k in range(1, len(polygon) - 1)
+    ]
+
+
+def read_obj(filename):
+    """
+    Read the triangles of a Wavefront OBJ file. Polygons are triangulated and
+    every different combination of position, texture coordinate and normal
+    becomes a vertex, like a Vertex object with its own n, u and v.
+
+    Args:
+        filename(str): Path of the .obj file
+
+    Returns:
+        tuple: Vertices (V, 3), faces (F, 3), normals (V, 3) or None and uvs
+            (V, 2) or None
+    """
+    positions = []
+    uvs = []
+    normals = []
+    # Index of the vertex for each (position, uv, normal) combination
+    vertex_ids = {}
+    keys = []
+    faces = []
+    with open(filename) as f:
+        for line in f:
+            values = line.split()
+            if not values:
+                continue
+            if values[0] == "v":
+                positions.append([float(x) for x in values[1:4]])
+            elif values[0] == "vt":
+                uvs.append([float(x) for x in values[1:3]])
+            elif values[0] == "vn":
+                normals.append([float(x) for x in values[1:4]])
+            elif values[0] == "f":
+                polygon = []
+                for corner in values[1:]:
+                    indices = corner.split("/")
+                    key = []
+                    for k, count in enumerate(
+                        (len(positions), len(uvs), len(normals))
+                    ):
+                        if k < len(indices) and indices[k]:
+                            idx = int(indices[k])
+                            # Negative indices count from the last one
+                            key.append(idx - 1 if idx > 0 else count + idx)
+                        else:
+                            key.append(-1)
+                    key = tuple(key)
+                    if key not in vertex_ids:
+                        vertex_ids[key] = len(keys)
+                        keys.append(key)
+                    polygon.append(vertex_ids[key])
+                faces.extend(triangulate(polygon))
+    keys = np.array(keys, dtype=int).reshape(-1, 3)
+    vertices = np.array(positions, dtype=float)[keys[:, 0]]
+    vertex_uvs = None
+    if uvs and np.all(keys[:, 1] >= 0):
+        vertex_uvs = np.array(uvs, dtype=float)[keys[:, 1]]
+    vertex_normals = None
+    if normals and np.all(keys[:, 2] >= 0):
+        vertex_normals = np.array(normals, dtype=float)[keys[:, 2]]
+    return (
+        vertices, np.array(faces, dtype=int).reshape(-1, 3), vertex_normals,
+        vertex_uvs
+    )
+
+
+def read_ply_header(f):
+    """
+    Read the header of a PLY file.
+
+    Args:
+        f(file): The file opened in binary mode
+
+    Returns:
+        tuple: The format and a list of elements with their name, count and
+            properties, each property is (name, type) or (name, count type,
+            item type) for lists
+    """
+    if f.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+    file_format = None
+    elements = []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("PLY header without end_header")
+        values = line.decode("ascii").split()
+        if not values or values[0] in ("comment", "obj_info"):
+            continue
+        if values[0] == "format":
+            file_format = values[1]
+            if file_format not in PLY_BYTE_ORDER:
+                raise ValueError("Unknown PLY format: {}".format(file_format))
+        elif values[0] == "element":
+            elements.append((values[1], int(values[2]), []))
+        elif values[0] == "property":
+            if values[1] == "list":
+                elements[-1][2].append(
+                    (values[4], PLY_TYPES[values[2]], PLY_TYPES[values[3]])
+                )
+            else:
+                elements[-1][2].append((values[2], PLY_TYPES[values[1]]))
+        elif values[0] == "end_header":
+            return file_format, elements
+
+
+def read_ply_element(f, file_format, count, properties):
+    """
+    Read the rows of an element of a PLY file.
+
+    Returns:
+        dict: Array with the values of each property, lists are arrays of
+            shape (count, n) when all of them have n items, or lists
+    """
+    byte_order = PLY_BYTE_ORDER[file_format]
+    has_lists = any(len(prop) == 3 for prop in properties)
+    if file_format == "ascii":
+        rows = [f.readline().split() for _ in range(count)]
+        if not has_lists:
+            data = np.array(rows, dtype=float).reshape(count, -1)
+            return {
+                prop[0]: data[:, k] for k, prop in enumerate(properties)
+            }
+        values = {prop[0]: [] for prop in properties}
+        for row in rows:
+            k = 0
+            for prop in properties:
+                if len(prop) == 3:
+                    n = int(row[k])
+                    values[prop[0]].append(
+                        [float(x) for x in row[k + 1:k + 1 + n]]
+                    )
+                    k += 1 + n
+                else:
+                    values[prop[0]].append(float(row[k]))
+                    k += 1
+        return values
+    if not has_lists:
+        dtype = np.dtype([
+            (name, byte_order + ply_type) for name, ply_type in properties
+        ])
+        data = np.frombuffer(f.read(dtype.itemsize * count), dtype, count)
+        return {name: data[name] for name, _ in properties}
+    if len(properties) == 1:
+        # Faces usually have a single list with the same number of items
+        name, count_type, item_type = properties[0]
+        count_size = np.dtype(count_type).itemsize
+        item_dtype = np.dtype(byte_order + item_type)
+        start = f.tell()
+        first_count = np.frombuffer(f.read(count_size), count_type)[0]
+        row_dtype = np.dtype([
+            ("count", byte_order + count_type),
+            ("items", item_dtype, (first_count,))
+        ])
+        f.seek(start)
+        buffer = f.read(row_dtype.itemsize * count)
+        if len(buffer) == row_dtype.itemsize * count:
+            data = np.frombuffer(buffer, row_dtype, count)
+            if np.all(data["count"] == first_count):
+                return {name: data["items"]}
+        f.seek(start)
+    values = {prop[0]: [] for prop in properties}
+    for _ in range(count):
+        for prop in properties:
+            if len(prop) == 3:
+                _, count_type, item_type = prop
+                n = np.frombuffer(
+                    f.read(np.dtype(count_type).itemsize),
+                    byte_order + count_type
+                )[0]
+                item_dtype = np.dtype(byte_order + item_type)
+                values[prop[0]].append(
+                    np.frombuffer(f.read(item_dtype.itemsize * n), item_dtype)
+                )
+            else:
+                item_dtype = np.dtype(byte_order + prop[1])
+                values[prop[0]].append(
+                    np.frombuffer(f.read(item_dtype.itemsize), item_dtype)[0]
+                )
+    return values
+
+
+def read_ply(filename):
+    """
+    Read the triangles of a PLY file in ascii or binary format. Polygons are
+    triangulated.
+
+    Args:
+        filename(str): Path of the .ply file
+
+    Returns:
+        tuple: Vertices (V, 3), faces (F, 3), normals (V, 3) or None and uvs
+            (V, 2) or None
+    """
+    vertex_data = None
+    faces = None
+    with open(filename, "rb") as f:
+        file_format, elements = read_ply_header(f)
+        for name, count, properties in elements:
+            data = read_ply_element(f, file_format, count, properties)
+            if name == "vertex":
+                vertex_data = data
+            elif name == "face":
+                indices = data.get("vertex_indices", data.get("vertex_index"))
+                if indices is None:
+                    raise ValueError("PLY faces without vertex indices")
+                if isinstance(indices, np.ndarray):
+                    polygons = indices.astype(int)
+                    if polygons.shape[1] == 3:
+                        faces = polygons
+                        continue
+                else:
+                    polygons = indices
+                faces = np.array(
+                    [
+                        triangle for polygon in polygons
+                        for triangle in triangulate(
+                            [int(idx) for idx in polygon]
+                        )
+                    ],
+                    dtype=int
+                ).reshape(-1, 3)
+    if vertex_data is None or faces is None:
+        raise ValueError("PLY file without vertices or faces")
+    vertices = np.stack(
+        [np.asarray(vertex_data[axis], dtype=float) for axis in "xyz"], axis=1
+    )
+    normals = None
+    if all(name in vertex_data for name in PLY_NORMAL_NAMES):
+        normals = np.stack(
+            [
+                np.asarray(vertex_data[name], dtype=float)
+                for name in PLY_NORMAL_NAMES
+            ],
+            axis=1
+        )
+    uvs = None
+    for u_name, v_name in PLY_UV_NAMES:
+        if u_name in vertex_data and v_name in vertex_data:
+            uvs = np.stack(
+                [
+                    np.asarray(vertex_data[u_name], dtype=float),
+                    np.asarray(vertex_data[v_name], dtype=float)
+                ],
+                axis=1
+            )
+            break
+    return vertices, faces, normals, uvs
+
+
+def get_cache_filename(filename):
+    return filename + CACHE_EXTENSION
+
+
+def read_mesh(filename, use_cache=True):
+    """
+    Read the arrays of a mesh from an OBJ or PLY file. The arrays are saved
+    in a .npz file next to the source file, later reads use it while it is
+    newer than the source.
+
+    Args:
+        filename(str): Path of the .obj or .ply file
+        use_cache(bool): Whether to read and write the cache file
+
+    Returns:
+        tuple: Vertices (V, 3), faces (F, 3), normals (V, 3) or None and uvs
+            (V, 2) or None
+    """
+    cache_filename = get_cache_filename(filename)
+    if (
+        use_cache and os.path.exists(cache_filename)
+        and os.path.getmtime(cache_filename) >= os.path.getmtime(filename)
+    ):
+        with np.load(cache_filename) as cache:
+            return (
+                cache["vertices"], cache["faces"],
+                cache["normals"] if "normals" in cache else None,
+                cache["uvs"] if "uvs" in cache else None
+            )
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".obj":
+        vertices, faces, normals, uvs = read_obj(filename)
+    elif extension == ".ply":
+        vertices, faces, normals, uvs = read_ply(filename)
+    else:
+        raise ValueError("Unknown mesh format: {}".format(extension))
+    if use_cache:
+        arrays = {"vertices": vertices, "faces": faces}
+        if normals is not None:
+            arrays["normals"] = normals
+        if uvs is not None:
+            arrays["uvs"] = uvs
+        np.savez(cache_filename, **arrays)
+    return vertices, faces, normals, uvs
+
+
+def load_mesh(filename, material, shader_type, use_cache=True):
+    """
+    Load an OBJ or PLY file as a TriangleMesh.
+
+    Args:
+        filename(str): Path of the .obj or .ply file
+        material(Material): The material for the mesh
+        shader_type(str): The shader type for the mesh
+        use_cache(bool): Whether to use the .npz cache next to the file
+
+    Returns:
+        TriangleMesh: The mesh with the triangles of the file
+    """
+    vertices, faces, normals, uvs = read_mesh(filename, use_cache)
+    return TriangleMesh(material, shader_type, vertices, faces, normals, uvs)
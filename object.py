@@ -1,8 +1,32 @@
+from copy import copy
 import numpy as np
 # Local modules
+from bvh import AABB, inverse_direction, slab_intersect, union_bounds
 from constants import DEFAULT_N0, DEFAULT_N1, DEFAULT_N2, NO_INTERSECTION
 from normal_map import NormalMap
+import shaders
 import utils
+from vertex import Vertex
+
+
+# Faces of a TriangleMesh are intersected in clusters of this size, the
+# clusters whose bounding box is missed by the ray are skipped
+MESH_CLUSTER_SIZE = 256
+# Maximum number of ray-face pairs that TriangleMesh.intersect_np tests at
+# once
+MESH_BLOCK_SIZE = 1 << 20
+# Determinant below which a ray is parallel to a triangle
+MT_EPSILON = 1e-12
+# Bits per axis of the Morton codes for sorting the faces of a mesh
+MORTON_BITS = 10
+# Maximum number of ray-sphere pairs that intersect_spheres computes at once
+SPHERE_BLOCK_SIZE = 1 << 20
+# Spheres of a SphereSet are intersected in clusters of this size, in order
+# of distance and up to SPHERE_CLUSTER_STEP clusters at a time
+SPHERE_CLUSTER_SIZE = 128
+SPHERE_CLUSTER_STEP = 8
+# Distance to the surface below which a point belongs to a sphere of a set
+SPHERE_SURFACE_EPSILON = 1e-6
 
 
 class Object:
@@ -17,7 +41,20 @@ class Object:
         ID(int): The index inside the scene
         normal_map(NormalMap): An object that allows you to get normals mapping
             points of the object to a texture
+        parent(Object): The object that contains this one, like the mesh of a
+            triangle returned by closest_hit
+        derived(dict): Constants derived from the attributes in derived_from
+            that intersect and uvmap use, computed on first use
+        shader_code(int): The code in shaders.SHADER_CODES for shader_type,
+            set with it
     """
+    # Assigning one of these attributes invalidates the derived constants,
+    # changing the values of an array in place doesn't
+    derived_from = ("position",)
+    _derived = None
+    # Whether the parts of this object shadow each other, so excluding it
+    # from an occlusion query doesn't skip it
+    parts_occlude = False
 
     def __init__(self, position, material, shader_type):
         self.position = position
@@ -25,10 +62,47 @@ class Object:
         self.shader_type = shader_type
         self.ID = None
         self.normal_map = None
+        self.parent = None
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.derived_from:
+            object.__setattr__(self, "_derived", None)
+        elif name == "shader_type":
+            object.__setattr__(
+                self, "shader_code",
+                shaders.SHADER_CODES.get(value, shaders.SHADER_UNKNOWN)
+            )
+
+    @property
+    def derived(self):
+        if self._derived is None:
+            self._derived = self.compute_derived()
+        return self._derived
+
+    def compute_derived(self):
+        """
+        Compute the constants that only depend on the attributes in
+        derived_from.
+
+        Returns:
+            dict: The constants by name
+        """
+        return {}
 
     def set_id(self, idx):
         self.ID = idx
 
+    def is_excluded(self, exclude_id):
+        """
+        Check if an occlusion query that excludes exclude_id skips this
+        object.
+        """
+        return (
+            exclude_id is not None and self.ID == exclude_id
+            and not self.parts_occlude
+        )
+
     def normal_at(self, p):
         """
         Get the normal at point p.
@@ -41,9 +115,136 @@ class Object:
         """
         pass
 
+    def normal_at_np(self, points, parts=None):
+        """
+        Get the normals at many points with shape (N, 3), the rows without a
+        normal are NaN. parts has the part that was hit at every point, from
+        RayBatch.intersect_parts, objects without parts ignore it.
+        """
+        normals = np.full((len(points), 3), np.nan)
+        for k, p in enumerate(points):
+            n = self.normal_at(p)
+            if n is not None:
+                normals[k] = n
+        return normals
+
+    def uvmap_np(self, points, parts=None):
+        """
+        Map many points into texture coordinates, as arrays u and v.
+        """
+        uvs = np.array([self.uvmap(p) for p in points], dtype=float)
+        uvs = uvs.reshape(len(points), 2)
+        return uvs[:, 0], uvs[:, 1]
+
     def add_normal_map(self, texture):
         self.normal_map = NormalMap(texture, self)
 
+    def bounds(self):
+        """
+        Get the axis aligned bounding box of this object, None if it is not
+        bounded so it can't be inside a BVH.
+        """
+        return None
+
+    def closest_hit(self, ray):
+        """
+        Intersect the ray with this object.
+
+        Args:
+            ray(Ray): The ray to intersect
+
+        Returns:
+            tuple: The t of the hit (-1 for no hit) and the object to shade,
+                objects made of parts return the part that was hit
+        """
+        return ray.intersect(self), self
+
+    def group_hits(self, points, parts=None):
+        """
+        Split hit points by the object that shades them, objects with parts
+        of different materials return one group per material.
+
+        Args:
+            points(numpy.array): Points in the surface with shape (N, 3)
+            parts(numpy.array): The part that was hit at every point, None
+                for objects without parts
+
+        Returns:
+            list: Tuples with the indices of the points, the object and the
+                parts of those points
+        """
+        return [(np.arange(len(points)), self, parts)]
+
+
+def intersect_spheres_all(pr, nr, centers, radii, hollow=None):
+    """
+    Intersect N rays with M spheres, with the same results as
+    Ray.intersect for every pair.
+
+    Args:
+        pr(numpy.array): Origins of the rays with shape (N, 3)
+        nr(numpy.array): Unit director vectors of the rays with shape (N, 3)
+        centers(numpy.array): Centers of the spheres with shape (M, 3)
+        radii(numpy.array): Radii of the spheres with shape (M,)
+        hollow(numpy.array): Mask of the spheres that are hit from inside,
+            like HollowSphere, with shape (M,)
+
+    Returns:
+        numpy.array: The t of every ray and sphere with shape (N, M), -1
+            means no intersection
+    """
+    dif = pr[:, np.newaxis] - centers[np.newaxis]
+    # matmul and the sum of the squares are faster than einsum here
+    b = (dif @ nr[:, :, np.newaxis])[..., 0]
+    c = (
+        dif[..., 0] ** 2 + dif[..., 1] ** 2 + dif[..., 2] ** 2
+        - np.asarray(radii) ** 2
+    )
+    discriminant = b ** 2 - c
+    root = np.sqrt(np.maximum(discriminant, 0))
+    miss = discriminant < 0
+    if hollow is None:
+        return np.where(miss | (b > 0), NO_INTERSECTION, -b - root)
+    t = np.where(hollow, -b + root, -b - root)
+    return np.where(miss | ((b > 0) & ~hollow), NO_INTERSECTION, t)
+
+
+def intersect_spheres(pr, nr, centers, radii, hollow=None, min_t=0):
+    """
+    Find the closest sphere hit by each ray, the rays are processed in blocks
+    of SPHERE_BLOCK_SIZE ray-sphere pairs.
+
+    Args:
+        pr(numpy.array): Origins of the rays with shape (N, 3)
+        nr(numpy.array): Unit director vectors of the rays with shape (N, 3)
+        centers(numpy.array): Centers of the spheres with shape (M, 3)
+        radii(numpy.array): Radii of the spheres with shape (M,)
+        hollow(numpy.array): Mask of the spheres that are hit from inside,
+            like HollowSphere, with shape (M,)
+        min_t(float): Hits closer than this are ignored
+
+    Returns:
+        tuple: The t of the closest hit with shape (N,) and the index of the
+            sphere that was hit, both -1 when there is no hit
+    """
+    t_min = np.full(len(pr), float(NO_INTERSECTION))
+    sphere_ids = np.full(len(pr), -1)
+    if len(centers) == 0:
+        return t_min, sphere_ids
+    block = max(1, SPHERE_BLOCK_SIZE // len(centers))
+    for start in range(0, len(pr), block):
+        end = start + block
+        t = intersect_spheres_all(
+            pr[start:end], nr[start:end], centers, radii, hollow
+        )
+        t[t <= min_t] = np.inf
+        closest = np.argmin(t, axis=1)
+        t_closest = t[np.arange(len(t)), closest]
+        hit = t_closest < np.inf
+        t_min[start:end][hit] = t_closest[hit]
+        sphere_ids[start:end][hit] = closest[hit]
+    return t_min, sphere_ids
+
 
 class Sphere(Object):
     """
@@ -56,6 +257,7 @@ class Sphere(Object):
         radius(float): The radius of this sphere
         rotation(numpy.array) Rotation in x, y and z (in grads?).
     """
+    derived_from = ("position", "radius", "rotation")
 
     def __init__(
             self, position, material, shader_type, radius, rotation=np.zeros(3)
@@ -78,6 +280,14 @@ class Sphere(Object):
     def physical_normal_at(self, p):
         return (p - self.position) / float(self.radius)
 
+    def normal_at_np(self, points, parts=None):
+        if self.normal_map:
+            return Object.normal_at_np(self, points)
+        return (points - self.position) / float(self.radius)
+
+    def bounds(self):
+        return AABB(self.position - self.radius, self.position + self.radius)
+
     def rotate_x(self, v):
         theta = self.rotation[0]
         rot_mat = np.array([
@@ -108,18 +318,24 @@ class Sphere(Object):
         rotated_v = np.dot(rot_mat, v)
         return rotated_v
 
-    def get_orientation(self):
-        """
-        Get the perpendicular unit vectors n0, n1, n2 that define the
-        orientation of this object
-        """
+    def compute_derived(self):
         # Only work with rotation around x by now
         n0 = DEFAULT_N0
         n1 = DEFAULT_N1
         if self.rotation[2] != 0.0:
             n0 = self.rotate_z(n0)
             n1 = self.rotate_z(n1)
-        return n0, n1, DEFAULT_N2
+        return {
+            "radius2": self.radius ** 2,
+            "orientation": (n0, n1, DEFAULT_N2)
+        }
+
+    def get_orientation(self):
+        """
+        Get the perpendicular unit vectors n0, n1, n2 that define the
+        orientation of this object
+        """
+        return self.derived["orientation"]
 
     def uvmap(self, p):
         """
@@ -151,13 +367,21 @@ class Sphere(Object):
         return u, v
 
     def intersect_sphere_np(self, pr, nr):
-        pc = self.position
-        dif = pr - pc
-        b = np.dot(nr, dif)
-        c = np.dot(dif, dif) - self.radius ** 2
-        discriminant = b ** 2 - c
-        t = -1 * b - np.sqrt(discriminant)
-        return np.where(b > 0 or discriminant < 0, NO_INTERSECTION, t)
+        """
+        Find t of intersection for many rays, -1 means no intersection.
+
+        Args:
+            pr(numpy.array): Origins of the rays with shape (N, 3)
+            nr(numpy.array): Unit director vectors of the rays (N, 3)
+
+        Returns:
+            numpy.array: The t for every ray with shape (N,)
+        """
+        hollow = np.array([isinstance(self, HollowSphere)])
+        return intersect_spheres_all(
+            np.asarray(pr), np.asarray(nr), self.position[np.newaxis],
+            np.array([self.radius]), hollow
+        )[:, 0]
 
 
 class HollowSphere(Sphere):
@@ -170,6 +394,11 @@ class HollowSphere(Sphere):
     def physical_normal_at(self, p):
         return -super().physical_normal_at(p)
 
+    def normal_at_np(self, points, parts=None):
+        if self.normal_map:
+            return Object.normal_at_np(self, points)
+        return -super().normal_at_np(points)
+
 
 class Plane(Object):
     """
@@ -184,6 +413,7 @@ class Plane(Object):
         sx(float): Scale in x of the plane
         sy(float): Scale in y of the plane
     """
+    derived_from = ("position", "n0", "n1", "sx", "sy")
 
     def __init__(self, position, material, shader_type, n, n0, sx=1, sy=1):
         Object.__init__(self, position, material, shader_type)
@@ -199,6 +429,15 @@ class Plane(Object):
         # This doesn't validate that p is in the surface
         return self.n
 
+    def bounds(self):
+        # The intersection doesn't use sx and sy so the plane is infinite
+        return None
+
+    def compute_derived(self):
+        # bottom left corner of the plane
+        p00 = self.position - (self.sx * self.n0) / 2 - (self.sy * self.n1) / 2
+        return {"p00": p00}
+
     def uvmap(self, p):
         """
         Map this point into texture coordinates u, v. Position will be in the
@@ -211,9 +450,7 @@ class Plane(Object):
         Returns:
             tuple: Point (u, v) in texture coordinates
         """
-        # bottom left corner of the plane
-        p00 = self.position - (self.sx * self.n0) / 2 - (self.sy * self.n1) / 2
-        dif_vector = p - p00
+        dif_vector = p - self.derived["p00"]
         u = np.dot(dif_vector, self.n0) / self.sx
         v = np.dot(dif_vector, self.n1) / self.sy
         return u, v
@@ -230,6 +467,8 @@ class Triangle(Object):
         area(float): The area of this triangle
         n(numpy.array): Geometrical normal calculated using the vertices
     """
+    # Moving the vertices in place needs a new Triangle
+    derived_from = ("position", "v0", "v1", "v2")
 
     def __init__(self, material, shader_type, v0, v1, v2):
         # Set object position as the center of the triangle
@@ -247,6 +486,23 @@ class Triangle(Object):
             self.v0.position, self.v1.position, self.v2.position
         )
 
+    def bounds(self):
+        vertices = np.array([
+            self.v0.position, self.v1.position, self.v2.position
+        ])
+        return AABB(vertices.min(axis=0), vertices.max(axis=0))
+
+    def compute_derived(self):
+        # The area of the sub-triangle opposite to a vertex over the total
+        # area is linear in ph - v0, so s and t are a dot product each
+        v0 = self.v0.position
+        v1 = self.v1.position
+        v2 = self.v2.position
+        return {
+            "s_axis": np.cross(v2 - v0, self.n) / (2 * self.area),
+            "t_axis": np.cross(v0 - v1, self.n) / (2 * self.area)
+        }
+
     def get_barycentric_coord(self, ph):
         """
         Get the barycentric coordinates s and t for a point ph in world coord.
@@ -257,10 +513,10 @@ class Triangle(Object):
         Returns:
             (float, float): Barycentric coordinates s and t for point ph
         """
-        a_v_1 = np.cross(ph - self.v0.position, self.v2.position - ph) / 2
-        a_v_2 = np.cross(ph - self.v1.position, self.v0.position - ph) / 2
-        s = np.dot(self.n, a_v_1) / self.area
-        t = np.dot(self.n, a_v_2) / self.area
+        derived = self.derived
+        dif = ph - self.v0.position
+        s = np.dot(dif, derived["s_axis"])
+        t = np.dot(dif, derived["t_axis"])
         return s, t
 
     def is_inside(self, p):
@@ -347,66 +603,810 @@ class Tetrahedron(Object):
     def get_triangles(self):
         return [self.tr0, self.tr1, self.tr2, self.tr3]
 
+    def bounds(self):
+        return union_bounds([tr.bounds() for tr in self.get_triangles()])
+
 
-# THIS IS NOT WORKING
 class Cube(Object):
+    """
+    Box with edges along the unit vectors n0, n1 and n2, intersected with the
+    slab test in its own frame. With the default directions it is an axis
+    aligned box.
+
+    Attributes:
+        position(numpy.array): The center of the box
+        v1(numpy.array): The corner where the three edges start, it follows
+            position
+        s(numpy.array): Length of the edges along n0, n1 and n2, a single
+            side_length makes a cube
+        n0(numpy.array): Direction of the first edge
+        n1(numpy.array): Direction of the second edge
+        n2(numpy.array): Direction of the third edge
+    """
+    derived_from = ("position", "s", "n0", "n1", "n2")
+
     def __init__(
             self, mtl, shd_type, v1, side_length,
             n0=DEFAULT_N0, n1=DEFAULT_N1, n2=DEFAULT_N2
     ):
-        position = v1 + (n0 + n1 + n2) * (side_length / 2)
+        s = np.broadcast_to(np.asarray(side_length, dtype=float), 3).copy()
+        basis = np.array([
+            utils.normalize(n0), utils.normalize(n1), utils.normalize(n2)
+        ])
+        position = v1 + s @ basis / 2
         Object.__init__(self, position, mtl, shd_type)
-        self.v1 = v1
         self.n0 = n0
         self.n1 = n1
         self.n2 = n2
-        self.s = side_length
-        self.define_vertices()
-        self.define_triangles()
-
-    def define_vertices(self):
-        self.v2 = self.v1 + self.n2 * self.s
-        self.v3 = self.v1 + self.n1 * self.s
-        self.v4 = self.v1 + self.n1 * self.s + self.n2 * self.s
-        self.v5 = self.v1 + self.n0 * self.s
-        self.v6 = self.v1 + self.n0 * self.s + self.n2 * self.s
-        self.v7 = self.v1 + self.n0 * self.s + self.n1 * self.s
-        self.v8 = self.v7 + self.n2 * self.s
-
-    def define_triangles(self):
-        mtl = self.material
-        shd_type = self.shader_type
-        self.t1 = Triangle(mtl, shd_type, self.v1, self.v7, self.v5)
-        self.t2 = Triangle(mtl, shd_type, self.v1, self.v3, self.v7)
-        self.t3 = Triangle(mtl, shd_type, self.v1, self.v4, self.v3)
-        self.t4 = Triangle(mtl, shd_type, self.v1, self.v2, self.v4)
-        self.t5 = Triangle(mtl, shd_type, self.v3, self.v8, self.v7)
-        self.t6 = Triangle(mtl, shd_type, self.v3, self.v4, self.v8)
-        self.t7 = Triangle(mtl, shd_type, self.v5, self.v7, self.v8)
-        self.t8 = Triangle(mtl, shd_type, self.v5, self.v8, self.v6)
-        self.t9 = Triangle(mtl, shd_type, self.v1, self.v5, self.v6)
-        self.t10 = Triangle(mtl, shd_type, self.v1, self.v6, self.v2)
-        self.t11 = Triangle(mtl, shd_type, self.v2, self.v6, self.v8)
-        self.t12 = Triangle(mtl, shd_type, self.v2, self.v8, self.v4)
+        self.s = s
+
+    @classmethod
+    def from_bounds(cls, mtl, shd_type, bounds):
+        """
+        Create the axis aligned box for an AABB, like the nodes of a BVH.
+
+        Args:
+            mtl(Material): The material of the box
+            shd_type(str): The shader type of the box
+            bounds(AABB): The box to render
+
+        Returns:
+            Cube: The box with the corners of bounds
+        """
+        return cls(mtl, shd_type, bounds.p_min, bounds.p_max - bounds.p_min)
 
     def __str__(self):
         return "Cube: v1={} s={} n0={} n1={} n2={}".format(
             self.v1, self.s, self.n0, self.n1, self.n2
         )
 
-    def get_triangles(self):
-        return [
-            self.t1, self.t2, self.t3, self.t4, self.t5, self.t6, self.t7,
-            self.t8, self.t9, self.t10, self.t11, self.t12
-        ]
+    def compute_derived(self):
+        # Rows are the directions of the edges, it maps world vectors to the
+        # frame of the box
+        basis = np.array([
+            utils.normalize(self.n0), utils.normalize(self.n1),
+            utils.normalize(self.n2)
+        ])
+        return {
+            "basis": basis,
+            "v1": self.position - self.s @ basis / 2,
+            "p_min": np.zeros(3),
+            "p_max": self.s
+        }
+
+    @property
+    def v1(self):
+        return self.derived["v1"]
+
+    def to_local(self, p):
+        return (p - self.v1) @ self.derived["basis"].T
+
+    def get_vertices(self):
+        corners = np.array([
+            [x, y, z]
+            for x in (0, self.s[0]) for y in (0, self.s[1])
+            for z in (0, self.s[2])
+        ])
+        return self.v1 + corners @ self.derived["basis"]
+
+    def bounds(self):
+        vertices = self.get_vertices()
+        return AABB(vertices.min(axis=0), vertices.max(axis=0))
+
+    def intersect_slab(self, pr, nr):
+        """
+        Find t of intersection for a ray or many rays, -1 means no
+        intersection. Like spheres, a ray that starts inside doesn't hit.
+
+        Args:
+            pr(numpy.array): Origin of the ray, or origins with shape (N, 3)
+            nr(numpy.array): Director vector, or vectors with shape (N, 3)
+
+        Returns:
+            float: The t of the hit, or the t of every ray with shape (N,)
+        """
+        derived = self.derived
+        local_pr = self.to_local(pr)
+        local_nr = nr @ derived["basis"].T
+        t_near, t_far = slab_intersect(
+            derived["p_min"], derived["p_max"], local_pr,
+            inverse_direction(local_nr)
+        )
+        t = np.where((t_near <= t_far) & (t_near > 0), t_near, -1)
+        return t if t.ndim else float(t)
+
+    def get_face(self, p):
+        """
+        Get the face that contains the point p.
+
+        Returns:
+            tuple: The local coordinates of p, the axis that is normal to the
+                face and the side (-1 for the face at v1, 1 for the other)
+        """
+        q = self.to_local(p)
+        # Distance to the closest face on every axis, without dividing by
+        # the size so flat boxes work
+        to_min = np.abs(q)
+        to_max = np.abs(q - self.s)
+        axis = np.argmin(np.minimum(to_min, to_max))
+        return q, axis, 1 if to_max[axis] < to_min[axis] else -1
 
     def normal_at(self, p):
-        triangles = self.get_triangles()
-        for triangle in triangles:
-            if triangle.is_inside(p):
-                return triangle.n
-        raise ValueError(
-            "Point {} doesn't belong to Cube {}".format(
-                p, self
+        # This doesn't validate that p is in the surface
+        if self.normal_map:
+            return self.normal_map.get_normal(p)
+        return self.physical_normal_at(p)
+
+    def physical_normal_at(self, p):
+        _, axis, side = self.get_face(p)
+        return side * self.derived["basis"][axis]
+
+    def uvmap(self, p):
+        """
+        Map this point into texture coordinates u, v of its face, every face
+        has the whole texture.
+
+        Args:
+            p(numpy.array): Point in the surface of the box
+
+        Returns:
+            tuple: Point (u, v) in texture coordinates
+        """
+        q, axis, _ = self.get_face(p)
+        u_axis, v_axis = [k for k in range(3) if k != axis]
+        s = self.s
+        u = q[u_axis] / s[u_axis] if s[u_axis] > 0 else 0.0
+        v = q[v_axis] / s[v_axis] if s[v_axis] > 0 else 0.0
+        return u, v
+
+
+def part1by2(x):
+    """
+    Spread the bits of integers so there are two 0 bits between each of them,
+    for interleaving 3 coordinates.
+    """
+    x = x.astype(np.uint64) & 0x3ff
+    x = (x | (x << 16)) & 0x30000ff
+    x = (x | (x << 8)) & 0x300f00f
+    x = (x | (x << 4)) & 0x30c30c3
+    x = (x | (x << 2)) & 0x9249249
+    return x
+
+
+def morton_order(points):
+    """
+    Get the indices that sort points along a Z-order curve, so points that
+    are close in the order are also close in space.
+
+    Args:
+        points(numpy.array): Points with shape (N, 3)
+
+    Returns:
+        numpy.array: The indices of the points in Z-order
+    """
+    p_min = points.min(axis=0)
+    extent = max((points.max(axis=0) - p_min).max(), 1e-12)
+    cells = ((points - p_min) / extent * (2 ** MORTON_BITS - 1)).astype(int)
+    codes = (
+        part1by2(cells[:, 0])
+        | (part1by2(cells[:, 1]) << 1)
+        | (part1by2(cells[:, 2]) << 2)
+    )
+    return np.argsort(codes, kind='stable')
+
+
+def dot3(a, b):
+    """
+    Dot product along the last axis of arrays of 3D vectors, with the same
+    rounding for any shape.
+    """
+    return a[..., 0] * b[..., 0] + a[..., 1] * b[..., 1] + a[..., 2] * b[..., 2]
+
+
+def moller_trumbore(pr, nr, p0, e1, e2):
+    """
+    Intersect rays with triangles with the Moller-Trumbore algorithm. The
+    arguments broadcast, like one ray with shape (3,) against faces with
+    shape (F, 3) or rays with shape (N, 1, 3) against (F, 3).
+
+    Args:
+        pr(numpy.array): Origins of the rays
+        nr(numpy.array): Director vectors of the rays
+        p0(numpy.array): First vertex of the triangles
+        e1(numpy.array): Edge from the first to the second vertex
+        e2(numpy.array): Edge from the first to the third vertex
+
+    Returns:
+        tuple: The t of the hits (inf for no hit) and the barycentric
+            coordinates s and t of the hit points
+    """
+    pvec = np.cross(nr, e2)
+    det = dot3(e1, pvec)
+    valid = np.abs(det) > MT_EPSILON
+    inv_det = np.divide(1, det, out=np.zeros_like(det), where=valid)
+    tvec = pr - p0
+    s = dot3(tvec, pvec) * inv_det
+    qvec = np.cross(tvec, e1)
+    bt = dot3(qvec, nr) * inv_det
+    t = dot3(e2, qvec) * inv_det
+    hit = valid & (s >= 0) & (bt >= 0) & (s + bt <= 1) & (t > 0)
+    return np.where(hit, t, np.inf), s, bt
+
+
+class TriangleMesh(Object):
+    """
+    Mesh of triangles stored in flat arrays instead of a Triangle object per
+    face. The faces are sorted along a Z-order curve and grouped in clusters
+    of MESH_CLUSTER_SIZE with a bounding box each, so a ray only runs the
+    vectorized Moller-Trumbore test on the clusters it goes through.
+
+    Attributes:
+        vertices(numpy.array): Positions of the vertices with shape (V, 3)
+        faces(numpy.array): Indices of the 3 vertices of every face with shape
+            (F, 3), in Z-order
+        normals(numpy.array): Normals of the vertices with shape (V, 3), None
+            to use the normals of the faces
+        uvs(numpy.array): Texture coordinates u, v of the vertices with shape
+            (V, 2), or None
+        p0(numpy.array): First vertex of every face
+        e1(numpy.array): Edge from the first to the second vertex of each face
+        e2(numpy.array): Edge from the first to the third vertex of each face
+        face_normals(numpy.array): Unit geometric normal of every face
+        s_axis(numpy.array): Vector of every face whose dot product with
+            p - p0 is the barycentric coordinate s of p, like Triangle
+        t_axis(numpy.array): The same for the barycentric coordinate t
+    """
+    def __init__(
+        self, material, shader_type, vertices, faces, normals=None, uvs=None
+    ):
+        vertices = np.asarray(vertices, dtype=float)
+        faces = np.asarray(faces, dtype=int)
+        Object.__init__(self, vertices.mean(axis=0), material, shader_type)
+        triangles = vertices[faces]
+        self.vertices = vertices
+        self.faces = faces[morton_order(triangles.mean(axis=1))]
+        self.normals = None if normals is None else np.asarray(normals, float)
+        self.uvs = None if uvs is None else np.asarray(uvs, dtype=float)
+        triangles = vertices[self.faces]
+        self.p0 = triangles[:, 0]
+        self.e1 = triangles[:, 1] - self.p0
+        self.e2 = triangles[:, 2] - self.p0
+        # The same operations as Triangle so shading gives the same values,
+        # faces without area get NaN
+        v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        a_v = np.cross(v1 - v0, v2 - v1) / 2
+        area = np.linalg.norm(a_v, axis=1)[:, np.newaxis]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.face_normals = a_v / area
+            self.s_axis = np.cross(v2 - v0, self.face_normals) / (2 * area)
+            self.t_axis = np.cross(v0 - v1, self.face_normals) / (2 * area)
+        starts = np.arange(0, len(self.faces), MESH_CLUSTER_SIZE)
+        self.cluster_min = np.minimum.reduceat(
+            triangles.min(axis=1), starts, axis=0
+        )
+        self.cluster_max = np.maximum.reduceat(
+            triangles.max(axis=1), starts, axis=0
+        )
+
+    def __str__(self):
+        return "TriangleMesh: {} vertices, {} faces".format(
+            len(self.vertices), len(self.faces)
+        )
+
+    def bounds(self):
+        return AABB(self.cluster_min.min(axis=0), self.cluster_max.max(axis=0))
+
+    def candidate_faces(self, pr, nr):
+        """
+        Get the indices of the faces in the clusters hit by the ray.
+        """
+        inv_nr = inverse_direction(nr)
+        t0 = (self.cluster_min - pr) * inv_nr
+        t1 = (self.cluster_max - pr) * inv_nr
+        t_near = np.minimum(t0, t1).max(axis=1)
+        t_far = np.maximum(t0, t1).min(axis=1)
+        clusters = np.flatnonzero((t_near <= t_far) & (t_far >= 0))
+        if len(clusters) == len(self.cluster_min):
+            return np.arange(len(self.faces))
+        faces = (
+            clusters[:, np.newaxis] * MESH_CLUSTER_SIZE
+            + np.arange(MESH_CLUSTER_SIZE)
+        ).ravel()
+        return faces[faces < len(self.faces)]
+
+    def intersect_faces(self, pr, nr):
+        """
+        Find the closest face hit by a ray with the Moller-Trumbore algorithm.
+
+        Args:
+            pr(numpy.array): Origin of the ray
+            nr(numpy.array): Director vector of the ray
+
+        Returns:
+            tuple: The t of the hit (-1 for no hit), the index of the face and
+                the barycentric coordinates s and t of the hit point
+        """
+        faces = self.candidate_faces(pr, nr)
+        if len(faces) == 0:
+            return -1, -1, 0, 0
+        t, s, bt = moller_trumbore(
+            pr, nr, self.p0[faces], self.e1[faces], self.e2[faces]
+        )
+        k = np.argmin(t)
+        if t[k] == np.inf:
+            return -1, -1, 0, 0
+        return t[k], faces[k], s[k], bt[k]
+
+    def intersect_np(self, pr, nr):
+        """
+        Find the closest face hit by each ray, the rays are tested against
+        the faces of the clusters they go through, closest clusters first.
+
+        Args:
+            pr(numpy.array): Origins of the rays with shape (N, 3)
+            nr(numpy.array): Director vectors of the rays with shape (N, 3)
+
+        Returns:
+            tuple: The t of the closest hit with shape (N,) and the index of
+                the face that was hit, both -1 when there is no hit
+        """
+        t_min = np.full(len(pr), np.inf)
+        face_ids = np.full(len(pr), -1)
+        if len(pr) == 0:
+            return t_min, face_ids
+        t_near, t_far = slab_intersect(
+            self.cluster_min[np.newaxis], self.cluster_max[np.newaxis],
+            pr[:, np.newaxis], inverse_direction(nr)[:, np.newaxis]
+        )
+        hit = (t_near <= t_far) & (t_far >= 0)
+        t_near[~hit] = np.inf
+        clusters = np.flatnonzero(hit.any(axis=0))
+        clusters = clusters[np.argsort(t_near[:, clusters].min(axis=0))]
+        block = max(1, MESH_BLOCK_SIZE // MESH_CLUSTER_SIZE)
+        for cluster in clusters:
+            # Rays with a hit closer than the cluster skip it
+            rows = np.flatnonzero(t_near[:, cluster] < t_min)
+            faces = slice(
+                cluster * MESH_CLUSTER_SIZE, (cluster + 1) * MESH_CLUSTER_SIZE
+            )
+            for start in range(0, len(rows), block):
+                block_rows = rows[start:start + block]
+                t, _, _ = moller_trumbore(
+                    pr[block_rows, np.newaxis], nr[block_rows, np.newaxis],
+                    self.p0[faces], self.e1[faces], self.e2[faces]
+                )
+                closest = np.argmin(t, axis=1)
+                t = t[np.arange(len(block_rows)), closest]
+                closer = t < t_min[block_rows]
+                t_min[block_rows[closer]] = t[closer]
+                face_ids[block_rows[closer]] = (
+                    cluster * MESH_CLUSTER_SIZE + closest[closer]
+                )
+        t_min[face_ids < 0] = NO_INTERSECTION
+        return t_min, face_ids
+
+    def get_triangle(self, face):
+        """
+        Get a Triangle object for a face, used for shading the hit point.
+
+        Args:
+            face(int): Index of the face
+
+        Returns:
+            Triangle: The triangle with the normals and texture coordinates of
+                the mesh, its parent is this mesh
+        """
+        vertices = []
+        for idx in self.faces[face]:
+            n = None if self.normals is None else self.normals[idx]
+            u, v = (None, None) if self.uvs is None else self.uvs[idx]
+            vertices.append(Vertex(self.vertices[idx], n=n, u=u, v=v))
+        triangle = Triangle(self.material, self.shader_type, *vertices)
+        triangle.ID = self.ID
+        triangle.parent = self
+        return triangle
+
+    def closest_hit(self, ray):
+        t, face, _, _ = self.intersect_faces(ray.pr, ray.nr)
+        if face < 0:
+            return -1, self
+        return t, self.get_triangle(face)
+
+    def find_face(self, p):
+        """
+        Find the face that contains the point p.
+
+        Args:
+            p(numpy.array): Point in the surface of the mesh
+
+        Returns:
+            int: The index of the face closest to p that contains it
+        """
+        d = p - self.p0
+        d00 = np.einsum('ij,ij->i', self.e1, self.e1)
+        d01 = np.einsum('ij,ij->i', self.e1, self.e2)
+        d11 = np.einsum('ij,ij->i', self.e2, self.e2)
+        d20 = np.einsum('ij,ij->i', d, self.e1)
+        d21 = np.einsum('ij,ij->i', d, self.e2)
+        denom = d00 * d11 - d01 ** 2
+        # Faces without area can't contain the point
+        valid = denom > 0
+        s = np.divide(
+            d11 * d20 - d01 * d21, denom, out=np.zeros_like(denom),
+            where=valid
+        )
+        t = np.divide(
+            d00 * d21 - d01 * d20, denom, out=np.zeros_like(denom),
+            where=valid
+        )
+        eps = 1e-6
+        inside = valid & (s >= -eps) & (t >= -eps) & (s + t <= 1 + eps)
+        dist = np.abs(np.einsum('ij,ij->i', d, self.face_normals))
+        dist[~inside] = np.inf
+        return np.argmin(dist)
+
+    def normal_at(self, p):
+        return self.get_triangle(self.find_face(p)).normal_at(p)
+
+    def uvmap(self, p):
+        return self.get_triangle(self.find_face(p)).uvmap(p)
+
+    def get_barycentric_np(self, points, faces=None):
+        """
+        Get the barycentric coordinates of points in their faces.
+
+        Args:
+            points(numpy.array): Points in the surface with shape (N, 3)
+            faces(numpy.array): The face of every point, like the faces from
+                intersect_np, None to find them
+
+        Returns:
+            tuple: The faces and the barycentric coordinates s and t
+        """
+        if faces is None:
+            faces = np.array([self.find_face(p) for p in points], dtype=int)
+        dif = points - self.p0[faces]
+        s = dot3(dif, self.s_axis[faces])
+        t = dot3(dif, self.t_axis[faces])
+        return faces, s, t
+
+    def normal_at_np(self, points, faces=None):
+        faces, s, t = self.get_barycentric_np(points, faces)
+        if self.normals is None:
+            return self.face_normals[faces]
+        n0, n1, n2 = np.moveaxis(self.normals[self.faces[faces]], 1, 0)
+        return (
+            (1 - s - t)[:, np.newaxis] * n0 + s[:, np.newaxis] * n1
+            + t[:, np.newaxis] * n2
+        )
+
+    def uvmap_np(self, points, faces=None):
+        if self.uvs is None:
+            return np.zeros(len(points)), np.zeros(len(points))
+        faces, s, t = self.get_barycentric_np(points, faces)
+        uv0, uv1, uv2 = np.moveaxis(self.uvs[self.faces[faces]], 1, 0)
+        uv = (
+            (1 - s - t)[:, np.newaxis] * uv0 + s[:, np.newaxis] * uv1
+            + t[:, np.newaxis] * uv2
+        )
+        return uv[:, 0], uv[:, 1]
+
+
+class SphereSet(Object):
+    """
+    Many spheres stored in arrays instead of a Sphere object each. Like
+    TriangleMesh, the spheres are sorted along a Z-order curve and grouped
+    in clusters of SPHERE_CLUSTER_SIZE with a bounding box each, a ray is
+    only intersected with the spheres of the clusters it goes through.
+
+    Attributes:
+        materials([Material]): The materials of the spheres
+        centers(numpy.array): Centers of the spheres with shape (M, 3), in
+            Z-order
+        radii(numpy.array): Radii of the spheres with shape (M,)
+        material_ids(numpy.array): Index in materials of the material of
+            every sphere with shape (M,)
+    """
+    # The spheres shadow each other, the sphere where a shadow ray starts is
+    # skipped because its hit is closer than SPHERE_SURFACE_EPSILON
+    parts_occlude = True
+
+    def __init__(
+        self, materials, shader_type, centers, radii, material_ids=None
+    ):
+        if not isinstance(materials, (list, tuple)):
+            materials = [materials]
+        centers = np.asarray(centers, dtype=float)
+        radii = np.broadcast_to(
+            np.asarray(radii, dtype=float), len(centers)
+        )
+        if material_ids is None:
+            material_ids = np.zeros(len(centers), dtype=int)
+        material_ids = np.asarray(material_ids, dtype=int)
+        Object.__init__(self, centers.mean(axis=0), materials[0], shader_type)
+        order = morton_order(centers)
+        self.materials = list(materials)
+        self.centers = centers[order]
+        self.radii = radii[order]
+        self.material_ids = material_ids[order]
+        starts = np.arange(0, len(self.centers), SPHERE_CLUSTER_SIZE)
+        self.cluster_min = np.minimum.reduceat(
+            self.centers - self.radii[:, np.newaxis], starts
+        )
+        self.cluster_max = np.maximum.reduceat(
+            self.centers + self.radii[:, np.newaxis], starts
+        )
+
+    def __str__(self):
+        return "SphereSet: {} spheres".format(len(self.centers))
+
+    def __len__(self):
+        return len(self.centers)
+
+    def bounds(self):
+        return AABB(self.cluster_min.min(axis=0), self.cluster_max.max(axis=0))
+
+    def intersect_np(self, pr, nr):
+        """
+        Find the closest sphere hit by each ray.
+
+        Args:
+            pr(numpy.array): Origins of the rays with shape (N, 3)
+            nr(numpy.array): Unit director vectors of the rays (N, 3)
+
+        Returns:
+            tuple: The t of the closest hit with shape (N,) and the index of
+                the sphere that was hit, both -1 when there is no hit
+        """
+        t_min = np.full(len(pr), np.inf)
+        sphere_ids = np.full(len(pr), -1)
+        # Limit the size of the ray-cluster arrays
+        block = max(1, SPHERE_BLOCK_SIZE // len(self.cluster_min))
+        for start in range(0, len(pr), block):
+            rows = slice(start, start + block)
+            t_min[rows], sphere_ids[rows] = self.intersect_block(
+                pr[rows], nr[rows]
             )
+        t_min[sphere_ids < 0] = NO_INTERSECTION
+        return t_min, sphere_ids
+
+    def intersect_block(self, pr, nr):
+        t_min = np.full(len(pr), np.inf)
+        sphere_ids = np.full(len(pr), -1)
+        t_near, t_far = slab_intersect(
+            self.cluster_min[np.newaxis], self.cluster_max[np.newaxis],
+            pr[:, np.newaxis], inverse_direction(nr)[:, np.newaxis]
         )
+        hit = (t_near <= t_far) & (t_far > 0)
+        clusters = np.flatnonzero(hit.any(axis=0))
+        # Closest clusters first so farther ones can be skipped
+        t_near[~hit] = np.inf
+        clusters = clusters[np.argsort(t_near[:, clusters].min(axis=0))]
+        # Few rays take several clusters per call to intersect_spheres, so
+        # there are less calls
+        step_size = max(1, SPHERE_CLUSTER_STEP // len(pr))
+        for k in range(0, len(clusters), step_size):
+            step = clusters[k:k + step_size]
+            rows = np.flatnonzero(
+                (t_near[:, step] < t_min[:, np.newaxis]).any(axis=1)
+            )
+            if len(rows) == 0:
+                continue
+            spheres = (
+                step[:, np.newaxis] * SPHERE_CLUSTER_SIZE
+                + np.arange(SPHERE_CLUSTER_SIZE)
+            ).ravel()
+            spheres = spheres[spheres < len(self.centers)]
+            t, closest = intersect_spheres(
+                pr[rows], nr[rows], self.centers[spheres], self.radii[spheres],
+                min_t=SPHERE_SURFACE_EPSILON
+            )
+            closer = (closest >= 0) & (t < t_min[rows])
+            t_min[rows[closer]] = t[closer]
+            sphere_ids[rows[closer]] = spheres[closest[closer]]
+        return t_min, sphere_ids
+
+    def get_sphere(self, idx):
+        """
+        Get a Sphere object for one of the spheres, used for shading.
+
+        Args:
+            idx(int): Index of the sphere
+
+        Returns:
+            Sphere: The sphere with its material, its parent is this set
+        """
+        sphere = Sphere(
+            self.centers[idx], self.materials[self.material_ids[idx]],
+            self.shader_type, self.radii[idx]
+        )
+        sphere.ID = self.ID
+        sphere.parent = self
+        return sphere
+
+    def closest_hit(self, ray):
+        t, sphere_ids = self.intersect_np(
+            ray.pr[np.newaxis], ray.nr[np.newaxis]
+        )
+        if sphere_ids[0] < 0:
+            return -1, self
+        return t[0], self.get_sphere(sphere_ids[0])
+
+    def find_spheres(self, points):
+        """
+        Find the sphere with its surface closest to every point.
+
+        Args:
+            points(numpy.array): Points in the surface with shape (N, 3)
+
+        Returns:
+            numpy.array: The index of the sphere of every point (N,)
+        """
+        dist_min = np.full(len(points), np.inf)
+        sphere_ids = np.zeros(len(points), dtype=int)
+        p = points[:, np.newaxis]
+        inside = np.all(
+            (p >= self.cluster_min - SPHERE_SURFACE_EPSILON)
+            & (p <= self.cluster_max + SPHERE_SURFACE_EPSILON),
+            axis=2
+        )
+        for cluster in np.flatnonzero(inside.any(axis=0)):
+            rows = np.flatnonzero(inside[:, cluster])
+            start = cluster * SPHERE_CLUSTER_SIZE
+            end = start + SPHERE_CLUSTER_SIZE
+            dist = np.abs(
+                np.linalg.norm(
+                    points[rows, np.newaxis] - self.centers[start:end], axis=2
+                ) - self.radii[start:end]
+            )
+            closest = np.argmin(dist, axis=1)
+            dist = dist[np.arange(len(rows)), closest]
+            closer = dist < dist_min[rows]
+            dist_min[rows[closer]] = dist[closer]
+            sphere_ids[rows[closer]] = start + closest[closer]
+        return sphere_ids
+
+    def normal_at_np(self, points, sphere_ids=None):
+        if sphere_ids is None:
+            sphere_ids = self.find_spheres(points)
+        return (
+            (points - self.centers[sphere_ids])
+            / self.radii[sphere_ids, np.newaxis]
+        )
+
+    def uvmap_np(self, points, sphere_ids=None):
+        """
+        Map points into texture coordinates u, v like Sphere.uvmap for
+        spheres without rotation.
+
+        Returns:
+            tuple: Arrays u and v with shape (N,)
+        """
+        local_v = self.normal_at_np(points, sphere_ids)
+        u = 0.5 + np.arctan2(local_v[:, 2], local_v[:, 0]) / (2 * np.pi)
+        v = 1 - (0.5 - np.arcsin(np.clip(local_v[:, 1], -1, 1)) / np.pi)
+        return u, v
+
+    def normal_at(self, p):
+        return self.normal_at_np(p[np.newaxis])[0]
+
+    def uvmap(self, p):
+        u, v = self.uvmap_np(p[np.newaxis])
+        return u[0], v[0]
+
+    def group_hits(self, points, parts=None):
+        sphere_ids = self.find_spheres(points) if parts is None else parts
+        material_ids = self.material_ids[sphere_ids]
+        groups = []
+        for material_id in np.unique(material_ids):
+            view = copy(self)
+            view.material = self.materials[material_id]
+            rows = np.flatnonzero(material_ids == material_id)
+            groups.append((rows, view, sphere_ids[rows]))
+        return groups
+
+
+class Instance(Object):
+    """
+    A copy of an object placed with a transform. The geometry is shared by
+    all its instances, rays are moved to the space of the geometry to
+    intersect it instead of copying its triangles.
+
+    Attributes:
+        geometry(Object): The shared object, in its own space
+        transform(numpy.array): 4x4 matrix from the space of the geometry to
+            world space
+    """
+    derived_from = ("transform",)
+
+    def __init__(self, geometry, transform, material=None, shader_type=None):
+        self.geometry = geometry
+        self.transform = np.asarray(transform, dtype=float)
+        position = self.transform[:3, :3] @ geometry.position
+        position += self.transform[:3, 3]
+        Object.__init__(
+            self, position,
+            geometry.material if material is None else material,
+            geometry.shader_type if shader_type is None else shader_type
+        )
+
+    def __str__(self):
+        return "Instance of {}\n{}".format(self.geometry, self.transform)
+
+    def compute_derived(self):
+        inverse = np.linalg.inv(self.transform)
+        return {
+            "inverse": inverse,
+            # Normals are transformed with the inverse transpose
+            "normal_matrix": inverse[:3, :3].T
+        }
+
+    def to_local(self, pr, nr):
+        """
+        Move rays to the space of the geometry. The director vectors are
+        normalized again, t in world space is the local t over the scale.
+
+        Args:
+            pr(numpy.array): Origin of the ray, or origins with shape (N, 3)
+            nr(numpy.array): Director vector, or vectors with shape (N, 3)
+
+        Returns:
+            tuple: Local origins, local unit directors and the scale
+        """
+        inverse = self.derived["inverse"]
+        local_pr = pr @ inverse[:3, :3].T + inverse[:3, 3]
+        local_nr = nr @ inverse[:3, :3].T
+        scale = np.linalg.norm(local_nr, axis=-1)
+        return local_pr, local_nr / np.expand_dims(scale, -1), scale
+
+    def to_local_point(self, p):
+        inverse = self.derived["inverse"]
+        return inverse[:3, :3] @ p + inverse[:3, 3]
+
+    def bounds(self):
+        local_bounds = self.geometry.bounds()
+        if local_bounds is None:
+            return None
+        corners = np.array([
+            [x, y, z]
+            for x in (local_bounds.p_min[0], local_bounds.p_max[0])
+            for y in (local_bounds.p_min[1], local_bounds.p_max[1])
+            for z in (local_bounds.p_min[2], local_bounds.p_max[2])
+        ])
+        corners = corners @ self.transform[:3, :3].T + self.transform[:3, 3]
+        return AABB(corners.min(axis=0), corners.max(axis=0))
+
+    def closest_hit(self, ray):
+        pr, nr, scale = self.to_local(ray.pr, ray.nr)
+        t, part = self.geometry.closest_hit(type(ray)(pr, nr))
+        if t <= 0:
+            return t, self
+        if part is self.geometry:
+            return t / scale, self
+        # Shade the part that was hit, like a triangle of a mesh
+        instance_part = copy(self)
+        instance_part.geometry = part
+        instance_part.parent = self
+        return t / scale, instance_part
+
+    def normal_at(self, p):
+        n = self.geometry.normal_at(self.to_local_point(p))
+        return utils.normalize(self.derived["normal_matrix"] @ n)
+
+    def physical_normal_at(self, p):
+        n = self.geometry.physical_normal_at(self.to_local_point(p))
+        return utils.normalize(self.derived["normal_matrix"] @ n)
+
+    def uvmap(self, p):
+        return self.geometry.uvmap(self.to_local_point(p))
+
+    def to_local_points(self, points):
+        inverse = self.derived["inverse"]
+        return points @ inverse[:3, :3].T + inverse[:3, 3]
+
+    def normal_at_np(self, points, parts=None):
+        n = self.geometry.normal_at_np(self.to_local_points(points), parts)
+        return utils.normalize_rows(n @ self.derived["normal_matrix"].T)
+
+    def uvmap_np(self, points, parts=None):
+        return self.geometry.uvmap_np(self.to_local_points(points), parts)
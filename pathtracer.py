@@ -4,7 +4,7 @@ import numpy as np
 from constants import MAX_COLOR_VALUE
 from light import SpotLight
 from ray import Ray, reflect_ray
-from raytrace import compute_color, compute_shadow
+from raytrace import compute_color, compute_shadow, get_light_samples
 import utils
 
 
@@ -26,24 +26,19 @@ def pathtrace(ray, scene, depth=DEFAULT_MAX_DEPTH, current_level=0, weight=1):
         ndarray: The color for the path
     """
     # 1. Shoot ray and compute color at hit point
-    # Get closest intersection point
-    t_min = np.inf
-    # The closest object hit by the ray
-    obj_h = None
-    for obj in scene.objects:
-        t = ray.intersect(obj)
-        if 0 < t < t_min:
-            t_min = t
-            obj_h = obj
+    # Get closest intersection point and the object hit by the ray
+    t_min, obj_h = scene.closest_hit(ray)
     # There is a hit with an object
     if obj_h:
         ph = ray.at(t_min)
         eye = -ray.nr
-        color = compute_color(ph, eye, obj_h, scene.lights)
-        # Objects to check for occlusion
-        objects_to_check = [obj for obj in scene.objects]
-        objects_to_check.remove(obj_h)
-        shadow = compute_shadow(ph, objects_to_check, scene.lights)
+        # Shading and shadows use the same samples of the area lights
+        light_samples = get_light_samples(scene.lights)
+        color = compute_color(ph, eye, obj_h, scene.lights, light_samples)
+        # The object that was hit doesn't occlude itself
+        shadow = compute_shadow(
+            ph, scene, scene.lights, obj_h.ID, light_samples
+        )
         surface_color = (
             color.astype(float) * (shadow.astype(float) / MAX_COLOR_VALUE)
         ).round()
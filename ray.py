@@ -69,7 +69,7 @@ class Ray:
         pc = sphere.position
         dif = self.pr - pc
         b = np.dot(self.nr, dif)
-        c = np.dot(dif, dif) - sphere.radius ** 2
+        c = np.dot(dif, dif) - sphere.derived["radius2"]
         discriminant = b ** 2 - c
         if b > 0 or discriminant < 0:
             return -1
@@ -84,7 +84,7 @@ class Ray:
         pc = hollow_sphere.position
         dif = self.pr - pc
         b = np.dot(self.nr, dif)
-        c = np.dot(dif, dif) - hollow_sphere.radius ** 2
+        c = np.dot(dif, dif) - hollow_sphere.derived["radius2"]
         discriminant = b ** 2 - c
         if discriminant < 0:
             return -1
@@ -120,9 +120,164 @@ class Ray:
             return self.intersect_sphere(obj)
         elif isinstance(obj, Plane):
             return self.intersect_plane(obj)
-        elif isinstance(obj, Tetrahedron) or isinstance(obj, Cube):
+        elif isinstance(obj, Cube):
+            return obj.intersect_slab(self.pr, self.nr)
+        elif isinstance(obj, Tetrahedron):
             return self.intersect_triangular_mesh(obj)
         elif isinstance(obj, Triangle):
             return self.intersect_triangle(obj)
+        elif isinstance(obj, TriangleMesh):
+            return obj.intersect_faces(self.pr, self.nr)[0]
+        elif isinstance(obj, SphereSet):
+            return obj.intersect_np(
+                self.pr[np.newaxis], self.nr[np.newaxis]
+            )[0][0]
+        elif isinstance(obj, Instance):
+            pr, nr, scale = obj.to_local(self.pr, self.nr)
+            t = Ray(pr, nr).intersect(obj.geometry)
+            return t / scale if t > 0 else t
         else:
             return -1
+
+
+class RayBatch:
+    """
+    A group of rays stored as arrays (struct of arrays) so they can be
+    processed with numpy instead of one Ray object at a time.
+
+    Attr:
+        pr: Origin points of the rays with shape (N, 3)
+        nr: Director vectors of the rays with shape (N, 3)
+    """
+
+    def __init__(self, pr, nr):
+        self.pr = pr
+        self.nr = nr
+
+    def __len__(self):
+        return len(self.pr)
+
+    def __getitem__(self, idx):
+        """
+        Get a single Ray for an integer index or a new RayBatch for a slice,
+        mask or array of indices.
+        """
+        if isinstance(idx, (int, np.integer)):
+            return Ray(self.pr[idx], self.nr[idx])
+        return RayBatch(self.pr[idx], self.nr[idx])
+
+    def at(self, t):
+        """
+        Get the points in the rays at positions t.
+
+        Args:
+            t(numpy.array): The scalars that multiply each director vector
+
+        Returns:
+            np.array: The points in 3D with shape (N, 3)
+        """
+        return self.pr + t[:, np.newaxis] * self.nr
+
+    def to_rays(self):
+        """
+        Get the rays in this batch as a list of Ray objects.
+
+        Returns:
+            list: Ray objects in the same order as the batch
+        """
+        return [Ray(pr, nr) for pr, nr in zip(self.pr, self.nr)]
+
+    def intersect_plane(self, plane):
+        dot_normals = np.dot(self.nr, plane.n)
+        dist = np.dot(plane.position - self.pr, plane.n)
+        parallel = dot_normals == 0
+        t = np.full(len(self), -1.0)
+        t[parallel & (dist == 0)] = 0
+        t[~parallel] = dist[~parallel] / dot_normals[~parallel]
+        t[t < 0] = -1
+        return t
+
+    def intersect_sphere(self, sphere):
+        """
+        Find t of intersection to a sphere for every ray, -1 means no
+        intersection
+        """
+        dif = self.pr - sphere.position
+        b = np.einsum('ij,ij->i', self.nr, dif)
+        c = np.einsum('ij,ij->i', dif, dif) - sphere.derived["radius2"]
+        discriminant = b ** 2 - c
+        t = -1 * b - np.sqrt(np.maximum(discriminant, 0))
+        return np.where((b > 0) | (discriminant < 0), -1, t)
+
+    def intersect_hollow_sphere(self, hollow_sphere):
+        """
+        Find t of intersection to a hollow sphere for every ray, -1 means no
+        intersection
+        """
+        dif = self.pr - hollow_sphere.position
+        b = np.einsum('ij,ij->i', self.nr, dif)
+        c = (
+            np.einsum('ij,ij->i', dif, dif) - hollow_sphere.derived["radius2"]
+        )
+        discriminant = b ** 2 - c
+        t = -1 * b + np.sqrt(np.maximum(discriminant, 0))
+        return np.where(discriminant < 0, -1, t)
+
+    def intersect_triangle(self, triangle):
+        ray_t = self.intersect_plane(triangle)
+        dif = self.at(ray_t) - triangle.v0.position
+        s = np.dot(dif, triangle.derived["s_axis"])
+        t = np.dot(dif, triangle.derived["t_axis"])
+        inside = (
+            (0 <= s) & (s <= 1) & (0 <= t) & (t <= 1)
+            & (0 <= s + t) & (s + t <= 1)
+        )
+        return np.where(inside, ray_t, -1)
+
+    def intersect_triangular_mesh(self, mesh):
+        min_t = np.full(len(self), np.inf)
+        for tr in mesh.get_triangles():
+            t = self.intersect_triangle(tr)
+            closer = (0 < t) & (t < min_t)
+            min_t[closer] = t[closer]
+        min_t[min_t == np.inf] = -1
+        return min_t
+
+    def intersect(self, obj):
+        """
+        Find t of intersection for every ray, -1 value means no intersection.
+        """
+        if isinstance(obj, HollowSphere):
+            return self.intersect_hollow_sphere(obj)
+        elif isinstance(obj, Sphere):
+            return self.intersect_sphere(obj)
+        elif isinstance(obj, Plane):
+            return self.intersect_plane(obj)
+        elif isinstance(obj, Cube):
+            return obj.intersect_slab(self.pr, self.nr)
+        elif isinstance(obj, Tetrahedron):
+            return self.intersect_triangular_mesh(obj)
+        elif isinstance(obj, Triangle):
+            return self.intersect_triangle(obj)
+        elif isinstance(obj, (TriangleMesh, SphereSet, Instance)):
+            return self.intersect_parts(obj)[0]
+        else:
+            return np.full(len(self), -1.0)
+
+    def intersect_parts(self, obj):
+        """
+        Find t of intersection for every ray and the part of the object that
+        was hit, like the face of a TriangleMesh, so shading doesn't have to
+        search for it.
+
+        Returns:
+            tuple: The t of every ray (-1 for no hit) and the index of the
+                part that was hit, None for objects without parts
+        """
+        if isinstance(obj, (TriangleMesh, SphereSet)):
+            return obj.intersect_np(self.pr, self.nr)
+        elif isinstance(obj, Instance):
+            pr, nr, scale = obj.to_local(self.pr, self.nr)
+            t, parts = RayBatch(pr, nr).intersect_parts(obj.geometry)
+            return np.where(t > 0, t / scale, t), parts
+        return self.intersect(obj), None
@@ -6,7 +6,6 @@ from light import AreaLight
 import material
 from ray import Ray
 import shaders
-from texture import ImageTexture, SolidImageTexture
 import utils
 
 DARK_VALUE = np.array([15, 15, 15], dtype=float) / MAX_COLOR_VALUE
@@ -20,19 +19,38 @@ MAX_DEPTH = 2
 
 
 def get_material_color(ph, obj):
-    if obj.material.material_type == material.TYPE_DIFFUSE:
+    texture_code = obj.material.texture_code
+    if texture_code == material.TEXTURE_DIFFUSE:
         color = obj.material.diffuse
+    elif texture_code == material.TEXTURE_IMAGE:
+        u, v = obj.uvmap(ph)
+        color = obj.material.texture.get_color(u, v)
+    elif texture_code == material.TEXTURE_SOLID:
+        color = obj.material.texture.get_color(ph)
     else:
-        if isinstance(obj.material.texture, ImageTexture):
-            u, v = obj.uvmap(ph)
-            color = obj.material.texture.get_color(u, v)
-        elif isinstance(obj.material.texture, SolidImageTexture):
-            color = obj.material.texture.get_color(ph)
-        else:
-            color = np.zeros(RGB_CHANNELS)
+        color = np.zeros(RGB_CHANNELS)
     return color
 
 
+def get_material_color_np(ph, obj, parts=None):
+    """
+    Array version of get_material_color for points of the same object, parts
+    are the parts of the object hit at the points.
+
+    Returns:
+        numpy.array: The colors with shape (N, 3)
+    """
+    texture_code = obj.material.texture_code
+    if texture_code == material.TEXTURE_DIFFUSE:
+        return np.tile(obj.material.diffuse, (len(ph), 1)).astype(float)
+    if texture_code == material.TEXTURE_IMAGE:
+        u, v = obj.uvmap_np(ph, parts)
+        return obj.material.texture.get_color_np(u, v)
+    if texture_code == material.TEXTURE_SOLID:
+        return obj.material.texture.get_color_np(ph)
+    return np.zeros((len(ph), RGB_CHANNELS))
+
+
 def get_dark_and_light(ph, obj):
     color = get_material_color(ph, obj)
     dark = DARK_VALUE * color
@@ -49,29 +67,46 @@ def get_caustic(obj, ph):
     return caustic
 
 
-def use_shader_type(shader_type, nh, l, eye, mtl, dark, light, caustic):
-    ks = mtl.specular
-    thickness = mtl.border
-    if shader_type == shaders.TYPE_DIFFUSE_LIGHT:
-        color = shaders.diffuse_light(nh, l)
-    elif shader_type == shaders.TYPE_DIFFUSE_COLORS:
-        color = shaders.diffuse_colors(nh, l, dark, light)
-    elif shader_type == shaders.TYPE_DIFF_SPECULAR:
-        color = shaders.diffuse_with_specular(
-            nh, l, eye, dark, light, ks
-        )
-    elif shader_type == shaders.TYPE_DIFF_SPEC_BORDER:
-        color = shaders.diffuse_specular_border(
-            nh, l, eye, dark, light, ks, thickness
-        )
-    elif shader_type == shaders.TYPE_LIGHT_MAP:
-        color = shaders.light_map(nh, l, dark, light, caustic)
-    else:
-        color = np.zeros(RGB_CHANNELS)
-    return color
+def get_caustic_np(obj, ph, parts=None):
+    if not obj.material.illumination_map:
+        return None
+    u, v = obj.uvmap_np(ph, parts)
+    return obj.material.illumination_map.get_interpolated_color_np(u, v)
+
+
+def get_light_samples(lights):
+    """
+    Get the sample points of the area lights for a hit point, compute_color
+    and compute_shadow use the same points so they see the same light.
+
+    Args:
+        lights([Light]): List of the lights in the scene
+
+    Returns:
+        list: The samples with shape (M, 3) of every area light, None for
+            the other lights
+    """
+    return [
+        light.get_samples() if isinstance(light, AreaLight) else None
+        for light in lights
+    ]
+
+
+def get_light_samples_np(lights, size):
+    """
+    Array version of get_light_samples for size hit points.
+
+    Returns:
+        list: The samples with shape (size, M, 3) of every area light, None
+            for the other lights
+    """
+    return [
+        light.get_samples_np(size) if isinstance(light, AreaLight) else None
+        for light in lights
+    ]
 
 
-def compute_color(ph, eye, obj, lights):
+def compute_color(ph, eye, obj, lights, light_samples=None):
     """
     Compute the color for the given object at the given point.
 
@@ -80,11 +115,13 @@ def compute_color(ph, eye, obj, lights):
         eye(numpy.array): Unit vector in the direction of the viewer
         obj(Object): The object that was hit
         lights([Light]): List of the lights in the scene
+        light_samples(list): The samples of the area lights from
+            get_light_samples, new ones are taken when it is None
 
     Returns:
         np.array: The color for this ray in numpy array of 3 channels
     """
-    if obj.shader_type == shaders.TYPE_FLAT:
+    if obj.shader_code == shaders.SHADER_FLAT:
         color = get_material_color(ph, obj)
         return color
     # Control colors for barycentric shading
@@ -93,39 +130,31 @@ def compute_color(ph, eye, obj, lights):
     if nh is None:
         warnings.warn("Normal is 0 for obj: {} at ph: {}".format(obj, ph))
         return np.zeros(3)
+    shader = shaders.SHADERS.get(obj.shader_code)
+    if shader is None:
+        return np.zeros(RGB_CHANNELS)
     caustic = get_caustic(obj, ph)
+    ks = obj.material.specular
+    thickness = obj.material.border
+    if light_samples is None:
+        light_samples = get_light_samples(lights)
     final_color = np.zeros(RGB_CHANNELS)
-    for light in lights:
-        if isinstance(light, AreaLight):
-            # Get color by averaging samples
-            samples = light.get_samples()
-            color = np.zeros(RGB_CHANNELS, dtype=float)
-            for light_sample in samples:
-                l = utils.normalize(light_sample - ph)
-                color += use_shader_type(
-                    obj.shader_type,
-                    nh,
-                    l,
-                    eye,
-                    obj.material,
-                    dark_color,
-                    light_color,
-                    caustic
-                )
-            color /= len(samples)
-            final_color += color
+    for light, samples in zip(lights, light_samples):
+        if samples is not None:
+            # Get color by averaging samples, all of them at the same time
+            l = utils.normalize_rows(samples - ph)
+            nh_rows = np.broadcast_to(nh, l.shape)
+            eye_rows = np.broadcast_to(eye, l.shape)
+            color = shaders.SHADERS_NP[obj.shader_code](
+                nh_rows, l, eye_rows, dark_color, light_color, ks, thickness,
+                caustic
+            )
+            final_color += color.sum(axis=0) / len(samples)
         else:
             l = light.get_l(ph)
-            # Choose the corresponding shader
-            color = use_shader_type(
-                obj.shader_type,
-                nh,
-                l,
-                eye,
-                obj.material,
-                dark_color,
-                light_color,
-                caustic
+            # Use the shader of the object
+            color = shader(
+                nh, l, eye, dark_color, light_color, ks, thickness, caustic
             )
             final_color += color
     # Ensure the colors are between 0 and 255
@@ -134,41 +163,257 @@ def compute_color(ph, eye, obj, lights):
     return final_color
 
 
-def compute_shadow(ph, objects, lights):
+def compute_color_np(ph, eye, groups, lights, light_samples=None):
+    """
+    Compute the colors for the hit points of many objects at the same time.
+    The inputs of every object are gathered first and then the points are
+    shaded in groups by shader code, so every shader runs once.
+
+    Args:
+        ph(numpy.array): 3D points of hit with shape (N, 3)
+        eye(numpy.array): Unit vectors in the direction of the viewer (N, 3)
+        groups(list): Tuples with the rows of ph that hit an object, the
+            object and the parts of the object that were hit, or None
+        lights([Light]): List of the lights in the scene
+        light_samples(list): The samples of the area lights from
+            get_light_samples_np, new ones are taken when it is None
+
+    Returns:
+        np.array: The colors for these points with shape (N, 3)
+    """
+    size = len(ph)
+    shader_codes = np.empty(size, dtype=int)
+    colors = np.zeros((size, RGB_CHANNELS))
+    nh = np.zeros((size, 3))
+    caustic = np.zeros((size, RGB_CHANNELS))
+    ks = np.zeros(size)
+    thickness = np.zeros(size)
+    for rows, obj, parts in groups:
+        shader_codes[rows] = obj.shader_code
+        colors[rows] = get_material_color_np(ph[rows], obj, parts)
+        if obj.shader_code == shaders.SHADER_FLAT:
+            continue
+        nh[rows] = obj.normal_at_np(ph[rows], parts)
+        obj_caustic = get_caustic_np(obj, ph[rows], parts)
+        if obj_caustic is not None:
+            caustic[rows] = obj_caustic
+        ks[rows] = obj.material.specular
+        thickness[rows] = obj.material.border
+    missing = np.isnan(nh).any(axis=1)
+    if missing.any():
+        warnings.warn("Normal is 0 at {} points".format(
+            np.count_nonzero(missing)
+        ))
+    dark_colors = DARK_VALUE * colors
+    light_colors = LIGHT_VALUE * colors
+    if light_samples is None:
+        light_samples = get_light_samples_np(lights, size)
+    final_colors = np.zeros((size, RGB_CHANNELS))
+    for shader_code in np.unique(shader_codes):
+        rows = np.flatnonzero(shader_codes == shader_code)
+        if shader_code == shaders.SHADER_FLAT:
+            final_colors[rows] = colors[rows]
+            continue
+        shader = shaders.SHADERS_NP.get(shader_code)
+        if shader is None:
+            continue
+        args = (
+            eye[rows], dark_colors[rows], light_colors[rows], ks[rows],
+            thickness[rows], caustic[rows]
+        )
+        color = np.zeros((len(rows), RGB_CHANNELS))
+        for light, samples in zip(lights, light_samples):
+            if samples is not None:
+                # Get color by averaging samples, all of them at the same
+                # time with the inputs of every point repeated per sample
+                samples = samples[rows]
+                m = samples.shape[1]
+                l = utils.normalize_rows(
+                    (samples - ph[rows][:, np.newaxis]).reshape(-1, 3)
+                )
+                sample_color = shader(
+                    np.repeat(nh[rows], m, axis=0), l,
+                    *[np.repeat(arg, m, axis=0) for arg in args]
+                )
+                color += sample_color.reshape(
+                    len(rows), m, RGB_CHANNELS
+                ).sum(axis=1) / m
+            else:
+                l = light.get_l_np(ph[rows])
+                color += shader(nh[rows], l, *args)
+        # Ensure the colors are between 0 and 255
+        color /= len(lights)
+        final_colors[rows] = np.clip(color, 0, MAX_COLOR_VALUE)
+    final_colors[missing] = 0
+    return final_colors
+
+
+def area_shadow_np(ph, scene, points, exclude_ids=None):
+    """
+    Get the average shadow of the rays from every point in ph to every one
+    of its points of a light.
+
+    Args:
+        ph(numpy.array): 3D points of hit with shape (N, 3)
+        scene(Scene): The scene with the objects that can cast shadows
+        points(numpy.array): Points of the light for every hit point with
+            shape (N, M, 3), or (M, 3) for the same points for all of them
+        exclude_ids(numpy.array): ID of the object that can't shadow each
+            point with shape (N,)
+
+    Returns:
+        tuple: The average shadow with shape (N, 3) and a mask of the hit
+            points whose rays don't all give the same shadow (N,)
+    """
+    points = np.broadcast_to(points, (len(ph),) + np.shape(points)[-2:])
+    size, m = points.shape[:2]
+    # All the rays are traced together
+    diff = points - ph[:, np.newaxis]
+    dist_l = np.linalg.norm(diff, axis=2).ravel()
+    l = utils.normalize_rows(diff.reshape(-1, 3))
+    if exclude_ids is not None:
+        exclude_ids = np.repeat(exclude_ids, m)
+    shadows = shaders.hard_shadow_np(
+        np.repeat(ph, m, axis=0), scene, l, dist_l, exclude_ids
+    ).reshape(size, m, RGB_CHANNELS)
+    penumbra = np.any(shadows != shadows[:, :1], axis=(1, 2))
+    return shadows.sum(axis=1) / m, penumbra
+
+
+def adaptive_area_shadow_np(ph, scene, light, samples, exclude_ids=None):
+    """
+    Get the shadow of an area light checking its corners and center first.
+    Only the points where they don't agree, in the penumbra, use all the
+    samples. Occluders smaller than the distance between the probes can be
+    missed.
+
+    Args:
+        ph(numpy.array): 3D points of hit with shape (N, 3)
+        scene(Scene): The scene with the objects that can cast shadows
+        light(AreaLight): The light
+        samples(numpy.array): Samples of the light for every point with
+            shape (N, M, 3)
+        exclude_ids(numpy.array): ID of the object that can't shadow each
+            point with shape (N,)
+
+    Returns:
+        np.array: The shadows for these hit points with shape (N, 3)
+    """
+    shadow, penumbra = area_shadow_np(
+        ph, scene, light.get_probes(), exclude_ids
+    )
+    rows = np.flatnonzero(penumbra)
+    if len(rows):
+        shadow[rows], _ = area_shadow_np(
+            ph[rows], scene, samples[rows],
+            None if exclude_ids is None else exclude_ids[rows]
+        )
+    return shadow
+
+
+def compute_shadow(ph, scene, lights, exclude_id=None, light_samples=None):
     """
     Get the shadow component for this hit point.
 
     Args:
         ph(numpy.array): 3D point of hit between ray and object
-        objects([Object]): The objects to check for shadow computation
+        scene(Scene): The scene with the objects that can cast shadows
         lights([Light]): List of the lights in the scene
+        exclude_id(int): ID of the object that can't shadow this point,
+            usually the one that was hit
+        light_samples(list): The samples of the area lights from
+            get_light_samples, new ones are taken when it is None
 
     Returns:
         np.array: The shadow for this ray in numpy array of 3 channels
     """
     if not lights:
         return np.ones(RGB_CHANNELS) * MAX_COLOR_VALUE
+    if light_samples is None:
+        light_samples = get_light_samples(lights)
     final_shadow = np.zeros(RGB_CHANNELS)
-    for light in lights:
-        if isinstance(light, AreaLight):
-            samples = light.get_samples()
-            shadow = np.zeros(RGB_CHANNELS, dtype=float)
-            for light_sample in samples:
-                diff = light_sample - ph
-                dist_l = np.linalg.norm(diff)
-                l = utils.normalize(diff)
-                shadow += shaders.hard_shadow(ph, objects, l, dist_l)
-            shadow /= len(samples)
+    for light, samples in zip(lights, light_samples):
+        if samples is not None:
+            shadow = adaptive_area_shadow_np(
+                ph[np.newaxis], scene, light, samples[np.newaxis],
+                None if exclude_id is None else np.array([exclude_id])
+            )[0]
         else:
             l = light.get_l(ph)
             dist_l = light.get_dist(ph)
-            shadow = shaders.hard_shadow(ph, objects, l, dist_l)
+            shadow = shaders.hard_shadow(ph, scene, l, dist_l, exclude_id)
+        final_shadow += shadow
+    final_shadow /= len(lights)
+    final_shadow = np.clip(final_shadow, 0, MAX_COLOR_VALUE)
+    return final_shadow
+
+
+def compute_shadow_np(
+        ph, scene, lights, exclude_ids=None, light_samples=None
+):
+    """
+    Get the shadow component for many hit points at the same time.
+
+    Args:
+        ph(numpy.array): 3D points of hit with shape (N, 3)
+        scene(Scene): The scene with the objects that can cast shadows
+        lights([Light]): List of the lights in the scene
+        exclude_ids(numpy.array): ID of the object that can't shadow each
+            point with shape (N,)
+        light_samples(list): The samples of the area lights from
+            get_light_samples_np, new ones are taken when it is None
+
+    Returns:
+        np.array: The shadows for these hit points with shape (N, 3)
+    """
+    if not lights:
+        return np.ones((len(ph), RGB_CHANNELS)) * MAX_COLOR_VALUE
+    if light_samples is None:
+        light_samples = get_light_samples_np(lights, len(ph))
+    final_shadow = np.zeros((len(ph), RGB_CHANNELS))
+    for light, samples in zip(lights, light_samples):
+        if samples is not None:
+            shadow = adaptive_area_shadow_np(
+                ph, scene, light, samples, exclude_ids
+            )
+        else:
+            l = light.get_l_np(ph)
+            dist_l = light.get_dist_np(ph)
+            shadow = shaders.hard_shadow_np(
+                ph, scene, l, dist_l, exclude_ids
+            )
         final_shadow += shadow
     final_shadow /= len(lights)
     final_shadow = np.clip(final_shadow, 0, MAX_COLOR_VALUE)
     return final_shadow
 
 
+def get_background_color(ray, scene):
+    """
+    Get the color for a ray that doesn't hit any object in the scene.
+
+    Args:
+        ray(Ray): The ray that was traced
+        scene(Scene): This object contains the env map or sky dome
+
+    Returns:
+        np.array: The color for this ray in numpy array of 3 channels in float
+    """
+    if scene.env_map:
+        # Use unit director vector of ray for the Env Map
+        color = scene.env_map.get_color(ray.nr)
+        return color
+    elif scene.sky_dome:
+        color = scene.sky_dome.in_scattering(ray)
+        xyz = utils.color_matching(color)
+        xyz = np.clip(xyz, 0, 1)
+        rgb_color = utils.xyz_to_rgb(xyz)
+        rgb_color *= MAX_COLOR_VALUE
+        return rgb_color
+    else:
+        return np.zeros(3)
+
+
 def raytrace(ray, scene, kr=1, depth=0):
     """
     Trace the ray to the closest intersection point with an object and get the
@@ -183,27 +428,18 @@ def raytrace(ray, scene, kr=1, depth=0):
     Returns:
         np.array: The color for this ray in numpy array of 3 channels in float
     """
-    # Get closest intersection point
-    t_min = np.inf
-    # The closest object hit by the ray
-    obj_h = None
-    objects = scene.objects
+    # Get closest intersection point and the object hit by the ray
+    t_min, obj_h = scene.closest_hit(ray)
     lights = scene.lights
-    env_map = scene.env_map
-    for obj in objects:
-        t = ray.intersect(obj)
-        if 0 < t < t_min:
-            t_min = t
-            obj_h = obj
     # There is a hit with an object
     if obj_h:
         ph = ray.at(t_min)
         eye = utils.normalize(ray.pr - ph)
-        color = compute_color(ph, eye, obj_h, lights)
-        # Objects to check for occlusion
-        objects_to_check = objects.copy()
-        objects_to_check.remove(obj_h)
-        shadow = compute_shadow(ph, objects_to_check, lights)
+        # Shading and shadows use the same samples of the area lights
+        light_samples = get_light_samples(lights)
+        color = compute_color(ph, eye, obj_h, lights, light_samples)
+        # The object that was hit doesn't occlude itself
+        shadow = compute_shadow(ph, scene, lights, obj_h.ID, light_samples)
         final_color = (
             color.astype(float) * (shadow.astype(float) / MAX_COLOR_VALUE)
         ).round()
@@ -227,16 +463,5 @@ def raytrace(ray, scene, kr=1, depth=0):
             final_color = final_color * (1 - new_kr) + reflection_color * new_kr
         return final_color
     # No hit
-    elif env_map:
-        # Use unit director vector of ray for the Env Map
-        color = env_map.get_color(ray.nr)
-        return color
-    elif scene.sky_dome:
-        color = scene.sky_dome.in_scattering(ray)
-        xyz = utils.color_matching(color)
-        xyz = np.clip(xyz, 0, 1)
-        rgb_color = utils.xyz_to_rgb(xyz)
-        rgb_color *= MAX_COLOR_VALUE
-        return rgb_color
     else:
-        return np.zeros(3)
+        return get_background_color(ray, scene)
@@ -1,15 +1,33 @@
 import multiprocessing as mp
 import numpy as np
 from progress.bar import Bar
-from random import random, shuffle
+from random import random
 
 # Local Modules
+from batch_raytrace import raytrace_batch
+from framebuffer import Accumulator, Framebuffer, MappedFramebuffer, \
+    SharedFramebuffer
 import utils
 from ray import Ray
 from raytrace import raytrace
+from sampler import GridSampler, JitteredSampler, LensSampler, \
+    create_ray_batch
+from tiles import DEFAULT_TILE_SIZE, ORDER_SCANLINE, create_tiles
 
 PERCENTAGE_STEP = 1
 RGB_CHANNELS = 3
+# Number of rays traced at the same time by the batch raytracing engine
+BATCH_SIZE = 4096
+# Adaptive sampling stops adding samples to a pixel when the standard error of
+# its luminance is below the threshold or it has the max number of samples
+ADAPTIVE_THRESHOLD = 2.0
+MAX_ADAPTIVE_SAMPLES = 36
+# Executors for running the render tasks
+EXECUTOR_SERIAL = "serial"
+EXECUTOR_POOL = "pool"
+EXECUTOR_BATCH = "batch"
+# Integrators with a version that traces a whole RayBatch at the same time
+BATCH_INTEGRATORS = {raytrace: raytrace_batch}
 
 
 def avg(colors, samples):
@@ -20,43 +38,13 @@ def avg(colors, samples):
 
 
 def create_rays(camera, height, width):
-    rays = []
-    for j in range(height):
-        for i in range(width):
-            x = i
-            y = height - 1 - j
-            # Get x projected in view coord
-            xp = (x / float(width)) * camera.scale_x
-            # Get y projected in view coord
-            yp = (y / float(height)) * camera.scale_y
-            pp = camera.p00 + xp * camera.n0 + yp * camera.n1
-            npe = utils.normalize(pp - camera.position)
-            ray = Ray(pp, npe)
-            rays.append(ray)
-    return rays
+    batch = create_ray_batch(camera, height, width, jitter=False)
+    return batch.to_rays()
 
 
 def create_rays_aa(camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4):
-    rays = []
-    for j in range(HEIGHT):
-        for i in range(WIDTH):
-            for n in range(V_SAMPLES):
-                for m in range(H_SAMPLES):
-                    x = i + (float(m) / H_SAMPLES) + (random() / H_SAMPLES)
-                    y = (
-                        HEIGHT - 1 - j
-                        + (float(n) / V_SAMPLES)
-                        + (random() / V_SAMPLES)
-                    )
-                    # Get x projected in view coord
-                    xp = (x / float(WIDTH)) * camera.scale_x
-                    # Get y projected in view coord
-                    yp = (y / float(HEIGHT)) * camera.scale_y
-                    pp = camera.p00 + xp * camera.n0 + yp * camera.n1
-                    npe = utils.normalize(pp - camera.position)
-                    ray = Ray(pp, npe)
-                    rays.append(ray)
-    return rays
+    batch = create_ray_batch(camera, HEIGHT, WIDTH, V_SAMPLES, H_SAMPLES)
+    return batch.to_rays()
 
 
 def create_ray_aa(camera, height, width, v_samples, h_samples, pixel_pos):
@@ -88,36 +76,295 @@ def create_ray_aa(camera, height, width, v_samples, h_samples, pixel_pos):
     return ray
 
 
-def raytrace_mp_wrapper(args):
-    return raytrace(*args)
+def trace_rays(rays, scene, integrator=raytrace, batch=False):
+    """
+    Get the color of every ray in a batch.
+
+    Args:
+        rays(RayBatch): The rays to trace.
+        scene(Scene): The scene that contains objects, cameras and lights.
+        integrator(function): Returns the color for a ray and scene, like
+            raytrace or pathtrace.
+        batch(bool): Whether to use the batch raytracing engine, only if the
+            integrator has a batch version.
+
+    Returns:
+        numpy.array: The colors with shape (N, 3).
+    """
+    if batch and integrator in BATCH_INTEGRATORS:
+        return BATCH_INTEGRATORS[integrator](rays, scene)
+    colors = np.zeros((len(rays), RGB_CHANNELS))
+    for k in range(len(rays)):
+        colors[k] = integrator(rays[k], scene)
+    return colors
+
+
+def render_tile(
+    scene, camera, integrator, sampler, tile, height, width, batch=False
+):
+    """
+    Get the pixels of a tile averaging the colors of its samples.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+        integrator(function): Returns the color for a ray and scene.
+        sampler(Sampler): Creates the rays for the pixels.
+        tile(Tile): The region of the screen to render.
+        height(int): Height of the screen in pixels.
+        width(int): Width of the screen in pixels.
+        batch(bool): Whether to use the batch raytracing engine.
+
+    Returns:
+        numpy.array: The pixels of the tile with shape
+            (tile.height, tile.width, 3).
+    """
+    rays = sampler.create_rays(
+        camera, height, width, tile.pixel_indices(width)
+    )
+    colors = trace_rays(rays, scene, integrator, batch)
+    colors = colors.reshape(
+        tile.height, tile.width, sampler.samples, RGB_CHANNELS
+    )
+    return colors.mean(axis=2).round().astype(np.uint8)
+
+
+# Scene, camera, integrator, sampler and framebuffer of a worker process, they
+# are sent once when the worker starts instead of inside every task
+worker_scene = None
+worker_camera = None
+worker_integrator = None
+worker_sampler = None
+worker_framebuffer = None
 
 
-def raytrace_unordered_wrapper(args):
-    # index refers to the scanline index of a pixel
-    index, height, width, v_samples, h_samples, camera, scene = args
-    num_samples = v_samples * h_samples
-    color = np.zeros(RGB_CHANNELS)
-    for n in range(v_samples):
-        for m in range(h_samples):
-            i = index % width
-            j = index // width
-            pixel_sample_pos = j, i, n, m
-            ray = create_ray_aa(
-                camera, height, width, v_samples, h_samples, pixel_sample_pos
+def init_worker(
+    scene, camera=None, attach_framebuffer=None, integrator=raytrace,
+    sampler=None
+):
+    """
+    Initializer for the processes of a Pool that keeps the scene and camera
+    in the worker so the tasks only need screen coordinates.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering the image.
+        attach_framebuffer(function): Opens the framebuffer where the worker
+            writes its tiles, from Framebuffer.attach.
+        integrator(function): Returns the color for a ray and scene.
+        sampler(Sampler): Creates the rays for the pixels.
+    """
+    global worker_scene, worker_camera, worker_integrator, worker_sampler, \
+        worker_framebuffer
+    worker_scene = scene
+    worker_camera = camera
+    worker_integrator = integrator
+    worker_sampler = sampler
+    # Forked workers start with the same random state, so they would use the
+    # same jitter in different tiles
+    np.random.seed()
+    if attach_framebuffer:
+        worker_framebuffer = attach_framebuffer()
+
+
+def render_tile_wrapper(args):
+    tile, height, width = args
+    pixels = render_tile(
+        worker_scene, worker_camera, worker_integrator, worker_sampler, tile,
+        height, width
+    )
+    worker_framebuffer.write_tile(tile, pixels)
+    return tile
+
+
+def render_tiles_mp(
+    scene, camera, height, width, integrator, sampler, tiles, on_tile=None,
+    output_path=None
+):
+    """
+    Render the tiles with a Pool of processes that write their pixels
+    directly into a SharedFramebuffer, or into a MappedFramebuffer if
+    output_path is given. The rays of each tile are created and reduced to
+    pixels inside the worker, so the memory used does not grow with the size
+    of the image.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+        height(int): Height of the screen in pixels.
+        width(int): Width of the screen in pixels.
+        integrator(function): Returns the color for a ray and scene.
+        sampler(Sampler): Creates the rays for the pixels.
+        tiles([Tile]): The tiles in the order they should be rendered.
+        on_tile(function): Called in this process with the framebuffer and
+            the tile every time a tile is finished, the framebuffer can be
+            used for getting a snapshot of the partial image.
+        output_path(str): Path of the .npy file for the image, if given the
+            image is never fully loaded in memory.
+
+    Returns:
+        numpy.array: The pixels with the raytraced colors, mapped from
+            output_path if it is given.
+    """
+    if output_path:
+        framebuffer = MappedFramebuffer(height, width, output_path)
+    else:
+        framebuffer = SharedFramebuffer(height, width)
+    with framebuffer:
+        pool = mp.Pool(
+            mp.cpu_count(),
+            initializer=init_worker,
+            initargs=(
+                scene, camera, framebuffer.attach(), integrator, sampler
             )
-            sample_color = raytrace(ray, scene)
-            color += sample_color / num_samples
-    color = color.round().astype(np.uint8)
-    return (index, color)
+        )
+        # Use chunks of one tile so idle workers take the next tile in the
+        # queue
+        finished_tiles = pool.imap_unordered(
+            render_tile_wrapper,
+            ((tile, height, width) for tile in tiles),
+            chunksize=1
+        )
+        pool.close()
+        bar = Bar(
+            'Raytracing',
+            max=len(tiles),
+            suffix='%(percent)d%% [%(elapsed_td)s / %(eta_td)s]',
+            check_tty=False
+        )
+        for tile in finished_tiles:
+            if on_tile:
+                on_tile(framebuffer, tile)
+            bar.next()
+        bar.finish()
+        pool.join()
+        if not output_path:
+            output = framebuffer.snapshot()
+    if output_path:
+        output = np.load(output_path, mmap_mode='r')
+    return output
 
 
-def render(scene, camera, HEIGHT=100, WIDTH=100):
+def render_tiles(
+    scene, camera, height, width, integrator, sampler, tiles, batch=False,
+    on_tile=None, output_path=None
+):
     """
-    Render the image for the given scene and camera using raytracing.
+    Render the tiles one after the other in this process.
 
     Args:
         scene(Scene): The scene that contains objects, cameras and lights.
         camera(Camera): The camera that is rendering this image.
+        height(int): Height of the screen in pixels.
+        width(int): Width of the screen in pixels.
+        integrator(function): Returns the color for a ray and scene.
+        sampler(Sampler): Creates the rays for the pixels.
+        tiles([Tile]): The tiles in the order they should be rendered.
+        batch(bool): Whether to use the batch raytracing engine.
+        on_tile(function): Called with the framebuffer and the tile every
+            time a tile is finished.
+        output_path(str): Path of the .npy file for the image, if given the
+            image is never fully loaded in memory.
+
+    Returns:
+        numpy.array: The pixels with the raytraced colors, mapped from
+            output_path if it is given.
+    """
+    if output_path:
+        framebuffer = MappedFramebuffer(height, width, output_path)
+    else:
+        framebuffer = Framebuffer(height, width)
+    with framebuffer:
+        bar = Bar(
+            'Raytracing',
+            max=len(tiles),
+            suffix='%(percent)d%% [%(elapsed_td)s / %(eta_td)s]',
+            check_tty=False
+        )
+        for tile in tiles:
+            pixels = render_tile(
+                scene, camera, integrator, sampler, tile, height, width, batch
+            )
+            framebuffer.write_tile(tile, pixels)
+            if on_tile:
+                on_tile(framebuffer, tile)
+            bar.next()
+        bar.finish()
+        if not output_path:
+            output = framebuffer.snapshot()
+    if output_path:
+        output = np.load(output_path, mmap_mode='r')
+    return output
+
+
+def render_tiles_checkpoint(
+    scene, camera, height, width, integrator, sampler, checkpoint
+):
+    """
+    Render the tiles of the checkpoint that are not done yet, adding their
+    samples to its accumulator, so the render can be resumed later.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+        height(int): Height of the screen in pixels.
+        width(int): Width of the screen in pixels.
+        integrator(function): Returns the color for a ray and scene.
+        sampler(Sampler): Creates the rays for the pixels.
+        checkpoint(Checkpoint): State of the render stored in disk.
+
+    Returns:
+        numpy.array: The pixels with the raytraced colors.
+    """
+    bar = Bar(
+        'Raytracing',
+        max=height * width,
+        suffix='%(percent)d%% [%(elapsed_td)s / %(eta_td)s]',
+        check_tty=False
+    )
+    for index, tile in enumerate(checkpoint.tiles):
+        if checkpoint.tiles_done[index]:
+            bar.next(tile.size)
+            continue
+        pixel_indices = tile.pixel_indices(width)
+        rays = sampler.create_rays(camera, height, width, pixel_indices)
+        colors = trace_rays(rays, scene, integrator)
+        checkpoint.accumulator.add(
+            np.repeat(pixel_indices, sampler.samples), colors
+        )
+        checkpoint.mark_done(index)
+        bar.next(tile.size)
+    bar.finish()
+    checkpoint.flush()
+    return checkpoint.accumulator.image()
+
+
+def render(
+    scene, camera, HEIGHT=100, WIDTH=100, integrator=raytrace, sampler=None,
+    executor=EXECUTOR_SERIAL, tile_size=DEFAULT_TILE_SIZE,
+    tile_order=ORDER_SCANLINE, on_tile=None, output_path=None
+):
+    """
+    Render the image for the given scene and camera. The other render
+    functions use this one with different integrators, samplers and
+    executors.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+        integrator(function): Returns the color for a ray and scene, like
+            raytrace, pathtrace or get_background_color.
+        sampler(Sampler): Creates the rays for the pixels, GridSampler with
+            one sample per pixel if None.
+        executor(str): How the tiles are rendered, serial in this process,
+            pool of processes or batch raytracing engine.
+        tile_size(int): Side of the tiles in pixels.
+        tile_order(str): Order for rendering the tiles (scanline, spiral or
+            hilbert).
+        on_tile(function): Called with the framebuffer and the tile every
+            time a tile is finished.
+        output_path(str): Path of a .npy file where the image is written
+            through a memory map, for images that don't fit in memory.
 
     Returns:
         numpy.array: The pixels with the raytraced colors.
@@ -128,78 +375,212 @@ def render(scene, camera, HEIGHT=100, WIDTH=100):
     ):
         print("Cannot generate an image")
         return output
-    iterations = HEIGHT * WIDTH
+    if sampler is None:
+        sampler = GridSampler()
+    tiles = create_tiles(HEIGHT, WIDTH, tile_size, tile_order)
+    if executor == EXECUTOR_POOL:
+        print("Shooting rays...")
+        return render_tiles_mp(
+            scene, camera, HEIGHT, WIDTH, integrator, sampler, tiles,
+            on_tile, output_path
+        )
+    elif executor not in (EXECUTOR_SERIAL, EXECUTOR_BATCH):
+        raise ValueError("Unknown executor: {}".format(executor))
+    return render_tiles(
+        scene, camera, HEIGHT, WIDTH, integrator, sampler, tiles,
+        executor == EXECUTOR_BATCH, on_tile, output_path
+    )
+
+
+def render_aa(
+    scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4,
+    checkpoint=None
+):
+    """
+    Render the image for the given scene and camera using raytracing.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+        checkpoint(Checkpoint): If given the progress is saved in it so the
+            render can be resumed.
+
+    Returns:
+        numpy.array: The pixels with the raytraced colors.
+    """
+    return render_aa_t(
+        scene, camera, raytrace, HEIGHT, WIDTH, V_SAMPLES, H_SAMPLES,
+        checkpoint
+    )
+
+
+def render_batch(
+    scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4
+):
+    """
+    Render the image for the given scene and camera tracing whole tiles of
+    pixels at the same time with the batch raytracing engine.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+
+    Returns:
+        numpy.array: The pixels with the raytraced colors.
+    """
+    # Tiles with about BATCH_SIZE pixels
+    tile_size = int(np.sqrt(BATCH_SIZE))
+    return render(
+        scene, camera, HEIGHT, WIDTH,
+        sampler=JitteredSampler(V_SAMPLES, H_SAMPLES),
+        executor=EXECUTOR_BATCH, tile_size=tile_size
+    )
+
+
+def render_progressive(
+    scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4,
+    on_pass=None, integrator=raytrace, sampler=None
+):
+    """
+    Render the image for the given scene and camera adding one sample to
+    every pixel in each pass, so an intermediate image is available after
+    each pass. The samples of a pixel still use one cell of the V_SAMPLES x
+    H_SAMPLES grid each, visited in random order.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+        on_pass(function): Called with the intermediate image and the number
+            of samples per pixel after each pass, if it returns True the
+            render stops early.
+        integrator(function): Returns the color for a ray and scene.
+        sampler(Sampler): Creates the rays for the pixels, JitteredSampler
+            with V_SAMPLES x H_SAMPLES if None.
+
+    Returns:
+        numpy.array: The pixels with the raytraced colors.
+    """
+    accumulator = Accumulator(HEIGHT, WIDTH)
+    if not scene or scene.is_empty() or not camera or camera.inside(
+        scene.objects
+    ):
+        print("Cannot generate an image")
+        return accumulator.image()
+    if sampler is None:
+        sampler = JitteredSampler(V_SAMPLES, H_SAMPLES)
+    n = HEIGHT * WIDTH
     bar = Bar(
         'Raytracing',
-        max=iterations,
+        max=sampler.samples,
         suffix='%(percent)d%% [%(elapsed_td)s / %(eta_td)s]',
         check_tty=False
     )
-    for j in range(HEIGHT):
-        for i in range(WIDTH):
-            x = i
-            y = HEIGHT - 1 - j
-            # Get x projected in view coord
-            xp = (x / float(WIDTH)) * camera.scale_x
-            # Get y projected in view coord
-            yp = (y / float(HEIGHT)) * camera.scale_y
-            pp = camera.p00 + xp * camera.n0 + yp * camera.n1
-            npe = utils.normalize(pp - camera.position)
-            ray = Ray(pp, npe)
-            color = raytrace(ray, scene)
-            output[j][i] = color.round().astype(np.uint8)
-            bar.next()
+    for pass_number, sample_index in enumerate(
+        np.random.permutation(sampler.samples)
+    ):
+        for start in range(0, n, BATCH_SIZE):
+            pixel_indices = np.arange(start, min(start + BATCH_SIZE, n))
+            rays = sampler.create_rays(
+                camera, HEIGHT, WIDTH, pixel_indices, sample_index
+            )
+            colors = trace_rays(rays, scene, integrator, batch=True)
+            accumulator.add(pixel_indices, colors)
+        bar.next()
+        if on_pass and on_pass(accumulator.image(), pass_number + 1):
+            break
     bar.finish()
-    return output
+    return accumulator.image()
 
 
-def render_aa(scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4):
+def sample_adaptive(
+    scene, camera, accumulator, sampler=None,
+    max_samples=MAX_ADAPTIVE_SAMPLES, threshold=ADAPTIVE_THRESHOLD, bar=None,
+    integrator=raytrace
+):
     """
-    Render the image for the given scene and camera using raytracing.
+    Add samples to the pixels of the accumulator until the estimated error
+    of each pixel is below threshold or it has max_samples. Every round
+    adds the samples of the sampler to the pixels that still need them.
+
+    Args:
+        scene(Scene): The scene that contains objects, cameras and lights.
+        camera(Camera): The camera that is rendering this image.
+        accumulator(Accumulator): The buffer where the samples are added.
+        sampler(Sampler): Creates the rays of each round, JitteredSampler
+            with 2 x 2 samples if None.
+        max_samples(int): Maximum number of samples for a pixel.
+        threshold(float): Maximum standard error of the luminance of a pixel
+            (in 0-255 units).
+        bar(Bar): Progress bar that advances once per round.
+        integrator(function): Returns the color for a ray and scene.
+    """
+    if sampler is None:
+        sampler = JitteredSampler(2, 2)
+    height = accumulator.height
+    width = accumulator.width
+    samples = sampler.samples
+    active = np.arange(height * width)
+    while len(active) > 0:
+        for start in range(0, len(active), BATCH_SIZE // samples):
+            pixel_indices = active[start:start + BATCH_SIZE // samples]
+            rays = sampler.create_rays(camera, height, width, pixel_indices)
+            colors = trace_rays(rays, scene, integrator, batch=True)
+            accumulator.add(np.repeat(pixel_indices, samples), colors)
+        if bar:
+            bar.next()
+        counts = accumulator.counts.reshape(-1)
+        error = accumulator.error().reshape(-1)
+        active = np.flatnonzero(
+            (error > threshold) & (counts + samples <= max_samples)
+        )
+
+
+def render_adaptive(
+    scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=2, H_SAMPLES=2,
+    max_samples=MAX_ADAPTIVE_SAMPLES, threshold=ADAPTIVE_THRESHOLD,
+    integrator=raytrace, sampler=None
+):
+    """
+    Render the image for the given scene and camera using raytracing with
+    adaptive sampling, pixels with a noisy estimate (like edges or glossy
+    reflections) get more samples than flat ones.
 
     Args:
         scene(Scene): The scene that contains objects, cameras and lights.
         camera(Camera): The camera that is rendering this image.
+        max_samples(int): Maximum number of samples for a pixel.
+        threshold(float): Maximum standard error of the luminance of a pixel
+            (in 0-255 units).
+        integrator(function): Returns the color for a ray and scene.
+        sampler(Sampler): Creates the rays of each round, JitteredSampler
+            with V_SAMPLES x H_SAMPLES if None.
 
     Returns:
         numpy.array: The pixels with the raytraced colors.
     """
-    output = np.zeros((HEIGHT, WIDTH, RGB_CHANNELS), dtype=np.uint8)
+    accumulator = Accumulator(HEIGHT, WIDTH)
     if not scene or scene.is_empty() or not camera or camera.inside(
         scene.objects
     ):
         print("Cannot generate an image")
-        return output
-    total_samples = H_SAMPLES * V_SAMPLES
-    # This is for showing progress %
-    iterations = HEIGHT * WIDTH * total_samples
+        return accumulator.image()
+    if sampler is None:
+        sampler = JitteredSampler(V_SAMPLES, H_SAMPLES)
     bar = Bar(
         'Raytracing',
-        max=iterations,
+        max=max_samples // sampler.samples,
         suffix='%(percent)d%% [%(elapsed_td)s / %(eta_td)s]',
         check_tty=False
     )
-    for j in range(HEIGHT):
-        for i in range(WIDTH):
-            color = np.array([0, 0, 0], dtype=float)
-            for n in range(V_SAMPLES):
-                for m in range(H_SAMPLES):
-                    r0, r1 = np.random.random_sample(2)
-                    # Floats x, y inside the image plane grid
-                    x = i + ((float(m) + r0) / H_SAMPLES)
-                    y = HEIGHT - 1 - j + ((float(n) + r1) / V_SAMPLES)
-                    # Get x projected in view coord
-                    xp = (x / float(WIDTH)) * camera.scale_x
-                    # Get y projected in view coord
-                    yp = (y / float(HEIGHT)) * camera.scale_y
-                    pp = camera.p00 + xp * camera.n0 + yp * camera.n1
-                    npe = utils.normalize(pp - camera.position)
-                    ray = Ray(pp, npe)
-                    color += raytrace(ray, scene) / float(total_samples)
-                    bar.next()
-            output[j][i] = color.round().astype(np.uint8)
+    sample_adaptive(
+        scene, camera, accumulator, sampler, max_samples, threshold, bar,
+        integrator
+    )
     bar.finish()
-    return output
+    print("Average samples per pixel: {:.2f}".format(
+        accumulator.counts.mean()
+    ))
+    return accumulator.image()
 
 
 def render_mp(scene, camera, height, width):
@@ -212,107 +593,67 @@ def render_mp(scene, camera, height, width):
     Returns:
         numpy.array: The pixels with the raytraced colors.
     """
-    output = np.zeros((height, width, RGB_CHANNELS), dtype=np.uint8)
-    if not scene or scene.is_empty() or not camera or camera.inside(
-        scene.objects
-    ):
-        print("Cannot generate an image")
-        return output
-    print("Creating rays...")
-    rays = create_rays(camera, height, width)
-    pool = mp.Pool(mp.cpu_count())
-    print("Shooting rays...")
-    ray_colors = pool.map(
-        raytrace_mp_wrapper, [(ray, scene) for ray in rays]
-    )
-    pool.close()
-    print("Arranging pixels...")
-    for j in range(height):
-        for i in range(width):
-            output[j][i] = ray_colors[i + j * width]
-    return output
+    # One sample without jitter for each pixel like render
+    return render(scene, camera, height, width, executor=EXECUTOR_POOL)
 
 
 def render_aa_mp(
-        scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4
+        scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4,
+        output_path=None, tile_size=DEFAULT_TILE_SIZE
 ):
     """
     Render the image for the given scene and camera using raytracing in multi-
-    processors.
+    processors. The rays are created lazily for each tile and reduced to pixel
+    colors right away, so big images can be rendered with bounded memory.
 
     Args:
         scene(Scene): The scene that contains objects, cameras and lights.
         camera(Camera): The camera that is rendering this image.
+        output_path(str): Path of a .npy file where the image is written
+            through a memory map, for images that don't fit in memory.
+        tile_size(int): Side of the tiles in pixels.
 
     Returns:
         numpy.array: The pixels with the raytraced colors.
     """
-    output = np.zeros((HEIGHT, WIDTH, RGB_CHANNELS), dtype=np.uint8)
-    if not scene or scene.is_empty() or not camera or camera.inside(
-        scene.objects
-    ):
-        print("Cannot generate an image")
-        return output
-    print("Creating rays...")
-    rays = create_rays_aa(camera, HEIGHT, WIDTH, V_SAMPLES, H_SAMPLES)
-    pool = mp.Pool(mp.cpu_count())
-    print("Shooting rays...")
-    ray_colors = pool.map(
-        raytrace_mp_wrapper, [(ray, scene) for ray in rays]
+    return render(
+        scene, camera, HEIGHT, WIDTH,
+        sampler=JitteredSampler(V_SAMPLES, H_SAMPLES),
+        executor=EXECUTOR_POOL, tile_size=tile_size, output_path=output_path
     )
-    pool.close()
-    print("Arranging pixels...")
-    samples = H_SAMPLES * V_SAMPLES
-    # using list comprehension
-    pixel_colors = [
-        avg(ray_colors[i:i + samples], samples)
-        for i in range(0, len(ray_colors), samples)
-    ]
-    n = WIDTH * HEIGHT
-    pixels_2d = [pixel_colors[i:i + WIDTH] for i in range(0, n, WIDTH)]
-    output = np.asarray(pixels_2d).round().astype(np.uint8)
-    return output
 
 
 def render_aa_mp_unordered(
-    scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4
+    scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=4, H_SAMPLES=4,
+    tile_size=DEFAULT_TILE_SIZE, tile_order=ORDER_SCANLINE, on_tile=None,
+    output_path=None
 ):
     """
     Render the image for the given scene and camera using raytracing in multi-
-    processors unordered with random-jittering anti-aliasing.
+    processors unordered with random-jittering anti-aliasing. The image is
+    split into tiles that the workers take one at a time, so expensive regions
+    are shared between them.
 
     Args:
         scene(Scene): The scene that contains objects, cameras and lights.
         camera(Camera): The camera that is rendering this image.
+        tile_size(int): Side of the tiles in pixels.
+        tile_order(str): Order for rendering the tiles (scanline, spiral or
+            hilbert).
+        on_tile(function): Called with the SharedFramebuffer and the tile
+            every time a tile is finished.
+        output_path(str): Path of a .npy file where the image is written
+            through a memory map, for images that don't fit in memory.
 
     Returns:
         numpy.array: The pixels with the raytraced colors.
     """
-    output = np.zeros([HEIGHT, WIDTH, RGB_CHANNELS], dtype=np.uint8)
-    n = HEIGHT * WIDTH
-    if not scene or scene.is_empty() or not camera or camera.inside(
-        scene.objects
-    ):
-        print("Cannot generate an image")
-        return output
-    threads_count = mp.cpu_count()
-    pool = mp.Pool(threads_count)
-    ray_colors = pool.imap_unordered(
-        raytrace_unordered_wrapper,
-        [
-            (
-                index, HEIGHT, WIDTH, V_SAMPLES, H_SAMPLES, camera, scene
-            ) for index in range(n)
-        ],
-        chunksize=n//threads_count
+    return render(
+        scene, camera, HEIGHT, WIDTH,
+        sampler=JitteredSampler(V_SAMPLES, H_SAMPLES),
+        executor=EXECUTOR_POOL, tile_size=tile_size, tile_order=tile_order,
+        on_tile=on_tile, output_path=output_path
     )
-    pool.close()
-    print("Shooting rays...")
-    for index, color in ray_colors:
-        i = index % WIDTH
-        j = index // WIDTH
-        output[j][i] = color
-    return output
 
 
 def render_dof(scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=6, H_SAMPLES=6):
@@ -327,72 +668,15 @@ def render_dof(scene, camera, HEIGHT=100, WIDTH=100, V_SAMPLES=6, H_SAMPLES=6):
     Returns:
         numpy.array: The pixels with the raytraced colors.
     """
-    output = np.zeros((HEIGHT, WIDTH, RGB_CHANNELS), dtype=np.uint8)
-    if not scene or scene.is_empty() or not camera or camera.inside(
-            scene.objects
-    ):
-        print("Cannot generate an image")
-        return output
-    total_samples = H_SAMPLES * V_SAMPLES
-    iterations = HEIGHT * WIDTH * total_samples
-    bar = Bar(
-        'Raytracing',
-        max=iterations,
-        suffix='%(percent)d%% [%(elapsed_td)s / %(eta_td)s]',
-        check_tty=False
+    return render(
+        scene, camera, HEIGHT, WIDTH,
+        sampler=LensSampler(V_SAMPLES, H_SAMPLES)
     )
-    for j in range(HEIGHT):
-        for i in range(WIDTH):
-            color = np.array([0, 0, 0], dtype=float)
-            lens_sample_offsets = []
-            n0 = camera.n0
-            n1 = camera.n1
-
-            # Generate random offsets inside the camera aperture
-            for n in range(V_SAMPLES):
-                for m in range(H_SAMPLES):
-                    ap = camera.lens_params.ap
-                    # Use random samples from a unit circle
-                    r0, r1 = np.random.random_sample(2)
-                    while r0 ** 2 + r1 ** 2 > 1:
-                        # repeat until you get a sample that is inside a circle
-                        # of radius 1
-                        r0, r1 = np.random.random_sample(2)
-                    x_offset = ((r0 - 0.5) * m) / H_SAMPLES * ap
-                    y_offset = ((r1 - 0.5) * n) / V_SAMPLES * ap
-                    lens_sample_offsets.append((x_offset, y_offset))
-            shuffle(lens_sample_offsets)
-
-            # Shoot rays for sub-samples
-            for n in range(V_SAMPLES):
-                for m in range(H_SAMPLES):
-                    r0, r1 = np.random.random_sample(2)
-                    x = i + ((float(m) + r0) / H_SAMPLES)
-                    y = HEIGHT - 1 - j + ((float(n) + r1) / V_SAMPLES)
-                    # Get x projected in view coord
-                    xp = (x / float(WIDTH)) * camera.scale_x
-                    # Get y projected in view coord
-                    yp = (y / float(HEIGHT)) * camera.scale_y
-                    pp = camera.p00 + xp * camera.n0 + yp * camera.n1
-                    npe = utils.normalize(pp - camera.position)
-
-                    # Randomly offset ray
-                    x_offset, y_offset = lens_sample_offsets.pop()
-                    ps = pp + x_offset * n0 + y_offset * n1
-                    fp = pp + npe * camera.lens_params.f
-                    director = utils.normalize(fp - ps)
-                    ray = Ray(ps, director)
-
-                    color += raytrace(ray, scene) / float(total_samples)
-                    bar.next()
-            output[j][i] = color.round().astype(np.uint8)
-    bar.finish()
-    return output
 
 
 def render_aa_t(
         scene, camera, func, HEIGHT=100, WIDTH=100, V_SAMPLES=4,
-        H_SAMPLES=4
+        H_SAMPLES=4, checkpoint=None
 ):
     """
     Render the image for the given scene and camera using a template function.
@@ -400,6 +684,9 @@ def render_aa_t(
     Args:
         scene(Scene): The scene that contains objects, cameras and lights.
         camera(Camera): The camera that is rendering this image.
+        func(function): Function that returns the color for a ray and scene.
+        checkpoint(Checkpoint): If given the progress is saved in it so the
+            render can be resumed.
 
     Returns:
         numpy.array: The pixels with the raytraced colors.
@@ -410,34 +697,11 @@ def render_aa_t(
     ):
         print("Cannot generate an image")
         return output
-    total_samples = H_SAMPLES * V_SAMPLES
-    # This is for showing progress %
-    iterations = HEIGHT * WIDTH
-    bar = Bar(
-        'Raytracing',
-        max=iterations,
-        suffix='%(percent)d%% [%(elapsed_td)s / %(eta_td)s]',
-        check_tty=False
+    sampler = JitteredSampler(V_SAMPLES, H_SAMPLES)
+    if checkpoint:
+        return render_tiles_checkpoint(
+            scene, camera, HEIGHT, WIDTH, func, sampler, checkpoint
+        )
+    return render(
+        scene, camera, HEIGHT, WIDTH, integrator=func, sampler=sampler
     )
-    for j in range(HEIGHT):
-        for i in range(WIDTH):
-            color = np.array([0, 0, 0], dtype=float)
-            for n in range(V_SAMPLES):
-                for m in range(H_SAMPLES):
-                    r0, r1 = np.random.random_sample(2)
-                    # Floats x, y inside the image plane grid
-                    x = i + ((float(m) + r0) / H_SAMPLES)
-                    y = HEIGHT - 1 - j + ((float(n) + r1) / V_SAMPLES)
-                    # Get x projected in view coord
-                    xp = (x / float(WIDTH)) * camera.scale_x
-                    # Get y projected in view coord
-                    yp = (y / float(HEIGHT)) * camera.scale_y
-                    pp = camera.p00 + xp * camera.n0 + yp * camera.n1
-                    npe = utils.normalize(pp - camera.position)
-                    ray = Ray(pp, npe)
-
-                    color += func(ray, scene) / float(total_samples)
-            bar.next()
-            output[j][i] = color.round().astype(np.uint8)
-    bar.finish()
-    return output
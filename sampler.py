@@ -0,0 +1,153 @@
+import numpy as np
+
+# Local Modules
+from ray import RayBatch
+import utils
+
+
+def create_ray_batch(
+    camera, height, width, v_samples=1, h_samples=1, jitter=True,
+    pixel_indices=None, sample_index=None
+):
+    """
+    Create the rays for the given camera and screen in a single numpy pass.
+
+    Every pixel gets v_samples x h_samples rays, one inside each cell of a
+    grid over the pixel, using random jitter inside the cell if jitter is True.
+    Without jitter and with one sample the rays go through the corner of each
+    pixel, like the ones from render.
+
+    Args:
+        camera(Camera): Camera from where the rays are shot.
+        height(int): Height of the screen in pixels.
+        width(int): Width of the screen in pixels.
+        v_samples(int): Number of samples for a pixel in the vertical axis.
+        h_samples(int): Number of samples for a pixel in the horizontal axis.
+        jitter(bool): Whether to use random jitter inside each sample cell.
+        pixel_indices(numpy.array): Scanline indices (j * width + i) of the
+            pixels to create rays for, all the screen if None.
+        sample_index(int): Only create the sample n * h_samples + m of each
+            pixel instead of all of them.
+
+    Returns:
+        RayBatch: The rays ordered by pixel and then by sample (n, m), so the
+            samples of a pixel are contiguous.
+    """
+    if pixel_indices is None:
+        pixel_indices = np.arange(height * width)
+    pixel_indices = np.asarray(pixel_indices)
+    if sample_index is None:
+        sample_indices = np.arange(v_samples * h_samples)
+    else:
+        sample_indices = np.array([sample_index])
+    samples = len(sample_indices)
+    # Screen position of every sample
+    j = np.repeat(pixel_indices // width, samples)
+    i = np.repeat(pixel_indices % width, samples)
+    n = np.tile(sample_indices // h_samples, len(pixel_indices))
+    m = np.tile(sample_indices % h_samples, len(pixel_indices))
+    if jitter:
+        r0, r1 = np.random.random_sample((2, len(j)))
+    else:
+        r0 = r1 = 0
+    # Floats x, y inside the image plane grid
+    x = i + (m + r0) / h_samples
+    y = height - 1 - j + (n + r1) / v_samples
+    # Get x and y projected in view coord
+    xp = (x / float(width)) * camera.scale_x
+    yp = (y / float(height)) * camera.scale_y
+    pp = (
+        camera.p00
+        + xp[:, np.newaxis] * camera.n0
+        + yp[:, np.newaxis] * camera.n1
+    )
+    npe = utils.normalize_rows(pp - camera.position)
+    return RayBatch(pp, npe)
+
+
+class Sampler:
+    """
+    Creates the camera rays for the pixels of the screen, taking a grid of
+    v_samples x h_samples samples inside each pixel.
+
+    Attributes:
+        v_samples(int): Number of samples for a pixel in the vertical axis.
+        h_samples(int): Number of samples for a pixel in the horizontal axis.
+    """
+    jitter = False
+
+    def __init__(self, v_samples=1, h_samples=1):
+        self.v_samples = v_samples
+        self.h_samples = h_samples
+
+    @property
+    def samples(self):
+        return self.v_samples * self.h_samples
+
+    def create_rays(
+        self, camera, height, width, pixel_indices=None, sample_index=None
+    ):
+        """
+        Create the rays for some pixels of the screen.
+
+        Args:
+            camera(Camera): Camera from where the rays are shot.
+            height(int): Height of the screen in pixels.
+            width(int): Width of the screen in pixels.
+            pixel_indices(numpy.array): Scanline indices (j * width + i) of
+                the pixels, all the screen if None.
+            sample_index(int): Only create this sample of each pixel.
+
+        Returns:
+            RayBatch: The rays ordered by pixel and then by sample.
+        """
+        return create_ray_batch(
+            camera, height, width, self.v_samples, self.h_samples,
+            self.jitter, pixel_indices, sample_index
+        )
+
+
+class GridSampler(Sampler):
+    """
+    Sampler that shoots the rays through the corners of the grid cells, with
+    one sample it gives the same rays as render.
+    """
+    jitter = False
+
+
+class JitteredSampler(Sampler):
+    """
+    Sampler that shoots each ray through a random position inside its grid
+    cell, for random jittering anti-aliasing.
+    """
+    jitter = True
+
+
+class LensSampler(JitteredSampler):
+    """
+    Jittered sampler that also starts each ray in a random point of the lens
+    of the camera and aims it to the focal plane, for depth of field. The
+    focal plane is parallel to the view window at distance f from it, as in
+    the LensParams of the camera.
+    """
+    def create_rays(
+        self, camera, height, width, pixel_indices=None, sample_index=None
+    ):
+        rays = super().create_rays(
+            camera, height, width, pixel_indices, sample_index
+        )
+        lens_params = camera.lens_params
+        # Uniform random points inside the aperture circle
+        r0, r1 = np.random.random_sample((2, len(rays)))
+        radius = lens_params.ap * np.sqrt(r0)
+        theta = 2 * np.pi * r1
+        ps = (
+            rays.pr
+            + (radius * np.cos(theta))[:, np.newaxis] * camera.n0
+            + (radius * np.sin(theta))[:, np.newaxis] * camera.n1
+        )
+        # Point where the pinhole ray crosses the focal plane, off-axis rays
+        # travel farther than f to reach it
+        cos_view = rays.nr @ camera.n2
+        fp = rays.pr + rays.nr * (lens_params.f / cos_view)[:, np.newaxis]
+        return RayBatch(ps, utils.normalize_rows(fp - ps))
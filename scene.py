@@ -1,3 +1,16 @@
+import numpy as np
+
+# Local Modules
+from bvh import BVH
+from grid import Grid
+from ray import Ray, RayBatch
+
+
+ACCEL_BVH = "bvh"
+ACCEL_GRID = "grid"
+ACCELERATORS = {ACCEL_BVH: BVH, ACCEL_GRID: Grid}
+
+
 class Scene:
     """
     Scene for raytracer that manages the objects and cameras.
@@ -9,21 +22,158 @@ class Scene:
         env_map(EnvironmentMap): The Environment Map
         sky_dome(SkyDome): A Sky Dome that can recreate a sky with atmosphere
             dependant on sun direction
+        accel_type(str): The acceleration structure that finalize builds,
+            ACCEL_BVH or ACCEL_GRID that is faster to build again when the
+            objects move
+        accel(BVH): Acceleration structure over the bounded objects, built
+            by finalize
+        unbounded_objects(list): Objects outside the acceleration
+            structure, like planes
     """
 
     def __init__(
             self, cameras, lights, objects, env_map=None,
-            sky_dome=None, main_camera_idx=0
+            sky_dome=None, main_camera_idx=0, accel_type=ACCEL_BVH
     ):
+        if accel_type not in ACCELERATORS:
+            raise ValueError(
+                "Unknown acceleration structure: {}".format(accel_type)
+            )
         self.cameras = cameras
         self.lights = lights
         self.objects = objects
         self.env_map = env_map
         self.sky_dome = sky_dome
         self.main_camera_idx = main_camera_idx
+        self.accel_type = accel_type
+        self.accel = None
+        self.unbounded_objects = objects
+        self.set_ids()
 
     def get_main_camera(self):
         return self.cameras[self.main_camera_idx]
 
     def is_empty(self):
         return not (self.objects or self.env_map or self.sky_dome)
+
+    def set_ids(self):
+        """
+        Give every object its index in objects as ID, occlusion queries
+        exclude objects by ID.
+        """
+        for idx, obj in enumerate(self.objects):
+            obj.set_id(idx)
+
+    def finalize(self):
+        """
+        Build the acceleration structure over the objects, it has to be
+        called again after adding or moving objects. Until then the objects
+        are checked one by one.
+        """
+        self.set_ids()
+        bounded_objects = []
+        self.unbounded_objects = []
+        for obj in self.objects:
+            if obj.bounds() is None:
+                self.unbounded_objects.append(obj)
+            else:
+                bounded_objects.append(obj)
+        self.accel = ACCELERATORS[self.accel_type](bounded_objects)
+
+    def refit(self, moved=None):
+        """
+        Update the acceleration structure after moving objects, only the
+        parts around the moved objects are updated. It is built again with
+        finalize when updating it is not enough.
+
+        Args:
+            moved([Object]): The objects that moved, None for all of them
+        """
+        if self.accel is None:
+            return
+        if not self.accel.refit(moved):
+            self.finalize()
+
+    def closest_hit(self, ray):
+        """
+        Find the closest object hit by the ray.
+
+        Args:
+            ray(Ray): The ray to trace
+
+        Returns:
+            tuple: The t of the hit and the object, (inf, None) if there is no
+                hit. For objects made of parts the part that was hit is
+                returned
+        """
+        t_min = np.inf
+        obj_h = None
+        if self.accel:
+            t_min, obj_h = self.accel.closest_hit(ray)
+        for obj in self.unbounded_objects:
+            t, hit_obj = obj.closest_hit(ray)
+            if 0 < t < t_min:
+                t_min = t
+                obj_h = hit_obj
+        return t_min, obj_h
+
+    def occluded(self, origin, direction, max_t, exclude_id=None):
+        """
+        Check if a ray hits any object before max_t, it stops at the first
+        hit found. Used for shadows.
+
+        Args:
+            origin(numpy.array): Origin of the ray
+            direction(numpy.array): Unit director vector of the ray
+            max_t(float): Hits farther than this are ignored
+            exclude_id(int): ID of the object that is ignored, like the one
+                where the ray starts. The parts of an object, like the
+                triangles of a mesh, have the ID of the object
+
+        Returns:
+            bool: Whether there is a hit
+        """
+        ray = Ray(origin, direction)
+        for obj in self.unbounded_objects:
+            if obj.is_excluded(exclude_id):
+                continue
+            t = ray.intersect(obj)
+            if 0 < t < max_t:
+                return True
+        return bool(self.accel) and self.accel.occluded(
+            ray, max_t, exclude_id
+        )
+
+    def occluded_np(self, origins, directions, max_t, exclude_ids=None):
+        """
+        Array version of occluded for many rays at the same time.
+
+        Args:
+            origins(numpy.array): Origins of the rays with shape (N, 3)
+            directions(numpy.array): Unit director vectors with shape (N, 3)
+            max_t(numpy.array): Hits farther than this are ignored (N,)
+            exclude_ids(numpy.array): ID of the object that each ray ignores
+                with shape (N,)
+
+        Returns:
+            numpy.array: Mask of the rays that hit an object with shape (N,)
+        """
+        rays = RayBatch(origins, directions)
+        occluded = np.zeros(len(rays), dtype=bool)
+        for obj in self.unbounded_objects:
+            # Only cast the rays that are not in shadow yet
+            pending = np.flatnonzero(~occluded)
+            if exclude_ids is not None and not obj.parts_occlude:
+                pending = pending[exclude_ids[pending] != obj.ID]
+            if len(pending) == 0:
+                continue
+            t = rays[pending].intersect(obj)
+            occluded[pending] = (0 < t) & (t < max_t[pending])
+        if self.accel:
+            pending = np.flatnonzero(~occluded)
+            if len(pending):
+                occluded[pending] = self.accel.occluded_np(
+                    rays[pending], max_t[pending],
+                    None if exclude_ids is None else exclude_ids[pending]
+                )
+        return occluded
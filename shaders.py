@@ -1,6 +1,4 @@
 import numpy as np
-# Local modules
-from ray import Ray
 
 TYPE_FLAT = "flat"
 TYPE_DIFFUSE_LIGHT = "diffuse_light"
@@ -8,6 +6,22 @@ TYPE_DIFFUSE_COLORS = "diffuse_colors"
 TYPE_DIFF_SPECULAR = "diffuse_with_specular"
 TYPE_DIFF_SPEC_BORDER = "diffuse_specular_border"
 TYPE_LIGHT_MAP = "light_map"
+# Objects compile their shader type into one of these codes when it is set
+SHADER_UNKNOWN = -1
+SHADER_FLAT = 0
+SHADER_DIFFUSE_LIGHT = 1
+SHADER_DIFFUSE_COLORS = 2
+SHADER_DIFF_SPECULAR = 3
+SHADER_DIFF_SPEC_BORDER = 4
+SHADER_LIGHT_MAP = 5
+SHADER_CODES = {
+    TYPE_FLAT: SHADER_FLAT,
+    TYPE_DIFFUSE_LIGHT: SHADER_DIFFUSE_LIGHT,
+    TYPE_DIFFUSE_COLORS: SHADER_DIFFUSE_COLORS,
+    TYPE_DIFF_SPECULAR: SHADER_DIFF_SPECULAR,
+    TYPE_DIFF_SPEC_BORDER: SHADER_DIFF_SPEC_BORDER,
+    TYPE_LIGHT_MAP: SHADER_LIGHT_MAP
+}
 COLOR_FOR_LIGHT = np.array([255, 255, 255], dtype=float)
 COLOR_FOR_BORDER = np.array([185, 185, 185], dtype=float)
 SHADOW_STRENGTH = 0.9
@@ -110,16 +124,115 @@ def diffuse_specular_border(n, l, eye, dark, light, ks, thickness):
     return color
 
 
-def hard_shadow(ph, objects, l, dist_l):
+def dot_rows(a, b):
+    """
+    Dot product of every row of a with the same row of b.
+    """
+    return np.einsum('ij,ij->i', a, b)
+
+
+def smooth_step_np(x, step_min, step_max):
+    """
+    Array version of the smooth step used for specular highlights, it maps
+    step_min to 0 and step_max to 1 with clamping.
+    """
+    x = np.clip((x - step_min) / (step_max - step_min), 0, 1)
+    return -2 * (x ** 3) + 3 * (x ** 2)
+
+
+def diffuse_light_np(n, l):
+    """
+    Array version of diffuse_light.
+
+    Args:
+        n(numpy.array): Unit normal vectors with shape (N, 3)
+        l(numpy.array): Unit vectors in the direction to the light (N, 3)
+
+    Returns:
+        numpy.array: The calculated colors in RGB with shape (N, 3)
+    """
+    diffuse_coef = dot_rows(n, l)
+    return np.maximum(0, diffuse_coef)[:, np.newaxis] * COLOR_FOR_LIGHT
+
+
+def diffuse_colors_np(n, l, dark, light):
+    """
+    Array version of diffuse_colors.
+
+    Args:
+        n(numpy.array): Unit normal vectors with shape (N, 3)
+        l(numpy.array): Unit vectors in the direction to the light (N, 3)
+        dark(numpy.array): RGB dark colors with shape (N, 3) or (3,)
+        light(numpy.array): RGB light colors with shape (N, 3) or (3,)
+
+    Returns:
+        numpy.array: The calculated colors with shape (N, 3)
+    """
+    t = np.maximum(0, dot_rows(n, l))[:, np.newaxis]
+    return light * t + dark * (1 - t)
+
+
+def diffuse_with_specular_np(n, l, eye, dark, light, ks):
+    """
+    Array version of diffuse_with_specular.
+
+    Args:
+        n(numpy.array): Unit normal vectors with shape (N, 3)
+        l(numpy.array): Unit vectors in the direction to the light (N, 3)
+        eye(numpy.array): Unit vectors in the direction of the viewer (N, 3)
+        dark(numpy.array): RGB dark colors with shape (N, 3) or (3,)
+        light(numpy.array): RGB light colors with shape (N, 3) or (3,)
+        ks(float): size of specularity, or an array with one for each row
+
+    Returns:
+        numpy.array: The calculated colors with shape (N, 3)
+    """
+    n_dot_l = dot_rows(n, l)[:, np.newaxis]
+    t = np.maximum(0, n_dot_l)
+    color = light * t + dark * (1 - t)
+    # Reflection of the light vectors
+    r = -1 * l + 2 * n_dot_l * n
+    s = np.maximum(0, dot_rows(eye, r))
+    s = smooth_step_np(s, 0.78, 1) ** 4
+    s_ks = (s * ks)[:, np.newaxis]
+    return color * (1 - s_ks) + s_ks * COLOR_FOR_LIGHT
+
+
+def diffuse_specular_border_np(n, l, eye, dark, light, ks, thickness):
+    """
+    Array version of diffuse_specular_border.
+
+    Args:
+        n(numpy.array): Unit normal vectors with shape (N, 3)
+        l(numpy.array): Unit vectors in the direction to the light (N, 3)
+        eye(numpy.array): Unit vectors in the direction of the viewer (N, 3)
+        dark(numpy.array): RGB dark colors with shape (N, 3) or (3,)
+        light(numpy.array): RGB light colors with shape (N, 3) or (3,)
+        ks(float): size of specularity, or an array with one for each row
+        thickness(float): thickness parameter for the border, or an array
+            with one for each row
+
+    Returns:
+        numpy.array: The calculated colors with shape (N, 3)
+    """
+    b = np.maximum(0, 1 - dot_rows(eye, n))
+    b = np.clip((b - thickness) / (1 - thickness), 0, 1)[:, np.newaxis]
+    color = diffuse_with_specular_np(n, l, eye, dark, light, ks)
+    return color * (1 - b) + b * COLOR_FOR_BORDER
+
+
+def hard_shadow(ph, scene, l, dist_l, exclude_id=None):
     """
     Determines if this point should have a shadow for the light in pl.
 
     Args:
         ph: 3D Point of hit
-        objects([Object]): list of objects that can be between the point and
-            the light
+        scene(Scene): the scene with the objects that can be between the point
+            and the light
         l(numpy.array): unit vector pointing to the light
         dist_l(float): distance to the light
+        exclude_id(int): ID of the object that is not checked, usually the
+            one that contains ph
 
     Returns:
         numpy.array: The calculated color for this hard shadow (RGB)
@@ -128,13 +241,9 @@ def hard_shadow(ph, objects, l, dist_l):
     if np.array_equal(l, np.zeros(3)):
         return np.zeros(3)
     shadow_coef = 0
-    r = Ray(ph, l)
-    for obj in objects:
-        # Cast ray from ph to the object with n = l and shadow if t < dist_l
-        t = r.intersect(obj)
-        if 0 < t < dist_l:
-            shadow_coef = 1
-            break
+    # Cast ray from ph with n = l and shadow if an object is hit at t < dist_l
+    if scene.occluded(ph, l, dist_l, exclude_id):
+        shadow_coef = 1
     shadow_color = np.zeros(3)
     # Use SHADOW_STRENGTH = 0 for no shadows and 1 for hard shadows
     shadow_coef *= max(0.0, min(SHADOW_STRENGTH, 1.0))
@@ -142,6 +251,40 @@ def hard_shadow(ph, objects, l, dist_l):
     return color
 
 
+def hard_shadow_np(ph, scene, l, dist_l, exclude_ids=None):
+    """
+    Array version of hard_shadow for many hit points at the same time.
+
+    Args:
+        ph(numpy.array): 3D Points of hit with shape (N, 3)
+        scene(Scene): the scene with the objects that can be between the
+            points and the light
+        l(numpy.array): unit vectors pointing to the light with shape (N, 3)
+        dist_l(numpy.array): distances to the light with shape (N,)
+        exclude_ids(numpy.array): ID of the object that is not checked for
+            each point with shape (N,)
+
+    Returns:
+        numpy.array: The calculated colors for the hard shadows (N, 3)
+    """
+    # Case outside of cone in SpotLight
+    no_light = np.all(l == 0, axis=1)
+    occluded = np.zeros(len(ph), dtype=bool)
+    lit = np.flatnonzero(~no_light)
+    if len(lit):
+        occluded[lit] = scene.occluded_np(
+            ph[lit], l[lit], dist_l[lit],
+            None if exclude_ids is None else exclude_ids[lit]
+        )
+    shadow_color = np.zeros(3)
+    # Use SHADOW_STRENGTH = 0 for no shadows and 1 for hard shadows
+    shadow_coef = occluded * max(0.0, min(SHADOW_STRENGTH, 1.0))
+    shadow_coef = shadow_coef[:, np.newaxis]
+    color = COLOR_FOR_LIGHT * (1 - shadow_coef) + shadow_color * shadow_coef
+    color[no_light] = 0
+    return color
+
+
 def light_map(n, l, dark, light, caustic):
     """
     Shader calculation for a normal and a light vector and light and dark
@@ -158,3 +301,65 @@ def light_map(n, l, dark, light, caustic):
     surface_color = diffuse_colors(n, l, dark, light)
     color = surface_color + caustic
     return color
+
+
+def light_map_np(n, l, dark, light, caustic):
+    """
+    Array version of light_map.
+
+    Args:
+        n(ndarray): Unit normal vectors with shape (N, 3)
+        l(ndarray): Unit vectors in the direction to the light (N, 3)
+        dark(ndarray): RGB dark colors with shape (N, 3) or (3,)
+        light(ndarray): RGB light colors with shape (N, 3) or (3,)
+        caustic(ndarray): Caustic contributions with shape (N, 3)
+
+    Returns:
+        ndarray: The calculated colors with shape (N, 3)
+    """
+    return diffuse_colors_np(n, l, dark, light) + caustic
+
+
+def make_shader_table(
+        diffuse_light_fn, diffuse_colors_fn, diffuse_with_specular_fn,
+        diffuse_specular_border_fn, light_map_fn
+):
+    """
+    Build the dispatch table from shader codes to the shader functions. All
+    the functions in the table take (n, l, eye, dark, light, ks, thickness,
+    caustic), flat objects aren't shaded so they don't have one.
+    """
+    return {
+        SHADER_DIFFUSE_LIGHT: (
+            lambda n, l, eye, dark, light, ks, thickness, caustic:
+            diffuse_light_fn(n, l)
+        ),
+        SHADER_DIFFUSE_COLORS: (
+            lambda n, l, eye, dark, light, ks, thickness, caustic:
+            diffuse_colors_fn(n, l, dark, light)
+        ),
+        SHADER_DIFF_SPECULAR: (
+            lambda n, l, eye, dark, light, ks, thickness, caustic:
+            diffuse_with_specular_fn(n, l, eye, dark, light, ks)
+        ),
+        SHADER_DIFF_SPEC_BORDER: (
+            lambda n, l, eye, dark, light, ks, thickness, caustic:
+            diffuse_specular_border_fn(
+                n, l, eye, dark, light, ks, thickness
+            )
+        ),
+        SHADER_LIGHT_MAP: (
+            lambda n, l, eye, dark, light, ks, thickness, caustic:
+            light_map_fn(n, l, dark, light, caustic)
+        )
+    }
+
+
+SHADERS = make_shader_table(
+    diffuse_light, diffuse_colors, diffuse_with_specular,
+    diffuse_specular_border, light_map
+)
+SHADERS_NP = make_shader_table(
+    diffuse_light_np, diffuse_colors_np, diffuse_with_specular_np,
+    diffuse_specular_border_np, light_map_np
+)
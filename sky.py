@@ -2,7 +2,7 @@ import numpy as np
 
 # Local Modules
 from constants import RAINBOW_WAVELENGHTS, SUNLIGHT
-from object import HollowSphere, Sphere
+from object import HollowSphere, Sphere, intersect_spheres_all
 from ray import Ray
 import utils
 
@@ -86,12 +86,21 @@ class SkyDome:
         dist_to_atmosphere = r.intersect(self.atmosphere_obj)
         transmittance = 0
         step_size = dist_to_atmosphere / view_samples
+        distances = step_size * np.arange(view_samples)
+        sample_points = r.pr + distances[:, np.newaxis] * r.nr
+        # Rays from all the samples to the sun against both spheres at once
+        t = intersect_spheres_all(
+            sample_points,
+            np.broadcast_to(self.sun_direction, sample_points.shape),
+            np.array([self.center, self.center], dtype=float),
+            np.array([self.atmosphere_obj.radius, self.planet_obj.radius]),
+            np.array([True, False])
+        )
         for i in range(view_samples):
-            distance = step_size * i
-            sample_point = r.at(distance)
+            distance = distances[i]
+            sample_point = sample_points[i]
             sun_ray = Ray(sample_point, self.sun_direction)
-            t_to_atmosphere = sun_ray.intersect(self.atmosphere_obj)
-            t_to_planet = sun_ray.intersect(self.planet_obj)
+            t_to_atmosphere, t_to_planet = t[i]
             if 0 < t_to_planet < t_to_atmosphere:
                 continue
             out_sun = self.out_scattering(
@@ -1,4 +1,21 @@
+from tests.test_accumulator import AccumulatorTestCase
+from tests.test_batch_raytrace import BatchRaytraceTestCase
+from tests.test_bvh import BVHTestCase
+from tests.test_checkpoint import CheckpointTestCase
+from tests.test_cube import CubeTestCase
+from tests.test_framebuffer import SharedFramebufferTestCase
+from tests.test_grid import GridTestCase
+from tests.test_instance import InstanceTestCase
+from tests.test_light import LightTestCase
+from tests.test_mesh_io import MeshIOTestCase
 from tests.test_ray import RayTestCase
+from tests.test_ray_batch import RayBatchTestCase
+from tests.test_render import RenderTestCase
+from tests.test_shaders import ShadersTestCase
 from tests.test_simulation import SimulationTestCase
 from tests.test_sphere import SphereTestCase
+from tests.test_sphere_set import SphereSetTestCase
+from tests.test_texture import TextureTestCase
 from tests.test_triangle import TriangleTestCase
+from tests.test_triangle_mesh import TriangleMeshTestCase
+from tests.test_tiles import TilesTestCase
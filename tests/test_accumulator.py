@@ -0,0 +1,57 @@
+import numpy as np
+import unittest
+# Local Modules
+from camera import Camera
+from framebuffer import Accumulator
+from light import DirectionalLight
+from material import Material
+from object import Sphere
+from render import sample_adaptive
+from scene import Scene
+import shaders
+
+
+class AccumulatorTestCase(unittest.TestCase):
+    def test_average(self):
+        accumulator = Accumulator(2, 3)
+        pixel_indices = np.array([0, 0, 4])
+        colors = np.array([[10, 20, 30], [20, 40, 60], [255, 0, 1]])
+        accumulator.add(pixel_indices, colors)
+        self.assertEqual(accumulator.counts[0, 0], 2)
+        self.assertEqual(accumulator.counts[1, 1], 1)
+        img = accumulator.image()
+        self.assertEqual(img.dtype, np.uint8)
+        self.assertTrue(np.array_equal(img[0, 0], [15, 30, 45]))
+        self.assertTrue(np.array_equal(img[1, 1], [255, 0, 1]))
+        self.assertEqual(img[0, 1].sum(), 0)
+
+    def test_error(self):
+        accumulator = Accumulator(1, 2)
+        gray = np.ones(3)
+        accumulator.add(np.array([0, 0, 1]), np.array([gray, 3 * gray, gray]))
+        error = accumulator.error()
+        # Standard error of the mean for samples 1 and 3
+        self.assertAlmostEqual(error[0, 0], 1.0, places=5)
+        self.assertEqual(error[0, 1], np.inf)
+
+    def test_sample_adaptive(self):
+        position = np.array([0, 0, 0], dtype=float)
+        v_view = np.array([0, 0, 1], dtype=float)
+        v_up = np.array([0, 1, 0], dtype=float)
+        camera = Camera(position, v_view, v_up, d=1, scale_x=1, scale_y=1)
+        sphere = Sphere(
+            np.array([0, 0, 5]), Material(), shaders.TYPE_DIFFUSE_COLORS, 1
+        )
+        light = DirectionalLight(np.array([0, 0, 1]))
+        scene = Scene([camera], [light], [sphere])
+        accumulator = Accumulator(10, 10)
+        max_samples = 12
+        sample_adaptive(scene, camera, accumulator, max_samples=max_samples)
+        # The empty background only needs the first samples
+        self.assertEqual(accumulator.counts[0, 0], 4)
+        # The edge of the sphere gets more
+        self.assertEqual(accumulator.counts.max(), max_samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
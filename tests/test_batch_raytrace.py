@@ -0,0 +1,86 @@
+import numpy as np
+import unittest
+# Local Modules
+from batch_raytrace import raytrace_batch
+from camera import Camera
+from light import DirectionalLight, PointLight, SpotLight
+from material import Material, COLOR_BLUE, COLOR_GRAY
+from object import HollowSphere, Plane, Sphere, Tetrahedron
+from raytrace import raytrace
+from sampler import create_ray_batch
+from scene import Scene
+import shaders
+from vertex import Vertex
+
+HEIGHT = 12
+WIDTH = 16
+
+
+def create_scene():
+    position = np.array([0, 0, 0], dtype=float)
+    v_view = np.array([0, 0, 1], dtype=float)
+    v_up = np.array([0, 1, 0], dtype=float)
+    camera = Camera(position, v_view, v_up, d=0.26, scale_x=0.6, scale_y=0.4)
+    blue = Material(COLOR_BLUE, specular=0.8)
+    mirror = Material(COLOR_GRAY, border=0.5, kr=0.5)
+    objects = [
+        Sphere(
+            np.array([-0.3, 0, 1]), blue, shaders.TYPE_DIFF_SPECULAR, 0.2
+        ),
+        Sphere(
+            np.array([0.3, 0, 1]), mirror, shaders.TYPE_DIFF_SPEC_BORDER, 0.2
+        ),
+        Plane(
+            np.array([0, -0.2, 0]), Material(), shaders.TYPE_DIFFUSE_COLORS,
+            np.array([0, 1, 0]), np.array([1, 0, 0])
+        ),
+        Tetrahedron(
+            blue, shaders.TYPE_DIFFUSE_COLORS,
+            Vertex(np.array([-0.1, -0.2, 0.8])),
+            Vertex(np.array([0.1, -0.2, 0.8])),
+            Vertex(np.array([0.0, 0.0, 0.9])),
+            Vertex(np.array([0.0, -0.2, 1.0]))
+        )
+    ]
+    lights = [
+        DirectionalLight(np.array([1, -1, 1])),
+        PointLight(np.array([0, 1, 0.5])),
+        SpotLight(
+            np.array([0, 1, 1]), np.pi / 8, np.array([0, -1, 0], dtype=float)
+        )
+    ]
+    return Scene([camera], lights, objects)
+
+
+class BatchRaytraceTestCase(unittest.TestCase):
+    def test_same_colors_as_raytrace(self):
+        scene = create_scene()
+        rays = create_ray_batch(
+            scene.get_main_camera(), HEIGHT, WIDTH, jitter=False
+        )
+        colors = raytrace_batch(rays, scene)
+        self.assertEqual(colors.shape, (HEIGHT * WIDTH, 3))
+        for k, ray in enumerate(rays.to_rays()):
+            self.assertTrue(np.allclose(colors[k], raytrace(ray, scene)))
+
+    def test_hollow_sphere(self):
+        # The camera is inside the sphere so the normals point inwards
+        scene = create_scene()
+        room = Material(COLOR_GRAY, specular=0.5, kr=0.3)
+        scene.objects = [
+            HollowSphere(
+                np.array([0, 0, 1.0]), room, shaders.TYPE_DIFF_SPECULAR, 3
+            )
+        ]
+        scene.lights = [PointLight(np.array([0, 1, 0.5]))]
+        scene.finalize()
+        rays = create_ray_batch(
+            scene.get_main_camera(), HEIGHT, WIDTH, jitter=False
+        )
+        colors = raytrace_batch(rays, scene)
+        for k, ray in enumerate(rays.to_rays()):
+            self.assertTrue(np.allclose(colors[k], raytrace(ray, scene)))
+
+
+if __name__ == '__main__':
+    unittest.main()
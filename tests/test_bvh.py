@@ -0,0 +1,136 @@
+import numpy as np
+import unittest
+# Local Modules
+from bvh import AABB, BVH, inverse_direction
+from material import Material
+from object import Plane, Sphere
+from ray import Ray, RayBatch
+from scene import Scene
+import shaders
+import utils
+
+
+class BVHTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.spheres = [
+            Sphere(
+                rng.uniform(-10, 10, 3), Material(),
+                shaders.TYPE_DIFFUSE_COLORS, rng.uniform(0.2, 1)
+            )
+            for _ in range(60)
+        ]
+        self.rays = [
+            Ray(np.array([0, 0, -20.0]), v / np.linalg.norm(v))
+            for v in rng.uniform(-0.5, 0.5, (100, 3)) + [0, 0, 1]
+        ]
+
+    def test_aabb_intersect(self):
+        box = AABB(np.array([-1, -1, 4]), np.array([1, 1, 6]))
+        pr = np.zeros(3)
+        self.assertEqual(
+            box.intersect(pr, inverse_direction(np.array([0, 0, 1.0]))), 4
+        )
+        self.assertEqual(
+            box.intersect(pr, inverse_direction(np.array([0, 1.0, 0]))),
+            np.inf
+        )
+        # The box is farther than t_max
+        self.assertEqual(
+            box.intersect(pr, inverse_direction(np.array([0, 0, 1.0])), 3),
+            np.inf
+        )
+
+    def test_closest_hit(self):
+        bvh = BVH(self.spheres)
+        for ray in self.rays:
+            t_min = np.inf
+            obj_h = None
+            for obj in self.spheres:
+                t = ray.intersect(obj)
+                if 0 < t < t_min:
+                    t_min = t
+                    obj_h = obj
+            t, obj = bvh.closest_hit(ray)
+            self.assertIs(obj, obj_h)
+            self.assertEqual(t, t_min)
+
+    def test_closest_hit_np(self):
+        scene = Scene([], [], self.spheres)
+        scene.finalize()
+        rays = RayBatch(
+            np.array([ray.pr for ray in self.rays]),
+            np.array([ray.nr for ray in self.rays])
+        )
+        t_min, obj_ids, part_ids = scene.accel.closest_hit_np(rays)
+        self.assertTrue(np.all(part_ids == -1))
+        for k, ray in enumerate(self.rays):
+            t, obj = scene.accel.closest_hit(ray)
+            if obj is None:
+                self.assertEqual(obj_ids[k], -1)
+                continue
+            self.assertEqual(obj_ids[k], obj.ID)
+            self.assertAlmostEqual(t_min[k], t)
+
+    def test_scene_queries(self):
+        plane = Plane(
+            np.array([0, -15, 0]), Material(), shaders.TYPE_DIFFUSE_COLORS,
+            np.array([0, 1, 0]), np.array([1, 0, 0])
+        )
+        scene = Scene([], [], self.spheres + [plane])
+        scene.finalize()
+        self.assertEqual(scene.unbounded_objects, [plane])
+        down = Ray(np.array([0, 20, 30.0]), np.array([0, -1, 0]))
+        t, obj = scene.closest_hit(down)
+        self.assertIs(obj, plane)
+        self.assertAlmostEqual(t, 35)
+        self.assertTrue(scene.occluded(down.pr, down.nr, 40))
+        self.assertFalse(scene.occluded(down.pr, down.nr, 30))
+        self.assertFalse(scene.occluded(down.pr, down.nr, 40, plane.ID))
+
+    def test_occluded_np(self):
+        scene = Scene([], [], self.spheres)
+        scene.finalize()
+        rng = np.random.default_rng(1)
+        n = 200
+        origins = rng.uniform(-20, 20, (n, 3))
+        directions = utils.normalize_rows(rng.normal(size=(n, 3)))
+        max_t = rng.uniform(1, 40, n)
+        exclude_ids = rng.integers(-1, len(self.spheres), n)
+        occluded = scene.occluded_np(origins, directions, max_t, exclude_ids)
+        for k in range(n):
+            self.assertEqual(
+                occluded[k],
+                scene.occluded(
+                    origins[k], directions[k], max_t[k], exclude_ids[k]
+                )
+            )
+
+    def test_refit(self):
+        scene = Scene([], [], self.spheres)
+        scene.finalize()
+        bvh = scene.accel
+        # Small moves keep the tree
+        rng = np.random.default_rng(2)
+        moved = self.spheres[:5]
+        for sphere in moved:
+            sphere.position = sphere.position + rng.uniform(-1, 1, 3)
+        self.assertTrue(bvh.refit(moved))
+        for ray in self.rays:
+            t_min = min(
+                [t for t in map(ray.intersect, self.spheres) if t > 0],
+                default=np.inf
+            )
+            self.assertEqual(bvh.closest_hit(ray)[0], t_min)
+        # An object far away makes the tree too slow so the scene builds it
+        self.spheres[0].position = np.array([500, 500, 500.0])
+        self.assertFalse(bvh.refit(self.spheres[:1]))
+        scene.refit(self.spheres[:1])
+        self.assertIsNot(scene.accel, bvh)
+        self.assertTrue(np.allclose(
+            scene.accel.root.bounds.p_max, [500.0 + self.spheres[0].radius] * 3
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import numpy as np
+import os
+import tempfile
+import unittest
+# Local Modules
+from camera import Camera
+from checkpoint import Checkpoint
+from light import DirectionalLight
+from material import Material
+from object import Sphere
+from render import render_aa
+from scene import Scene
+import shaders
+
+
+class CheckpointTestCase(unittest.TestCase):
+    def setUp(self):
+        position = np.array([0, 0, 0], dtype=float)
+        v_view = np.array([0, 0, 1], dtype=float)
+        v_up = np.array([0, 1, 0], dtype=float)
+        self.camera = Camera(position, v_view, v_up, d=1, scale_x=1, scale_y=1)
+        sphere = Sphere(
+            np.array([0, 0, 5]), Material(), shaders.TYPE_DIFFUSE_COLORS, 1
+        )
+        light = DirectionalLight(np.array([0, 0, 1]))
+        self.scene = Scene([self.camera], [light], [sphere])
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp_dir.name, "checkpoint")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume(self):
+        checkpoint = Checkpoint(self.directory, 20, 20, 1, 1, tile_size=8)
+        expected = render_aa(self.scene, self.camera, 20, 20, 1, 1, checkpoint)
+        # Simulate a crash after the first tile and a partially added tile
+        checkpoint.tiles_done[1:] = False
+        checkpoint.accumulator.counts[8:, :] += 1
+        checkpoint.flush()
+        checkpoint = Checkpoint(
+            self.directory, 20, 20, 1, 1, tile_size=8, resume=True
+        )
+        self.assertEqual(checkpoint.tiles_done.sum(), 1)
+        self.assertEqual(checkpoint.accumulator.counts[8:].sum(), 0)
+        img = render_aa(self.scene, self.camera, 20, 20, 1, 1, checkpoint)
+        self.assertTrue(np.all(checkpoint.accumulator.counts == 1))
+        # The finished tile is not rendered again
+        self.assertTrue(np.array_equal(img[:8, :8], expected[:8, :8]))
+        checkpoint.remove()
+        self.assertFalse(os.path.exists(self.directory))
+
+    def test_different_render(self):
+        Checkpoint(self.directory, 20, 20, 1, 1)
+        with self.assertRaises(ValueError):
+            Checkpoint(self.directory, 20, 20, 2, 2, resume=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
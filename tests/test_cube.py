@@ -0,0 +1,94 @@
+import numpy as np
+import unittest
+# Local Modules
+from bvh import AABB
+from material import Material
+from object import Cube
+from ray import Ray, RayBatch
+import shaders
+import utils
+
+
+class CubeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cube = Cube(
+            Material(), shaders.TYPE_DIFFUSE_COLORS, np.array([0, 0, 5.0]), 2
+        )
+
+    def test_intersect(self):
+        ray = Ray(np.array([1, 0.5, 0]), np.array([0, 0, 1.0]))
+        t = ray.intersect(self.cube)
+        self.assertAlmostEqual(t, 5)
+        ph = ray.at(t)
+        self.assertTrue(np.allclose(self.cube.normal_at(ph), [0, 0, -1]))
+        u, v = self.cube.uvmap(ph)
+        self.assertAlmostEqual(u, 0.5)
+        self.assertAlmostEqual(v, 0.25)
+        miss = Ray(np.array([3, 0.5, 0]), np.array([0, 0, 1.0]))
+        self.assertEqual(miss.intersect(self.cube), -1)
+        # Rays that start inside don't hit, like with spheres
+        inside = Ray(np.array([1, 1, 6.0]), np.array([0, 0, 1.0]))
+        self.assertEqual(inside.intersect(self.cube), -1)
+        side = Ray(np.array([-4, 1, 6.0]), np.array([1, 0, 0.0]))
+        t = side.intersect(self.cube)
+        self.assertAlmostEqual(t, 4)
+        self.assertTrue(
+            np.allclose(self.cube.normal_at(side.at(t)), [-1, 0, 0])
+        )
+
+    def test_rotated(self):
+        # Box rotated 45 degrees around z
+        n0 = utils.normalize(np.array([1, 1, 0.0]))
+        n1 = utils.normalize(np.array([-1, 1, 0.0]))
+        cube = Cube(
+            Material(), shaders.TYPE_DIFFUSE_COLORS, np.zeros(3),
+            np.array([2, 2, 1.0]), n0, n1
+        )
+        ray = Ray(np.array([-0.3, 5, 0.5]), np.array([0, -1, 0.0]))
+        t = ray.intersect(cube)
+        self.assertAlmostEqual(t, 5.3 - 2 * np.sqrt(2))
+        self.assertTrue(
+            np.allclose(cube.normal_at(ray.at(t)), n1)
+        )
+        bounds = cube.bounds()
+        self.assertTrue(np.allclose(bounds.p_min, [-np.sqrt(2), 0, 0]))
+
+    def test_from_bounds(self):
+        bounds = AABB(np.array([-1, -2, 3]), np.array([1, 2, 4]))
+        cube = Cube.from_bounds(Material(), shaders.TYPE_FLAT, bounds)
+        self.assertTrue(np.allclose(cube.bounds().p_max, bounds.p_max))
+        rays = RayBatch(
+            np.array([[0, 0, 0], [5, 0, 0.0]]),
+            np.array([[0, 0, 1], [0, 0, 1.0]])
+        )
+        self.assertTrue(np.allclose(rays.intersect(cube), [3, -1]))
+
+    def test_move(self):
+        self.cube.position = np.array([50, 50, 50.0])
+        self.assertTrue(np.allclose(self.cube.v1, [49, 49, 49]))
+        self.assertTrue(np.allclose(self.cube.bounds().p_min, [49, 49, 49]))
+        ray = Ray(np.array([1, 0.5, 0]), np.array([0, 0, 1.0]))
+        self.assertEqual(ray.intersect(self.cube), -1)
+        # The center comes from the normalized edge directions
+        cube = Cube(
+            Material(), shaders.TYPE_DIFFUSE_COLORS, np.zeros(3), 2,
+            np.array([2, 0, 0.0])
+        )
+        self.assertTrue(np.allclose(cube.position, [1, 1, 1]))
+
+    def test_flat(self):
+        # The box of an axis aligned quad has no thickness
+        bounds = AABB(np.array([-1, -1, 3]), np.array([1, 1, 3]))
+        cube = Cube.from_bounds(Material(), shaders.TYPE_FLAT, bounds)
+        ray = Ray(np.array([0.5, 0, 0]), np.array([0, 0, 1.0]))
+        t = ray.intersect(cube)
+        self.assertAlmostEqual(t, 3)
+        ph = ray.at(t)
+        self.assertTrue(np.allclose(cube.normal_at(ph), [0, 0, -1]))
+        u, v = cube.uvmap(ph)
+        self.assertAlmostEqual(u, 0.75)
+        self.assertAlmostEqual(v, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
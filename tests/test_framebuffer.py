@@ -0,0 +1,38 @@
+import numpy as np
+import os
+import tempfile
+import unittest
+# Local Modules
+from framebuffer import MappedFramebuffer, SharedFramebuffer
+from tiles import Tile
+
+
+class SharedFramebufferTestCase(unittest.TestCase):
+    def test_write_tile_shared(self):
+        with SharedFramebuffer(4, 6) as framebuffer:
+            # Attach to the same block like a worker process would
+            worker_framebuffer = SharedFramebuffer(4, 6, framebuffer.name)
+            tile = Tile(1, 2, 3, 5)
+            pixels = np.full((2, 3, 3), 200, dtype=np.uint8)
+            worker_framebuffer.write_tile(tile, pixels)
+            worker_framebuffer.close()
+            img = framebuffer.snapshot()
+        self.assertTrue(np.all(img[1:3, 2:5] == 200))
+        self.assertEqual(img.sum(), 200 * pixels.size)
+
+    def test_write_tile_mapped(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "output.npy")
+            with MappedFramebuffer(4, 6, path) as framebuffer:
+                worker_framebuffer = framebuffer.attach()()
+                tile = Tile(1, 2, 3, 5)
+                pixels = np.full((2, 3, 3), 200, dtype=np.uint8)
+                worker_framebuffer.write_tile(tile, pixels)
+                worker_framebuffer.close()
+            img = np.load(path)
+        self.assertTrue(np.all(img[1:3, 2:5] == 200))
+        self.assertEqual(img.sum(), 200 * pixels.size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import numpy as np
+import unittest
+# Local Modules
+from grid import Grid
+from material import Material
+from object import Sphere, Triangle
+from ray import Ray, RayBatch
+from scene import ACCEL_GRID, Scene
+import shaders
+import utils
+from vertex import Vertex
+
+
+class GridTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.spheres = [
+            Sphere(
+                rng.uniform(-10, 10, 3), Material(),
+                shaders.TYPE_DIFFUSE_COLORS, rng.uniform(0.2, 1)
+            )
+            for _ in range(60)
+        ]
+        # Rays that start outside and inside the grid
+        origins = np.concatenate([
+            np.tile([0, 0, -20.0], (50, 1)), rng.uniform(-10, 10, (50, 3))
+        ])
+        directions = utils.normalize_rows(rng.normal(size=(100, 3)))
+        directions[:50] = utils.normalize_rows(
+            rng.uniform(-0.5, 0.5, (50, 3)) + [0, 0, 1]
+        )
+        self.rays = [Ray(pr, nr) for pr, nr in zip(origins, directions)]
+
+    def test_closest_hit(self):
+        grid = Grid(self.spheres)
+        for ray in self.rays:
+            t_min = np.inf
+            obj_h = None
+            for obj in self.spheres:
+                t = ray.intersect(obj)
+                if 0 < t < t_min:
+                    t_min = t
+                    obj_h = obj
+            t, obj = grid.closest_hit(ray)
+            self.assertIs(obj, obj_h)
+            self.assertEqual(t, t_min)
+
+    def test_closest_hit_np(self):
+        scene = Scene([], [], self.spheres, accel_type=ACCEL_GRID)
+        scene.finalize()
+        rays = RayBatch(
+            np.array([ray.pr for ray in self.rays]),
+            np.array([ray.nr for ray in self.rays])
+        )
+        t_min, obj_ids, part_ids = scene.accel.closest_hit_np(rays)
+        self.assertTrue(np.all(part_ids == -1))
+        self.assertTrue(np.any(obj_ids >= 0))
+        for k, ray in enumerate(self.rays):
+            t, obj = scene.accel.closest_hit(ray)
+            if obj is None:
+                self.assertEqual(obj_ids[k], -1)
+                continue
+            self.assertEqual(obj_ids[k], obj.ID)
+            self.assertAlmostEqual(t_min[k], t)
+
+    def test_scene_queries(self):
+        scene = Scene([], [], self.spheres, accel_type=ACCEL_GRID)
+        scene.finalize()
+        self.assertIsInstance(scene.accel, Grid)
+        max_t = np.full(len(self.rays), 15.0)
+        exclude_ids = np.arange(len(self.rays)) % len(self.spheres)
+        occluded = scene.occluded_np(
+            np.array([ray.pr for ray in self.rays]),
+            np.array([ray.nr for ray in self.rays]), max_t, exclude_ids
+        )
+        for k, ray in enumerate(self.rays):
+            expected = any(
+                0 < ray.intersect(obj) < max_t[k]
+                for obj in self.spheres if obj.ID != exclude_ids[k]
+            )
+            self.assertEqual(occluded[k], expected)
+        with self.assertRaises(ValueError):
+            Scene([], [], self.spheres, accel_type="octree")
+
+    def test_refit(self):
+        grid = Grid(self.spheres)
+        rays = RayBatch(
+            np.array([ray.pr for ray in self.rays]),
+            np.array([ray.nr for ray in self.rays])
+        )
+        max_t = np.full(len(rays), 15.0)
+        grid.occluded_np(rays, max_t)
+        rng = np.random.default_rng(1)
+        for sphere in self.spheres[:10]:
+            sphere.position = np.clip(
+                sphere.position + rng.uniform(-2, 2, 3), -8, 8
+            )
+        self.assertTrue(grid.refit(self.spheres[:10]))
+        for ray in self.rays:
+            t_min = min(
+                [t for t in map(ray.intersect, self.spheres) if t > 0],
+                default=np.inf
+            )
+            self.assertEqual(grid.closest_hit(ray)[0], t_min)
+        # The cells used by occluded_np follow the moved objects
+        occluded = grid.occluded_np(rays, max_t)
+        for k, ray in enumerate(self.rays):
+            self.assertEqual(occluded[k], grid.occluded(ray, max_t[k]))
+        # Leaving the grid needs a new grid
+        self.spheres[0].position = np.array([0, 0, 50.0])
+        self.assertFalse(grid.refit(self.spheres[:1]))
+
+    def test_flat(self):
+        # All the objects in a plane give a grid with one cell in y
+        triangle = Triangle(
+            Material(), shaders.TYPE_DIFFUSE_COLORS,
+            Vertex(np.array([0, 0, 0.0])), Vertex(np.array([0, 0, 1.0])),
+            Vertex(np.array([1, 0, 0.0]))
+        )
+        grid = Grid([triangle])
+        self.assertEqual(grid.resolution[1], 1)
+        ray = Ray(np.array([0.2, 5, 0.2]), np.array([0, -1.0, 0]))
+        t, obj = grid.closest_hit(ray)
+        self.assertIs(obj, triangle)
+        self.assertAlmostEqual(t, 5)
+        rays = RayBatch(
+            np.array([[0.2, 5, 0.2], [0.2, -5, 0.2], [3, 5, 0.2]]),
+            np.array([[0, -1.0, 0], [0, 1.0, 0], [0, -1.0, 0]])
+        )
+        self.assertEqual(
+            grid.occluded_np(rays, np.full(3, 10.0)).tolist(),
+            [True, True, False]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import numpy as np
+import unittest
+# Local Modules
+from material import Material
+from object import Instance, Sphere, TriangleMesh
+from ray import Ray, RayBatch
+from scene import Scene
+import shaders
+import utils
+
+
+class InstanceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sphere = Sphere(
+            np.zeros(3), Material(), shaders.TYPE_DIFFUSE_COLORS, 1
+        )
+        rng = np.random.default_rng(0)
+        self.origins = rng.uniform(-10, 10, (100, 3))
+        targets = rng.uniform(-3, 3, (100, 3)) + np.array([5, 0, 0])
+        self.directions = utils.normalize_rows(targets - self.origins)
+
+    def test_sphere(self):
+        # Instance of a unit sphere equivalent to a sphere of radius 2
+        transform = utils.transform_matrix(
+            np.array([5, 0, 0]), np.array([0.3, 0.2, 0.1]), 2
+        )
+        instance = Instance(self.sphere, transform)
+        sphere = Sphere(
+            np.array([5, 0, 0.0]), Material(), shaders.TYPE_DIFFUSE_COLORS, 2
+        )
+        self.assertTrue(np.allclose(instance.position, sphere.position))
+        # The rotated box around the unit sphere contains the sphere
+        self.assertTrue(np.all(
+            instance.bounds().p_min <= sphere.bounds().p_min + 1e-9
+        ))
+        rays = RayBatch(self.origins, self.directions)
+        t = rays.intersect(instance)
+        self.assertTrue(np.allclose(t, rays.intersect(sphere)))
+        for k, ray in enumerate(rays.to_rays()):
+            self.assertAlmostEqual(ray.intersect(instance), t[k])
+            if t[k] > 0:
+                ph = ray.at(t[k])
+                self.assertTrue(np.allclose(
+                    instance.normal_at(ph), sphere.normal_at(ph)
+                ))
+
+    def test_mesh(self):
+        vertices = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0.0]])
+        mesh = TriangleMesh(
+            Material(), shaders.TYPE_DIFFUSE_COLORS, vertices,
+            [[0, 1, 2], [0, 2, 3]]
+        )
+        # Many copies of the mesh in a scene share its arrays
+        instances = [
+            Instance(mesh, utils.transform_matrix(np.array([3 * k, 0, 5])))
+            for k in range(10)
+        ]
+        scene = Scene([], [], instances)
+        scene.finalize()
+        ray = Ray(np.array([9.5, 0.5, 0]), np.array([0, 0, 1.0]))
+        t, obj = scene.closest_hit(ray)
+        self.assertAlmostEqual(t, 5)
+        self.assertIs(obj.parent, instances[3])
+        self.assertIs(obj.geometry.parent, mesh)
+        self.assertTrue(np.allclose(obj.normal_at(ray.at(t)), [0, 0, 1]))
+        self.assertFalse(scene.occluded(ray.pr, ray.nr, 10, obj.ID))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import numpy as np
+import unittest
+# Local Modules
+from light import AreaLight, PointLight
+from material import Material
+from object import Sphere
+from raytrace import area_shadow_np, compute_shadow, get_light_samples
+from scene import Scene
+import shaders
+
+
+class LightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.light = AreaLight(
+            np.array([0, 5.0, 0]), 2, 4, np.array([1.0, 0, 0]),
+            np.array([0, 0, 1.0])
+        )
+
+    def assert_stratified(self, samples, m, n):
+        # Local coordinates in [0, 1) with one sample in every cell
+        local = samples - self.light.p00
+        x = local @ self.light.n0 / self.light.s0
+        y = local @ self.light.n1 / self.light.s1
+        self.assertTrue(np.all((0 <= x) & (x < 1) & (0 <= y) & (y < 1)))
+        self.assertTrue(np.allclose(samples[:, 1], 5))
+        cells = np.floor(x * m).astype(int) * n + np.floor(y * n).astype(int)
+        self.assertEqual(sorted(cells), list(range(m * n)))
+
+    def test_samples(self):
+        self.assert_stratified(self.light.get_samples(), 8, 8)
+        self.assert_stratified(self.light.get_samples(4, 2), 4, 2)
+        samples = self.light.get_samples_np(10)
+        self.assertEqual(samples.shape, (10, 64, 3))
+        for k in range(len(samples)):
+            self.assert_stratified(samples[k], 8, 8)
+
+    def test_light_samples(self):
+        light_samples = get_light_samples(
+            [PointLight(np.zeros(3)), self.light]
+        )
+        self.assertIsNone(light_samples[0])
+        self.assertEqual(light_samples[1].shape, (64, 3))
+
+    def test_adaptive_shadow(self):
+        def create_scene(radius):
+            sphere = Sphere(
+                np.array([0, 2.5, 0]), Material(), shaders.TYPE_DIFFUSE_COLORS,
+                radius
+            )
+            scene = Scene([], [self.light], [sphere])
+            scene.finalize()
+            return scene
+        lit = shaders.COLOR_FOR_LIGHT
+        dark = lit * (1 - shaders.SHADOW_STRENGTH)
+        # Far from the sphere all the probes are lit
+        scene = create_scene(1)
+        shadow = compute_shadow(np.array([20.0, 0, 0]), scene, scene.lights)
+        self.assertTrue(np.allclose(shadow, lit))
+        # A big sphere hides the whole light
+        scene = create_scene(2)
+        shadow = compute_shadow(np.zeros(3), scene, scene.lights)
+        self.assertTrue(np.allclose(shadow, dark))
+        # The center is hidden but not the corners, so it uses the samples
+        scene = create_scene(0.8)
+        samples = self.light.get_samples()
+        shadow = compute_shadow(np.zeros(3), scene, scene.lights, None, [
+            samples
+        ])
+        expected, penumbra = area_shadow_np(
+            np.zeros((1, 3)), scene, samples
+        )
+        self.assertTrue(penumbra[0])
+        self.assertTrue(np.allclose(shadow, expected[0]))
+        self.assertTrue(np.all((dark < shadow) & (shadow < lit)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+# Local modules
+from mesh_io import get_cache_filename, load_mesh, read_mesh
+from ray import Ray
+import shaders
+import utils
+
+
+OBJ_QUAD = """# Quad in the plane z = 5
+v 0 0 5
+v 1 0 5
+v 1 1 5
+v 0 1 5
+vt 0 0
+vt 1 0
+vt 1 1
+vt 0 1
+vn 0 0 -1
+f 1/1/1 2/2/1 3/3/1 4/4/1
+"""
+PLY_HEADER = """ply
+format {} 1.0
+element vertex 4
+property float x
+property float y
+property float z
+element face 2
+property list uchar int vertex_indices
+end_header
+"""
+QUAD_VERTICES = np.array(
+    [[0, 0, 5], [1, 0, 5], [1, 1, 5], [0, 1, 5]], dtype=float
+)
+QUAD_FACES = np.array([[0, 1, 2], [0, 2, 3]])
+
+
+class MeshIOTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data, mode="w"):
+        filename = os.path.join(self.directory, name)
+        with open(filename, mode) as f:
+            f.write(data)
+        return filename
+
+    def test_read_obj(self):
+        filename = self.write("quad.obj", OBJ_QUAD)
+        vertices, faces, normals, uvs = read_mesh(filename)
+        self.assertTrue(np.allclose(vertices, QUAD_VERTICES))
+        self.assertTrue(np.array_equal(faces, QUAD_FACES))
+        self.assertTrue(np.allclose(normals, [0, 0, -1]))
+        self.assertTrue(np.allclose(uvs, QUAD_VERTICES[:, :2]))
+        self.assertTrue(os.path.exists(get_cache_filename(filename)))
+        mesh = load_mesh(
+            filename, utils.MTL_DIFFUSE_BLUE, shaders.TYPE_DIFFUSE_COLORS
+        )
+        ray = Ray(np.array([0.75, 0.25, 0]), np.array([0, 0, 1.0]))
+        self.assertAlmostEqual(ray.intersect(mesh), 5)
+
+    def test_read_ply(self):
+        ascii_body = "0 0 5\n1 0 5\n1 1 5\n0 1 5\n3 0 1 2\n3 0 2 3\n"
+        ascii_file = self.write(
+            "ascii.ply", PLY_HEADER.format("ascii") + ascii_body
+        )
+        binary_body = (
+            QUAD_VERTICES.astype("<f4").tobytes()
+            + b"".join(
+                np.uint8(3).tobytes() + face.astype("<i4").tobytes()
+                for face in QUAD_FACES
+            )
+        )
+        binary_file = self.write(
+            "binary.ply",
+            PLY_HEADER.format("binary_little_endian").encode() + binary_body,
+            "wb"
+        )
+        for filename in (ascii_file, binary_file):
+            vertices, faces, normals, uvs = read_mesh(filename, False)
+            self.assertTrue(np.allclose(vertices, QUAD_VERTICES))
+            self.assertTrue(np.array_equal(faces, QUAD_FACES))
+            self.assertIsNone(normals)
+            self.assertIsNone(uvs)
+
+    def test_cache(self):
+        filename = self.write("quad.obj", OBJ_QUAD)
+        read_mesh(filename)
+        # The cache is used while it is newer than the source
+        cache_filename = get_cache_filename(filename)
+        with np.load(cache_filename) as cache:
+            arrays = dict(cache)
+        arrays["vertices"] = arrays["vertices"] * 2
+        np.savez(cache_filename, **arrays)
+        vertices = read_mesh(filename)[0]
+        self.assertTrue(np.allclose(vertices, QUAD_VERTICES * 2))
+        mtime = os.path.getmtime(cache_filename)
+        os.utime(filename, (mtime + 1, mtime + 1))
+        vertices = read_mesh(filename)[0]
+        self.assertTrue(np.allclose(vertices, QUAD_VERTICES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import numpy as np
+import unittest
+# Local Modules
+from camera import Camera
+from ray import Ray, RayBatch
+from sampler import create_ray_batch
+import utils
+
+HEIGHT = 4
+WIDTH = 6
+
+
+class RayBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        position = np.array([0, 0, 0], dtype=float)
+        v_view = np.array([0, 0, 1], dtype=float)
+        v_up = np.array([0, 1, 0], dtype=float)
+        self.camera = Camera(position, v_view, v_up)
+
+    def test_at(self):
+        pr = np.zeros((2, 3))
+        nr = np.array([[0, 0, 1], [1, 0, 0]], dtype=float)
+        batch = RayBatch(pr, nr)
+        points = batch.at(np.array([2.0, 3.0]))
+        expected = np.array([[0, 0, 2], [3, 0, 0]], dtype=float)
+        self.assertTrue(np.array_equal(points, expected))
+        self.assertIsInstance(batch[1], Ray)
+        self.assertEqual(len(batch[:1]), 1)
+
+    def test_create_ray_batch_no_jitter(self):
+        batch = create_ray_batch(self.camera, HEIGHT, WIDTH, jitter=False)
+        self.assertEqual(batch.pr.shape, (HEIGHT * WIDTH, 3))
+        camera = self.camera
+        for j in range(HEIGHT):
+            for i in range(WIDTH):
+                y = HEIGHT - 1 - j
+                xp = (i / float(WIDTH)) * camera.scale_x
+                yp = (y / float(HEIGHT)) * camera.scale_y
+                pp = camera.p00 + xp * camera.n0 + yp * camera.n1
+                npe = utils.normalize(pp - camera.position)
+                ray = batch[j * WIDTH + i]
+                self.assertTrue(np.allclose(ray.pr, pp))
+                self.assertTrue(np.allclose(ray.nr, npe))
+
+    def test_create_ray_batch_jitter(self):
+        v_samples, h_samples = 2, 3
+        pixel_indices = [0, WIDTH + 2]
+        batch = create_ray_batch(
+            self.camera, HEIGHT, WIDTH, v_samples, h_samples,
+            pixel_indices=pixel_indices
+        )
+        samples = v_samples * h_samples
+        self.assertEqual(len(batch), len(pixel_indices) * samples)
+        self.assertTrue(
+            np.allclose(np.linalg.norm(batch.nr, axis=1), np.ones(len(batch)))
+        )
+        # Every sample must land inside its own pixel
+        camera = self.camera
+        dif = batch.pr - camera.p00
+        x = np.dot(dif, camera.n0) / camera.scale_x * WIDTH
+        y = np.dot(dif, camera.n1) / camera.scale_y * HEIGHT
+        for k, index in enumerate(np.repeat(pixel_indices, samples)):
+            i = index % WIDTH
+            j = HEIGHT - 1 - index // WIDTH
+            self.assertTrue(i <= x[k] <= i + 1)
+            self.assertTrue(j <= y[k] <= j + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import numpy as np
+import unittest
+# Local Modules
+from camera import Camera, LensParams
+from light import DirectionalLight
+from material import Material
+from object import Sphere
+from raytrace import get_background_color
+from render import EXECUTOR_BATCH, render
+from sampler import JitteredSampler, LensSampler
+from scene import Scene
+import shaders
+
+
+class RenderTestCase(unittest.TestCase):
+    def setUp(self):
+        position = np.array([0, 0, 0], dtype=float)
+        v_view = np.array([0, 0, 1], dtype=float)
+        v_up = np.array([0, 1, 0], dtype=float)
+        self.camera = Camera(
+            position, v_view, v_up, d=1, scale_x=1, scale_y=1,
+            lens_params=LensParams(f=5, ap=0)
+        )
+        sphere = Sphere(
+            np.array([0, 0, 5]), Material(), shaders.TYPE_DIFFUSE_COLORS, 1
+        )
+        light = DirectionalLight(np.array([0, 0, 1]))
+        self.scene = Scene([self.camera], [light], [sphere])
+
+    def test_executors(self):
+        img = render(self.scene, self.camera, 12, 10)
+        img_batch = render(
+            self.scene, self.camera, 12, 10, executor=EXECUTOR_BATCH
+        )
+        self.assertTrue(np.array_equal(img, img_batch))
+        self.assertGreater(img.sum(), 0)
+        with self.assertRaises(ValueError):
+            render(self.scene, self.camera, 12, 10, executor="gpu")
+
+    def test_integrator(self):
+        img = render(
+            self.scene, self.camera, 12, 10, integrator=get_background_color
+        )
+        self.assertEqual(img.sum(), 0)
+
+    def test_lens_sampler(self):
+        # A lens without aperture gives the same rays as a pinhole camera
+        np.random.seed(0)
+        rays = JitteredSampler(2, 2).create_rays(self.camera, 4, 4)
+        np.random.seed(0)
+        lens_rays = LensSampler(2, 2).create_rays(self.camera, 4, 4)
+        self.assertTrue(np.allclose(rays.pr, lens_rays.pr))
+        self.assertTrue(np.allclose(rays.nr, lens_rays.nr))
+        # With aperture the rays of a pixel meet in the focal plane
+        self.camera.lens_params = LensParams(f=5, ap=0.5)
+        np.random.seed(0)
+        lens_rays = LensSampler(2, 2).create_rays(self.camera, 4, 4)
+        # The view window is in z = 1 so the focal plane is z = 6
+        focus = rays.at((6 - rays.pr[:, 2]) / rays.nr[:, 2])
+        lens_focus = lens_rays.at(
+            (6 - lens_rays.pr[:, 2]) / lens_rays.nr[:, 2]
+        )
+        self.assertFalse(np.allclose(rays.pr, lens_rays.pr))
+        self.assertTrue(np.allclose(focus, lens_focus))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import numpy as np
+import os
+import unittest
+# Local Modules
+import material
+from material import Material
+from object import Sphere
+import shaders
+from texture import ImageTexture
+import utils
+
+
+class ShadersTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 100
+        self.n = utils.normalize_rows(rng.normal(size=(n, 3)))
+        self.l = utils.normalize_rows(rng.normal(size=(n, 3)))
+        # Eye vectors close to the reflections to get specular highlights
+        n_dot_l = shaders.dot_rows(self.n, self.l)[:, np.newaxis]
+        r = -1 * self.l + 2 * n_dot_l * self.n
+        self.eye = utils.normalize_rows(r + rng.normal(0, 0.3, (n, 3)))
+        self.dark = rng.uniform(0, 50, (n, 3))
+        self.light = rng.uniform(150, 255, (n, 3))
+        self.caustic = rng.uniform(0, 20, (n, 3))
+
+    def assert_rows_equal(self, colors, shader):
+        self.assertEqual(colors.shape, (len(self.n), 3))
+        for k in range(len(self.n)):
+            self.assertTrue(np.allclose(colors[k], shader(k)))
+
+    def test_diffuse(self):
+        self.assert_rows_equal(
+            shaders.diffuse_light_np(self.n, self.l),
+            lambda k: shaders.diffuse_light(self.n[k], self.l[k])
+        )
+        self.assert_rows_equal(
+            shaders.diffuse_colors_np(self.n, self.l, self.dark, self.light),
+            lambda k: shaders.diffuse_colors(
+                self.n[k], self.l[k], self.dark[k], self.light[k]
+            )
+        )
+        self.assert_rows_equal(
+            shaders.light_map_np(
+                self.n, self.l, self.dark, self.light, self.caustic
+            ),
+            lambda k: shaders.light_map(
+                self.n[k], self.l[k], self.dark[k], self.light[k],
+                self.caustic[k]
+            )
+        )
+
+    def test_specular(self):
+        colors = shaders.diffuse_with_specular_np(
+            self.n, self.l, self.eye, self.dark, self.light, 0.8
+        )
+        self.assert_rows_equal(
+            colors,
+            lambda k: shaders.diffuse_with_specular(
+                self.n[k], self.l[k], self.eye[k], self.dark[k],
+                self.light[k], 0.8
+            )
+        )
+        # The same colors for every row also work
+        self.assertTrue(np.allclose(
+            shaders.diffuse_with_specular_np(
+                self.n, self.l, self.eye, self.dark[0], self.light[0], 0.8
+            )[0],
+            colors[0]
+        ))
+        self.assert_rows_equal(
+            shaders.diffuse_specular_border_np(
+                self.n, self.l, self.eye, self.dark, self.light, 0.8, 0.7
+            ),
+            lambda k: shaders.diffuse_specular_border(
+                self.n[k], self.l[k], self.eye[k], self.dark[k],
+                self.light[k], 0.8, 0.7
+            )
+        )
+
+    def test_codes(self):
+        mtl = Material()
+        sphere = Sphere(np.zeros(3), mtl, shaders.TYPE_DIFF_SPECULAR, 1)
+        self.assertEqual(sphere.shader_code, shaders.SHADER_DIFF_SPECULAR)
+        self.assertEqual(mtl.texture_code, material.TEXTURE_DIFFUSE)
+        # The codes follow the attributes
+        sphere.shader_type = shaders.TYPE_FLAT
+        self.assertEqual(sphere.shader_code, shaders.SHADER_FLAT)
+        sphere.shader_type = "unknown"
+        self.assertEqual(sphere.shader_code, shaders.SHADER_UNKNOWN)
+        mtl.material_type = material.TYPE_TEXTURED
+        self.assertEqual(mtl.texture_code, material.TEXTURE_NONE)
+        mtl.add_texture(ImageTexture(os.path.join(
+            os.path.dirname(__file__), "..", "textures", "checkers.png"
+        )))
+        self.assertEqual(mtl.texture_code, material.TEXTURE_IMAGE)
+
+
+if __name__ == '__main__':
+    unittest.main()
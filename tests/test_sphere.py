@@ -1,6 +1,11 @@
+import numpy as np
 import unittest
 # Local Modules
 from factories import object_factory, ray_factory
+from material import Material
+from object import HollowSphere, Sphere, intersect_spheres
+from ray import Ray
+import utils
 
 
 class SphereTestCase(unittest.TestCase):
@@ -10,15 +15,50 @@ class SphereTestCase(unittest.TestCase):
         r2 = ray_factory.create_intersecting2()
         r3 = ray_factory.create_non_intersecting()
         rays = [r1, r2, r3]
-        # TODO Put rays into an array
-        pr = map(lambda r: r.pr, rays)
-        nr = map(lambda r: r.nr, rays)
+        pr = np.array([r.pr for r in rays])
+        nr = np.array([r.nr for r in rays])
         sphere = object_factory.create_sphere()
         distances = sphere.intersect_sphere_np(pr, nr)
         # Intersect them to Sphere
         for i in range(len(rays)):
             self.assertEqual(rays[i].intersect(sphere), distances[i])
 
+    def test_intersect_spheres(self):
+        rng = np.random.default_rng(0)
+        spheres = [
+            Sphere(
+                rng.uniform(-10, 10, 3), Material(), None, rng.uniform(1, 3)
+            )
+            for _ in range(20)
+        ]
+        spheres.append(HollowSphere(np.zeros(3), Material(), None, 30))
+        pr = rng.uniform(-15, 15, (50, 3))
+        nr = utils.normalize_rows(rng.normal(size=(50, 3)))
+        t, sphere_ids = intersect_spheres(
+            pr, nr, np.array([s.position for s in spheres]),
+            np.array([s.radius for s in spheres]),
+            np.array([isinstance(s, HollowSphere) for s in spheres])
+        )
+        for k in range(len(pr)):
+            ray = Ray(pr[k], nr[k])
+            distances = [ray.intersect(s) for s in spheres]
+            hits = [d if d > 0 else np.inf for d in distances]
+            self.assertEqual(sphere_ids[k], np.argmin(hits))
+            self.assertAlmostEqual(t[k], min(hits))
+
+    def test_derived(self):
+        sphere = object_factory.create_sphere()
+        r1 = ray_factory.create_intersecting()
+        t = r1.intersect(sphere)
+        self.assertEqual(sphere.derived["radius2"], sphere.radius ** 2)
+        # Assigning the radius or rotation recomputes the derived constants
+        sphere.radius = sphere.radius / 2
+        self.assertEqual(sphere.derived["radius2"], sphere.radius ** 2)
+        self.assertGreater(r1.intersect(sphere), t)
+        sphere.rotation = np.array([0, 0, np.pi / 2])
+        n0, n1, n2 = sphere.get_orientation()
+        self.assertTrue(np.allclose(n0, sphere.rotate_z(np.array([1, 0, 0]))))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+import numpy as np
+import unittest
+# Local Modules
+from material import COLOR_BLUE, Material
+from object import SPHERE_CLUSTER_SIZE, Sphere, SphereSet
+from ray import RayBatch
+from scene import Scene
+import shaders
+import utils
+
+
+class SphereSetTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 3 * SPHERE_CLUSTER_SIZE
+        self.centers = rng.uniform(-20, 20, (n, 3))
+        self.radii = rng.uniform(0.2, 1, n)
+        self.materials = [Material(), Material(COLOR_BLUE)]
+        self.material_ids = rng.integers(0, 2, n)
+        self.sphere_set = SphereSet(
+            self.materials, shaders.TYPE_DIFFUSE_COLORS, self.centers,
+            self.radii, self.material_ids
+        )
+        self.spheres = [
+            Sphere(c, self.materials[m], shaders.TYPE_DIFFUSE_COLORS, r)
+            for c, r, m in zip(self.centers, self.radii, self.material_ids)
+        ]
+        self.origins = rng.uniform(-30, 30, (100, 3))
+        self.directions = utils.normalize_rows(
+            rng.uniform(-10, 10, (100, 3)) - self.origins
+        )
+
+    def test_intersect(self):
+        rays = RayBatch(self.origins, self.directions)
+        t_batch = rays.intersect(self.sphere_set)
+        for k, ray in enumerate(rays.to_rays()):
+            hits = [ray.intersect(sphere) for sphere in self.spheres]
+            hits = [t if t > 0 else np.inf for t in hits]
+            closest = int(np.argmin(hits))
+            t, sphere = self.sphere_set.closest_hit(ray)
+            if hits[closest] == np.inf:
+                self.assertEqual(t, -1)
+                self.assertEqual(t_batch[k], -1)
+                continue
+            self.assertAlmostEqual(t, hits[closest])
+            self.assertAlmostEqual(t_batch[k], hits[closest])
+            self.assertIs(sphere.material, self.spheres[closest].material)
+            self.assertIs(sphere.parent, self.sphere_set)
+            ph = ray.at(t)
+            self.assertTrue(np.allclose(
+                self.sphere_set.normal_at(ph),
+                self.spheres[closest].normal_at(ph)
+            ))
+            self.assertTrue(np.allclose(
+                self.sphere_set.uvmap(ph), self.spheres[closest].uvmap(ph)
+            ))
+
+    def test_group_hits(self):
+        points = self.centers + self.radii[:, np.newaxis] * np.array([0, 1, 0])
+        groups = self.sphere_set.group_hits(points)
+        self.assertEqual(len(groups), 2)
+        for rows, view, _ in groups:
+            for row in rows:
+                self.assertIs(
+                    view.material, self.materials[self.material_ids[row]]
+                )
+
+    def test_self_shadow(self):
+        # Two spheres of the same set, one shadows the other
+        sphere_set = SphereSet(
+            Material(), shaders.TYPE_DIFFUSE_COLORS,
+            np.array([[0, 0, 0], [0, 5, 0.0]]), 1
+        )
+        scene = Scene([], [], [sphere_set])
+        scene.finalize()
+        up = np.array([0, 1, 0.0])
+        ph = np.array([0, 1, 0.0])
+        self.assertTrue(scene.occluded(ph, up, 10, sphere_set.ID))
+        self.assertTrue(scene.occluded_np(
+            ph[np.newaxis], up[np.newaxis], np.array([10.0]),
+            np.array([sphere_set.ID])
+        )[0])
+        # A shadow ray leaving the top sphere doesn't hit it
+        top = np.array([0, 6, 0.0])
+        self.assertFalse(scene.occluded(top, up, 10, sphere_set.ID))
+
+
+if __name__ == '__main__':
+    unittest.main()
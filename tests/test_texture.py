@@ -0,0 +1,54 @@
+import numpy as np
+import os
+import unittest
+# Local Modules
+from texture import Box, IlluminationTexture, ImageTexture, \
+    SolidImageTexture
+
+
+class TextureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.texture = ImageTexture(os.path.join(
+            os.path.dirname(__file__), "..", "textures", "checkers.png"
+        ))
+        rng = np.random.default_rng(0)
+        # Points inside, outside for tiling and in the borders
+        self.u = np.concatenate([rng.uniform(-1.5, 2.5, 200), [0, 1, 0.5]])
+        self.v = np.concatenate([rng.uniform(-1.5, 2.5, 200), [0.5, 1, 0]])
+
+    def test_image_color_np(self):
+        colors = self.texture.get_color_np(self.u, self.v)
+        self.assertEqual(colors.shape, (len(self.u), 3))
+        for k in range(len(self.u)):
+            self.assertTrue(np.allclose(
+                colors[k], self.texture.get_color(self.u[k], self.v[k])[:3]
+            ))
+
+    def test_solid_color_np(self):
+        box = Box(
+            np.zeros(3), 2, 2, 2, np.array([1, 0, 0.0]),
+            np.array([0, 1, 0.0]), np.array([0, 0, 1.0])
+        )
+        texture = SolidImageTexture(self.texture, box)
+        points = np.random.default_rng(1).uniform(-1, 1, (50, 3))
+        colors = texture.get_color_np(points)
+        for k, p in enumerate(points):
+            self.assertTrue(
+                np.allclose(colors[k], texture.get_color(p)[:3])
+            )
+
+    def test_illumination_color_np(self):
+        illumination_map = IlluminationTexture(64, 32)
+        illumination_map.data = np.random.default_rng(2).integers(
+            0, 256, (32, 64, 3)
+        ).astype(np.uint8)
+        colors = illumination_map.get_interpolated_color_np(self.u, self.v)
+        for k in range(len(self.u)):
+            self.assertTrue(np.allclose(
+                colors[k],
+                illumination_map.get_interpolated_color(self.u[k], self.v[k])
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import numpy as np
+import unittest
+# Local Modules
+from tiles import ORDER_HILBERT, ORDER_SCANLINE, ORDER_SPIRAL, create_tiles
+
+HEIGHT = 50
+WIDTH = 70
+TILE_SIZE = 16
+
+
+class TilesTestCase(unittest.TestCase):
+    def test_tiles_cover_screen(self):
+        for order in [ORDER_SCANLINE, ORDER_SPIRAL, ORDER_HILBERT]:
+            tiles = create_tiles(HEIGHT, WIDTH, TILE_SIZE, order)
+            self.assertEqual(len(tiles), 4 * 5)
+            counts = np.zeros(HEIGHT * WIDTH, dtype=int)
+            for tile in tiles:
+                counts[tile.pixel_indices(WIDTH)] += 1
+            self.assertTrue(np.all(counts == 1))
+
+    def test_spiral_starts_in_center(self):
+        tiles = create_tiles(
+            5 * TILE_SIZE, 5 * TILE_SIZE, TILE_SIZE, ORDER_SPIRAL
+        )
+        self.assertEqual((tiles[0].j0, tiles[0].i0), (32, 32))
+
+    def test_hilbert_tiles_are_neighbors(self):
+        tiles = create_tiles(
+            8 * TILE_SIZE, 8 * TILE_SIZE, TILE_SIZE, ORDER_HILBERT
+        )
+        for tile, next_tile in zip(tiles, tiles[1:]):
+            distance = (
+                abs(tile.j0 - next_tile.j0) + abs(tile.i0 - next_tile.i0)
+            )
+            self.assertEqual(distance, TILE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import numpy as np
+# Local modules
+from batch_raytrace import raytrace_batch
+from light import PointLight
+from object import MESH_CLUSTER_SIZE, TriangleMesh
+from ray import Ray, RayBatch
+from raytrace import raytrace
+from scene import Scene
+import shaders
+import utils
+
+
+class TriangleMeshTestCase(unittest.TestCase):
+    def setUp(self):
+        # Grid of quads in the plane z = 5
+        n = 40
+        x, y = np.meshgrid(np.arange(n + 1), np.arange(n + 1))
+        self.vertices = np.stack(
+            [x.ravel(), y.ravel(), np.full(x.size, 5.0)], axis=1
+        )
+        faces = []
+        for j in range(n):
+            for i in range(n):
+                a = j * (n + 1) + i
+                faces.append([a, a + 1, a + n + 1])
+                faces.append([a + 1, a + n + 2, a + n + 1])
+        self.uvs = self.vertices[:, :2] / n
+        self.mesh = TriangleMesh(
+            utils.MTL_DIFFUSE_BLUE, shaders.TYPE_DIFFUSE_COLORS,
+            self.vertices, faces, uvs=self.uvs
+        )
+
+    def test_intersect(self):
+        self.assertGreater(len(self.mesh.faces), MESH_CLUSTER_SIZE)
+        ray = Ray(np.array([10.25, 20.5, 0]), np.array([0, 0, 1.0]))
+        self.assertAlmostEqual(ray.intersect(self.mesh), 5)
+        miss = Ray(np.array([-1, 20.5, 0]), np.array([0, 0, 1.0]))
+        self.assertEqual(miss.intersect(self.mesh), -1)
+        behind = Ray(np.array([10.25, 20.5, 6]), np.array([0, 0, 1.0]))
+        self.assertEqual(behind.intersect(self.mesh), -1)
+
+    def test_closest_hit(self):
+        scene = Scene([], [], [self.mesh])
+        scene.finalize()
+        ray = Ray(np.array([10.25, 20.5, 0]), np.array([0, 0, 1.0]))
+        t, triangle = self.mesh.closest_hit(ray)
+        self.assertIs(triangle.parent, self.mesh)
+        ph = ray.at(t)
+        self.assertTrue(triangle.is_inside(ph))
+        u, v = triangle.uvmap(ph)
+        self.assertAlmostEqual(u, 10.25 / 40)
+        self.assertAlmostEqual(v, 20.5 / 40)
+        self.assertTrue(np.allclose(self.mesh.normal_at(ph), [0, 0, 1]))
+        self.assertFalse(scene.occluded(ray.pr, ray.nr, 10, triangle.ID))
+
+    def test_intersect_np(self):
+        rng = np.random.default_rng(0)
+        origins = rng.uniform(-5, 45, (50, 3)) * [1, 1, 0]
+        directions = utils.normalize_rows(
+            rng.uniform(-5, 45, (50, 3)) * [1, 1, 0] + [0, 0, 5] - origins
+        )
+        t, faces = self.mesh.intersect_np(origins, directions)
+        self.assertTrue(((t > 0) == (faces >= 0)).all())
+        for k in range(len(origins)):
+            ray = Ray(origins[k], directions[k])
+            self.assertAlmostEqual(t[k], ray.intersect(self.mesh))
+            if faces[k] >= 0:
+                p = ray.at(t[k])
+                self.assertEqual(faces[k], self.mesh.find_face(p))
+                u, v = self.mesh.uvmap_np(p[np.newaxis], faces[k:k + 1])
+                self.assertTrue(np.allclose(
+                    (u[0], v[0]), self.mesh.uvmap(p)
+                ))
+
+    def test_same_colors_as_raytrace(self):
+        light = PointLight(np.array([20, 20, 0.0]))
+        scene = Scene([], [light], [self.mesh])
+        scene.finalize()
+        rng = np.random.default_rng(1)
+        origins = np.tile([20, 20, 0.0], (40, 1))
+        rays = RayBatch(
+            origins, utils.normalize_rows(rng.uniform(-1, 1, (40, 3)) + 0.5)
+        )
+        colors = raytrace_batch(rays, scene)
+        for k, ray in enumerate(rays.to_rays()):
+            self.assertTrue(np.allclose(colors[k], raytrace(ray, scene)))
+
+    def test_degenerate_face(self):
+        faces = np.concatenate([[[0, 1, 1]], self.mesh.faces])
+        mesh = TriangleMesh(
+            utils.MTL_DIFFUSE_BLUE, shaders.TYPE_DIFFUSE_COLORS,
+            self.vertices, faces, uvs=self.uvs
+        )
+        degenerate = np.flatnonzero(
+            (mesh.faces == [0, 1, 1]).all(axis=1)
+        )[0]
+        p = np.array([10.25, 20.5, 5])
+        self.assertNotEqual(mesh.find_face(p), degenerate)
+        u, v = mesh.uvmap(p)
+        self.assertAlmostEqual(u, 10.25 / 40)
+        self.assertAlmostEqual(v, 20.5 / 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
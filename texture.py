@@ -9,6 +9,48 @@ DEFAULT_MAP_WIDTH = 1024
 DEFAULT_MAP_HEIGHT = 1024
 
 
+def interpolate_np(data, width, height, u, v):
+    """
+    Array version of the color lookup of ImageTexture.get_color and
+    IlluminationTexture.get_interpolated_color, with tiling and bilinear
+    interpolation of the 4 closest pixels except in the borders.
+
+    Args:
+        data(numpy.array): The pixels with shape (H, W, C)
+        width(int): Width of the texture coordinates in pixels
+        height(int): Height of the texture coordinates in pixels
+        u(numpy.array): Horizontal coordinates of the points with shape (N,)
+        v(numpy.array): Vertical coordinates of the points with shape (N,)
+
+    Returns:
+        numpy.array: RGB colors with shape (N, 3)
+    """
+    u = np.asarray(u, dtype=float)
+    v = np.asarray(v, dtype=float)
+    # Use tiling
+    u = np.where((u < 0) | (u > 1), u - np.floor(u), u)
+    v = np.where((v < 0) | (v > 1), v - np.floor(v), v)
+    x = u * width
+    # Flip y value to go from bottom to top
+    y = height - v * height
+    i = np.round(x).astype(int)
+    j = np.round(y).astype(int)
+    border = (i == 0) | (j == 0) | (i == width) | (j == height)
+    i = np.where(i == width, i - 1, i)
+    j = np.where(j == height, j - 1, j)
+    # t and s are interpolation parameters that go from 0 to 1
+    t = (x - i + 0.5)[:, np.newaxis]
+    s = (y - j + 0.5)[:, np.newaxis]
+    color = (
+        data[j - 1, i - 1] * (1 - t) * (1 - s)
+        + data[j - 1, i] * t * (1 - s)
+        + data[j, i - 1] * (1 - t) * s
+        + data[j, i] * t * s
+    )
+    color[border] = data[j[border], i[border]]
+    return color[:, :3]
+
+
 class Texture:
     """
     Represent a texture for the material of an object.
@@ -86,6 +128,12 @@ class ImageTexture(Texture):
         )[:3]
         return color
 
+    def get_color_np(self, u, v):
+        """
+        Array version of get_color for points with shape (N,) in u and v.
+        """
+        return interpolate_np(self.img, self.w, self.h, u, v)
+
     def prepare_for_sphere(self):
         im_arr = self.img
         new_arr = np.tile(im_arr, 2)
@@ -138,6 +186,15 @@ class SolidImageTexture(Texture):
         color = self.img_texture.get_color(u, v)
         return color
 
+    def get_color_np(self, points):
+        """
+        Array version of get_color for points with shape (N, 3).
+        """
+        dif = points - self.box.min_vertex
+        u = dif @ self.box.n0 / self.box.s0
+        v = dif @ self.box.n1 / self.box.s1
+        return self.img_texture.get_color_np(u, v)
+
 
 class IlluminationTexture(Texture):
     """
@@ -257,3 +314,10 @@ class IlluminationTexture(Texture):
             + self.data[j][i] * t * s
         )[:3]   # Ensure this only gives RGB and not A
         return color
+
+    def get_interpolated_color_np(self, u, v):
+        """
+        Array version of get_interpolated_color for points with shape (N,)
+        in u and v.
+        """
+        return interpolate_np(self.data, self.width, self.height, u, v)
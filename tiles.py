@@ -0,0 +1,134 @@
+import numpy as np
+
+
+ORDER_SCANLINE = "scanline"
+ORDER_SPIRAL = "spiral"
+ORDER_HILBERT = "hilbert"
+DEFAULT_TILE_SIZE = 16
+
+
+class Tile:
+    """
+    Rectangular region of the screen that is rendered as a single task.
+
+    Attributes:
+        j0(int): First row of the tile
+        i0(int): First column of the tile
+        j1(int): Row after the last row of the tile
+        i1(int): Column after the last column of the tile
+    """
+    def __init__(self, j0, i0, j1, i1):
+        self.j0 = j0
+        self.i0 = i0
+        self.j1 = j1
+        self.i1 = i1
+
+    def __str__(self):
+        return "rows: {}-{}, cols: {}-{}".format(
+            self.j0, self.j1, self.i0, self.i1
+        )
+
+    @property
+    def height(self):
+        return self.j1 - self.j0
+
+    @property
+    def width(self):
+        return self.i1 - self.i0
+
+    @property
+    def size(self):
+        return self.height * self.width
+
+    def pixel_indices(self, width):
+        """
+        Get the scanline indices (j * width + i) of the pixels in this tile.
+
+        Args:
+            width(int): Width of the screen in pixels
+
+        Returns:
+            numpy.array: The indices row by row
+        """
+        j = np.arange(self.j0, self.j1)
+        i = np.arange(self.i0, self.i1)
+        return (j[:, np.newaxis] * width + i).ravel()
+
+
+def hilbert_index(n, x, y):
+    """
+    Get the distance along a Hilbert curve that fills a n x n grid for the
+    cell (x, y).
+
+    Args:
+        n(int): Size of the grid, it must be a power of 2
+        x(int): Column of the cell
+        y(int): Row of the cell
+
+    Returns:
+        int: Position of the cell in the curve
+    """
+    d = 0
+    s = n // 2
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve is continuous
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        s //= 2
+    return d
+
+
+def spiral_key(rows, cols, row, col):
+    """
+    Key for sorting tiles in a spiral that starts in the center of the screen.
+    """
+    dy = row - (rows - 1) / 2
+    dx = col - (cols - 1) / 2
+    ring = max(abs(dx), abs(dy))
+    angle = np.arctan2(dy, dx) % (2 * np.pi)
+    return ring, angle
+
+
+def create_tiles(
+    height, width, tile_size=DEFAULT_TILE_SIZE, order=ORDER_SCANLINE
+):
+    """
+    Split the screen into tiles of tile_size x tile_size pixels (smaller in
+    the borders) and sort them in the given order.
+
+    Args:
+        height(int): Height of the screen in pixels
+        width(int): Width of the screen in pixels
+        tile_size(int): Side of the tiles in pixels
+        order(str): Order for rendering the tiles (scanline, spiral or
+            hilbert)
+
+    Returns:
+        list: The tiles in the order they should be rendered
+    """
+    rows = int(np.ceil(height / tile_size))
+    cols = int(np.ceil(width / tile_size))
+    cells = [(row, col) for row in range(rows) for col in range(cols)]
+    if order == ORDER_SPIRAL:
+        cells.sort(key=lambda cell: spiral_key(rows, cols, *cell))
+    elif order == ORDER_HILBERT:
+        n = 1
+        while n < max(rows, cols):
+            n *= 2
+        cells.sort(key=lambda cell: hilbert_index(n, cell[1], cell[0]))
+    elif order != ORDER_SCANLINE:
+        raise ValueError("Unknown tile order: {}".format(order))
+    tiles = []
+    for row, col in cells:
+        j0 = row * tile_size
+        i0 = col * tile_size
+        j1 = min(j0 + tile_size, height)
+        i1 = min(i0 + tile_size, width)
+        tiles.append(Tile(j0, i0, j1, i1))
+    return tiles
@@ -27,6 +27,21 @@ def normalize(arr):
     return arr / norm
 
 
+def normalize_rows(arr):
+    """
+    Normalize every row of an array of vectors using numpy.
+
+    Args:
+        arr(ndarray): Input vectors with shape (N, 3)
+
+    Returns:
+        ndarray: Normalized vectors, rows with norm 0 are left as they are
+    """
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return arr / norms
+
+
 def distance(p1, p2):
     """
     Get the distance between points p1 and p2
@@ -70,6 +85,46 @@ def rotate_x(v, theta):
     return rotated_v
 
 
+def rotation_matrix(rotate):
+    """
+    Get the matrix that rotates around x, then y and then z.
+
+    Args:
+        rotate(numpy.array): Angles in radians around x, y and z
+
+    Returns:
+        numpy.array: The 3x3 rotation matrix
+    """
+    cx, cy, cz = np.cos(rotate)
+    sx, sy, sz = np.sin(rotate)
+    rot_x = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    rot_y = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rot_z = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    return rot_z @ rot_y @ rot_x
+
+
+def transform_matrix(translate=None, rotate=None, scale=None):
+    """
+    Get the 4x4 matrix that scales, rotates and then translates points.
+
+    Args:
+        translate(numpy.array): Translation in x, y and z
+        rotate(numpy.array): Angles in radians around x, y and z
+        scale(numpy.array): Scale in x, y and z, or a single float
+
+    Returns:
+        numpy.array: The 4x4 transform matrix
+    """
+    matrix = np.eye(4)
+    if scale is not None:
+        matrix[:3, :3] = np.diag(np.broadcast_to(scale, 3))
+    if rotate is not None:
+        matrix[:3, :3] = rotation_matrix(rotate) @ matrix[:3, :3]
+    if translate is not None:
+        matrix[:3, 3] = translate
+    return matrix
+
+
 def random_hemisphere(v):
     """
     Create a new random vector around the hemisphere in the given vector.